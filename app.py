@@ -1,12 +1,61 @@
-from flask import Flask
+import time
+
+from flask import Flask, Response, jsonify
+
+from utils.metrics import EXPORT_INTERVAL, read_snapshot
 
 app = Flask(__name__)
 
+# the bot publishes a snapshot every EXPORT_INTERVAL seconds
+MAX_SNAPSHOT_AGE = EXPORT_INTERVAL * 3
+
+
+def fresh_snapshot():
+    snapshot = read_snapshot()
+    if snapshot is None or time.time() - snapshot["time"] > MAX_SNAPSHOT_AGE:
+        return None
+    return snapshot
+
 
 @app.route("/")
 def hello_world():
     return "This is Moon"
 
 
+@app.route("/healthz")
+def healthz():
+    snapshot = fresh_snapshot()
+    if snapshot is None:
+        return jsonify(status="down", reason="bot is not publishing metrics"), 503
+
+    body = {
+        "status": "ok" if snapshot["connected"] else "down",
+        "connected": snapshot["connected"],
+        "dispatcher_queue_size": snapshot["queue_size"],
+        "dispatcher_lag_p95": snapshot["queue_lag_p95"],
+        "snapshot_age": round(time.time() - snapshot["time"], 3),
+    }
+    return jsonify(body), 200 if snapshot["connected"] else 503
+
+
+@app.route("/readyz")
+def readyz():
+    snapshot = fresh_snapshot()
+    if snapshot is None or not snapshot["ready"]:
+        return jsonify(status="starting"), 503
+    return jsonify(status="ready")
+
+
+@app.route("/metrics")
+def metrics():
+    snapshot = read_snapshot()
+    if snapshot is None:
+        return Response("", status=503, mimetype="text/plain")
+    text = snapshot["metrics"]
+    text += "# TYPE moon_snapshot_age_seconds gauge\n"
+    text += f"moon_snapshot_age_seconds {time.time() - snapshot['time']:.3f}\n"
+    return Response(text, mimetype="text/plain; version=0.0.4")
+
+
 if __name__ == "__main__":
     app.run()
@@ -38,26 +38,34 @@
 #     "beautifulsoup4",
 #     "aiohttp",
 #     "aiofiles",
-#     "pySmartDL",
 #     "lexica-api",
 # ]
 # ///
+import asyncio
 import os
 import logging
 
 import sqlite3
 import platform
 import subprocess
-from pathlib import Path
 
-from pyrogram import Client, idle, errors
-from pyrogram.enums.parse_mode import ParseMode
-from pyrogram.raw.functions.account import GetAuthorizations, DeleteAccount
+from utils import boot
 
-from utils import config
-from utils.db import db
-from utils.misc import gitrepo, userbot_version
-from utils.scripts import restart, load_module
+with boot.phase("pyrogram import"):
+    from pyrogram import Client, idle, errors
+    from pyrogram.enums.parse_mode import ParseMode
+    from pyrogram.raw.functions.account import GetAuthorizations, DeleteAccount
+
+with boot.phase("config"):
+    from utils import config
+with boot.phase("database"):
+    from utils.db import db
+with boot.phase("git version"):
+    from utils.misc import commit_sha, userbot_version
+
+from utils import http, metrics, ratelimit, workers
+from utils.loader import load_modules, preload_modules
+from utils.scripts import restart
 
 script_path = os.path.dirname(os.path.realpath(__file__))
 if script_path != os.getcwd():
@@ -69,7 +77,7 @@ common_params = {
     "hide_password": True,
     "workdir": script_path,
     "app_version": userbot_version,
-    "device_model": f"Moon-Userbot @ {gitrepo.head.commit.hexsha[:7]}",
+    "device_model": f"Moon-Userbot @ {commit_sha[:7]}",
     "system_version": platform.version() + " " + platform.machine(),
     "sleep_threshold": 30,
     "test_mode": config.test_server,
@@ -80,6 +88,8 @@ if config.STRINGSESSION:
     common_params["session_string"] = config.STRINGSESSION
 
 app = Client("my_account", **common_params)
+metrics.install(app)
+ratelimit.install(app)
 
 
 async def main():
@@ -90,8 +100,12 @@ async def main():
     )
     DeleteAccount.__new__ = None
 
+    with boot.phase("worker pool"):
+        workers.start()
+
     try:
-        await app.start()
+        with boot.phase("app.start()"):
+            await app.start()
     except sqlite3.OperationalError as e:
         if str(e) == "database is locked" and os.name == "posix":
             logging.warning(
@@ -107,50 +121,54 @@ async def main():
         os.rename("./my_account.session", "./my_account.session-old")
         restart()
 
-    success_modules = 0
-    failed_modules = 0
+    metrics_task = asyncio.create_task(metrics.export_loop(app))
 
-    for path in Path("modules").rglob("*.py"):
-        try:
-            await load_module(
-                path.stem, app, core="custom_modules" not in path.parent.parts
-            )
-        except Exception:
-            logging.warning("Can't import module %s", path.stem, exc_info=True)
-            failed_modules += 1
-        else:
-            success_modules += 1
+    with boot.phase("load modules"):
+        success_modules, failed_modules = await load_modules(app)
 
     logging.info("Imported %s modules", success_modules)
     if failed_modules:
         logging.warning("Failed to import %s modules", failed_modules)
 
+    boot_reason = "start"
     if info := db.get("core.updater", "restart_info"):
+        boot_reason = info["type"]
         text = {
             "restart": "<b>Restart completed!</b>",
             "update": "<b>Update process completed!</b>",
         }[info["type"]]
-        try:
-            await app.edit_message_text(info["chat_id"], info["message_id"], text)
-        except errors.RPCError:
-            pass
+        with boot.phase("restart info edit"):
+            try:
+                await app.edit_message_text(info["chat_id"], info["message_id"], text)
+            except errors.RPCError:
+                pass
         db.remove("core.updater", "restart_info")
 
     # required for sessionkiller module
     if db.get("core.sessionkiller", "enabled", False):
-        db.set(
-            "core.sessionkiller",
-            "auths_hashes",
-            [
-                auth.hash
-                for auth in (await app.invoke(GetAuthorizations())).authorizations
-            ],
-        )
+        with boot.phase("sessionkiller auths snapshot"):
+            db.set(
+                "core.sessionkiller",
+                "auths_hashes",
+                [
+                    auth.hash
+                    for auth in (await app.invoke(GetAuthorizations())).authorizations
+                ],
+            )
 
     logging.info("Moon-Userbot started!")
+    boot.finish(boot_reason)
+    metrics.gauges["ready"] = 1
+
+    preload_task = asyncio.create_task(preload_modules(app))
 
     await idle()
 
+    preload_task.cancel()
+    metrics_task.cancel()
+
+    await http.close()
+    workers.shutdown()
     await app.stop()
 
 
@@ -14,6 +14,7 @@
 #  You should have received a copy of the GNU General Public License
 #  along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
+import re
 from contextlib import suppress
 
 from pyrogram import Client, ContinuePropagation, filters
@@ -25,7 +26,8 @@ from pyrogram.errors import (
 from pyrogram.raw import functions
 from pyrogram.types import Message, ChatPermissions
 
-from utils.db import db
+from utils.db import adb
+from utils.moderation import SELECTORS, BulkJob, load_job, run_with_status, running_jobs
 from utils.scripts import format_exc, with_reply
 from utils.misc import modules_help, prefix
 
@@ -44,41 +46,38 @@ from utils.handlers import (
     AntiChannelsHandler,
     DeleteHistoryHandler,
     AntiRaidHandler,
+    chat_states,
+    update_chat_state,
 )
 
 
-db_cache: dict = db.get_collection("core.ats")
-
-
-def update_cache():
-    db_cache.clear()
-    db_cache.update(db.get_collection("core.ats"))
-
-
 @Client.on_message(filters.group & ~filters.me)
 async def admintool_handler(_, message: Message):
+    state = chat_states.get(message.chat.id)
+    if state is None:
+        raise ContinuePropagation
+
     if message.sender_chat and (
         message.sender_chat.type == "supergroup"
-        or message.sender_chat.id == db_cache.get(f"linked{message.chat.id}", 0)
+        or message.sender_chat.id == state.linked
     ):
         raise ContinuePropagation
 
-    if message.sender_chat and db_cache.get(f"antich{message.chat.id}", False):
+    if message.sender_chat and state.antich:
         with suppress(RPCError):
             await message.delete()
             await message.chat.ban_member(message.sender_chat.id)
 
-    tmuted_users = db_cache.get(f"c{message.chat.id}", [])
     if (
         message.from_user
-        and message.from_user.id in tmuted_users
+        and message.from_user.id in state.tmuted
         or message.sender_chat
-        and message.sender_chat.id in tmuted_users
+        and message.sender_chat.id in state.tmuted
     ):
         with suppress(RPCError):
             await message.delete()
 
-    if db_cache.get(f"antiraid{message.chat.id}", False):
+    if state.antiraid:
         with suppress(RPCError):
             await message.delete()
             if message.from_user:
@@ -86,11 +85,9 @@ async def admintool_handler(_, message: Message):
             elif message.sender_chat:
                 await message.chat.ban_member(message.sender_chat.id)
 
-    if message.new_chat_members and db_cache.get(
-        f"welcome_enabled{message.chat.id}", False
-    ):
+    if message.new_chat_members and state.welcome_enabled:
         await message.reply(
-            db_cache.get(f"welcome_text{message.chat.id}"),
+            state.welcome_text,
             disable_web_page_preview=True,
         )
 
@@ -130,22 +127,61 @@ async def kick_command(client: Client, message: Message):
 
 @Client.on_message(filters.command(["kickdel"], prefix) & filters.me)
 async def kickdel_cmd(client: Client, message: Message):
-    handler = KickDeletedAccountsHandler(client, message)
+    dry_run = "dry" in message.command[1:]
+    handler = KickDeletedAccountsHandler(client, message, dry_run=dry_run)
     await handler.kick_deleted_accounts()
 
 
+@Client.on_message(filters.command(["bulk"], prefix) & filters.me)
+async def bulk_cmd(client: Client, message: Message):
+    args = message.command[1:]
+    chat_id = message.chat.id
+    usage = (
+        f"<b>Usage:</b> <code>{prefix}bulk [kick|ban] "
+        f"[{'|'.join(SELECTORS)}] [args] [dry]</code>, "
+        f"<code>{prefix}bulk [resume|stop]</code>"
+    )
+
+    if args[:1] == ["stop"]:
+        job = running_jobs.get(chat_id)
+        if job is None:
+            return await message.edit("<b>No bulk job is running in this chat</b>")
+        job.cancelled = True
+        return await message.edit("<b>Stopping...</b>")
+
+    if chat_id in running_jobs:
+        return await message.edit("<b>Another bulk job is running in this chat</b>")
+
+    if args[:1] == ["resume"]:
+        job = await load_job(client, chat_id)
+        if job is None:
+            return await message.edit("<b>No saved bulk job in this chat</b>")
+    else:
+        dry_run = "dry" in args
+        args = [arg for arg in args if arg != "dry"]
+        if len(args) < 2:
+            return await message.edit(usage)
+        try:
+            job = BulkJob(client, chat_id, args[0], args[1], args[2:], dry_run)
+        except (ValueError, re.error) as e:
+            return await message.edit(f"<b>{e}</b>\n{usage}")
+
+    try:
+        await run_with_status(job, message)
+    except Exception as e:
+        await message.edit(format_exc(e))
+
+
 @Client.on_message(filters.command(["tmute"], prefix) & filters.me)
 async def tmute_command(client: Client, message: Message):
     handler = TimeMuteHandler(client, message)
     await handler.handle_tmute()
-    update_cache()
 
 
 @Client.on_message(filters.command(["tunmute"], prefix) & filters.me)
 async def tunmute_command(client: Client, message: Message):
     handler = TimeUnmuteHandler(client, message)
     await handler.handle_tunmute()
-    update_cache()
 
 
 @Client.on_message(filters.command(["tmute_users"], prefix) & filters.me)
@@ -182,7 +218,6 @@ async def promote_command(client: Client, message: Message):
 async def anti_channels(client: Client, message: Message):
     handler = AntiChannelsHandler(client, message)
     await handler.handle_anti_channels()
-    update_cache()
 
 
 @Client.on_message(filters.command(["delete_history", "dh"], prefix))
@@ -249,7 +284,7 @@ async def ro(client: Client, message: Message):
             perms.can_invite_users,
             perms.can_pin_messages,
         ]
-        db.set("core.ats", f"ro{message.chat.id}", perms_list)
+        await adb.aset("core.ats", f"ro{message.chat.id}", perms_list)
 
         try:
             await client.set_chat_permissions(message.chat.id, ChatPermissions())
@@ -271,7 +306,7 @@ async def unro(client: Client, message: Message):
         return
 
     try:
-        perms_list = db.get(
+        perms_list = await adb.aget(
             "core.ats",
             f"ro{message.chat.id}",
             [True, True, False, False, False, False, False],
@@ -303,7 +338,6 @@ async def unro(client: Client, message: Message):
 async def antiraid(client: Client, message: Message):
     handler = AntiRaidHandler(client, message)
     await handler.handle_antiraid()
-    update_cache()
 
 
 @Client.on_message(filters.command(["welcome", "wc"], prefix) & filters.me)
@@ -313,18 +347,16 @@ async def welcome(_, message: Message):
 
     if len(message.command) > 1:
         text = message.text.split(maxsplit=1)[1]
-        db.set("core.ats", f"welcome_enabled{message.chat.id}", True)
-        db.set("core.ats", f"welcome_text{message.chat.id}", text)
+        await update_chat_state(message.chat.id, "welcome_enabled", True)
+        await update_chat_state(message.chat.id, "welcome_text", text)
 
         await message.edit(
             f"<b>Welcome enabled in this chat\nText:</b> <code>{text}</code>"
         )
     else:
-        db.set("core.ats", f"welcome_enabled{message.chat.id}", False)
+        await update_chat_state(message.chat.id, "welcome_enabled", False)
         await message.edit("<b>Welcome disabled in this chat</b>")
 
-    update_cache()
-
 
 modules_help["admintool"] = {
     "ban [reply]/[username/id]* [reason] [report_spam] [delete_history]": "ban user in chat",
@@ -348,5 +380,10 @@ modules_help["admintool"] = {
     "Running without arguments equals to toggling state",
     "welcome [text]*": "enable auto-welcome to new users in groups. "
     "Running without text equals to disable",
-    "kickdel": "Kick all deleted accounts",
+    "kickdel [dry]": "Kick all deleted accounts, dry only counts them",
+    "bulk [kick|ban] deleted/noavatar [dry]": "Kick or ban all deleted accounts, or members without avatar",
+    "bulk [kick|ban] joined [YYYY-MM-DD] [YYYY-MM-DD]": "Kick or ban members who joined since the date, and before the second one",
+    "bulk [kick|ban] name [regex]": "Kick or ban members whose name matches the regex",
+    "bulk resume": "Continue the interrupted bulk job of this chat",
+    "bulk stop": "Stop the running bulk job of this chat",
 }
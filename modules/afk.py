@@ -5,7 +5,7 @@ from pyrogram import Client, filters
 from pyrogram.types import Message
 from utils.misc import modules_help, prefix
 from utils.scripts import ReplyCheck
-from utils.db import db
+from utils.db import adb
 
 # Variables
 AFK = False
@@ -40,7 +40,7 @@ async def collect_afk_messages(bot: Client, message: Message):
         CHAT_TYPE = GROUPS if is_group else USERS
 
         if GetChatID(message) not in CHAT_TYPE:
-            text = db.get("core.afk", "afk_msg", None)
+            text = await adb.aget("core.afk", "afk_msg", None)
             if text is None:
                 text = (
                     f"<blockquote>I'm unavailable (<i>since {last_seen}</i>).</blockquote>\n"
@@ -161,10 +161,10 @@ async def set_afk_msg(_, message: Message):
             "AFK message should contain <code>{last_seen}</code> to indicate where the last seen time will be placed."
         )
 
-    old_afk_msg = db.get("core.afk", "afk_msg", None)
+    old_afk_msg = await adb.aget("core.afk", "afk_msg", None)
     if old_afk_msg:
-        db.remove("core.afk", "afk_msg")
-    db.set("core.afk", "afk_msg", afk_msg)
+        await adb.aremove("core.afk", "afk_msg")
+    await adb.aset("core.afk", "afk_msg", afk_msg)
     await message.edit(f"AFK message set to:\n\n<pre>{afk_msg}</pre>")
 
 
@@ -19,12 +19,18 @@ from pyrogram.raw import functions
 from pyrogram.types import Message
 
 from utils.config import pm_limit
-from utils.db import db
+from utils.db import adb
 from utils.misc import modules_help, prefix
+from utils.settings import settings
 
-anti_pm_enabled = filters.create(
-    lambda _, __, ___: db.get("core.antipm", "status", False)
-)
+antipm_settings = settings("core.antipm")
+
+
+async def anti_pm_enabled_filter(_, __, ___):
+    return antipm_settings.get("status", False)
+
+
+anti_pm_enabled = filters.create(anti_pm_enabled_filter)
 
 in_contact_list = filters.create(lambda _, __, message: message.from_user.is_contact)
 
@@ -44,7 +50,7 @@ message_counts = {}
 )
 async def anti_pm_handler(client: Client, message: Message):
     m_n = 0
-    warns = db.get("core.antipm", "warns", m_n)
+    warns = antipm_settings.get("warns", m_n)
     user_id = message.from_user.id
     ids = message.chat.id
     b_f = await client.get_me()
@@ -52,7 +58,7 @@ async def anti_pm_handler(client: Client, message: Message):
     user = await client.get_users(ids)
     u_f = user.first_name
     user_info = await client.resolve_peer(ids)
-    default_text = db.get("core.antipm", "antipm_msg", None)
+    default_text = antipm_settings.get("antipm_msg", None)
     if default_text is None:
         default_text = f"""<b>Hello, {u_f}!
 This is the Assistant Of {u_n}.</b>
@@ -64,27 +70,25 @@ Do not spam further messages else I may have to block you!</i>
     """
     else:
         default_text = default_text.format(user=u_f, my_name=u_n, warns=warns)
-    if db.get("core.antipm", "spamrep", False):
+    if antipm_settings.get("spamrep", False):
         await client.invoke(functions.messages.ReportSpam(peer=user_info))
-    if db.get("core.antipm", "block", False):
+    if antipm_settings.get("block", False):
         await client.block_user(user_info)
 
-    if db.get("core.antipm", f"disallowusers{ids}") == user_id != db.get(
-        "core.antipm", f"allowusers{ids}"
-    ) or db.get("core.antipm", f"disallowusers{ids}") != user_id != db.get(
-        "core.antipm", f"allowusers{ids}"
-    ):
+    disallowed = antipm_settings.get(f"disallowusers{ids}")
+    allowed = antipm_settings.get(f"allowusers{ids}")
+    if disallowed == user_id != allowed or disallowed != user_id != allowed:
         await client.send_message(message.chat.id, f"{default_text}")
 
         if user_id in message_counts:
             message_counts[user_id] += 1
-            m_n = db.get("core.antipm", "warns")
+            m_n = antipm_settings.get("warns")
             m_n_n = m_n + 1
-            db.set("core.antipm", "warns", m_n_n)
+            await adb.aset("core.antipm", "warns", m_n_n)
         else:
             message_counts[user_id] = 1
             m_n_n = 1
-            db.set("core.antipm", "warns", m_n_n)
+            await adb.aset("core.antipm", "warns", m_n_n)
 
         if message_counts[user_id] > pm_limit:
             await client.send_message(
@@ -93,13 +97,13 @@ Do not spam further messages else I may have to block you!</i>
             )
             await client.block_user(user_id)
             del message_counts[user_id]
-            db.set("core.antipm", "warns", 0)
+            await adb.aset("core.antipm", "warns", 0)
 
 
 @Client.on_message(filters.command(["antipm", "anti_pm"], prefix) & filters.me)
 async def anti_pm(_, message: Message):
     if len(message.command) == 1:
-        if db.get("core.antipm", "status", False):
+        if await adb.aget("core.antipm", "status", False):
             await message.edit(
                 "<b>Anti-PM status: enabled\n"
                 f"Disable with: </b><code>{prefix}antipm disable</code>"
@@ -110,10 +114,10 @@ async def anti_pm(_, message: Message):
                 f"Enable with: </b><code>{prefix}antipm enable</code>"
             )
     elif message.command[1] in ["enable", "on", "1", "yes", "true"]:
-        db.set("core.antipm", "status", True)
+        await adb.aset("core.antipm", "status", True)
         await message.edit("<b>Anti-PM enabled!</b>")
     elif message.command[1] in ["disable", "off", "0", "no", "false"]:
-        db.set("core.antipm", "status", False)
+        await adb.aset("core.antipm", "status", False)
         await message.edit("<b>Anti-PM disabled!</b>")
     else:
         await message.edit(f"<b>Usage: {prefix}antipm [enable|disable]</b>")
@@ -122,7 +126,7 @@ async def anti_pm(_, message: Message):
 @Client.on_message(filters.command(["antipm_report"], prefix) & filters.me)
 async def antipm_report(_, message: Message):
     if len(message.command) == 1:
-        if db.get("core.antipm", "spamrep", False):
+        if await adb.aget("core.antipm", "spamrep", False):
             await message.edit(
                 "<b>Spam-reporting enabled.\n"
                 f"Disable with: </b><code>{prefix}antipm_report disable</code>"
@@ -133,10 +137,10 @@ async def antipm_report(_, message: Message):
                 f"Enable with: </b><code>{prefix}antipm_report enable</code>"
             )
     elif message.command[1] in ["enable", "on", "1", "yes", "true"]:
-        db.set("core.antipm", "spamrep", True)
+        await adb.aset("core.antipm", "spamrep", True)
         await message.edit("<b>Spam-reporting enabled!</b>")
     elif message.command[1] in ["disable", "off", "0", "no", "false"]:
-        db.set("core.antipm", "spamrep", False)
+        await adb.aset("core.antipm", "spamrep", False)
         await message.edit("<b>Spam-reporting disabled!</b>")
     else:
         await message.edit(f"<b>Usage: {prefix}antipm_report [enable|disable]</b>")
@@ -145,7 +149,7 @@ async def antipm_report(_, message: Message):
 @Client.on_message(filters.command(["antipm_block"], prefix) & filters.me)
 async def antipm_block(_, message: Message):
     if len(message.command) == 1:
-        if db.get("core.antipm", "block", False):
+        if await adb.aget("core.antipm", "block", False):
             await message.edit(
                 "<b>Blocking users enabled.\n"
                 f"Disable with: </b><code>{prefix}antipm_block disable</code>"
@@ -156,10 +160,10 @@ async def antipm_block(_, message: Message):
                 f"Enable with: </b><code>{prefix}antipm_block enable</code>"
             )
     elif message.command[1] in ["enable", "on", "1", "yes", "true"]:
-        db.set("core.antipm", "block", True)
+        await adb.aset("core.antipm", "block", True)
         await message.edit("<b>Blocking users enabled!</b>")
     elif message.command[1] in ["disable", "off", "0", "no", "false"]:
-        db.set("core.antipm", "block", False)
+        await adb.aset("core.antipm", "block", False)
         await message.edit("<b>Blocking users disabled!</b>")
     else:
         await message.edit(f"<b>Usage: {prefix}antipm_block [enable|disable]</b>")
@@ -169,8 +173,8 @@ async def antipm_block(_, message: Message):
 async def add_contact(_, message: Message):
     ids = message.chat.id
 
-    db.set("core.antipm", f"allowusers{ids}", ids)
-    db.set("core.antipm", "warns", 0)
+    await adb.aset("core.antipm", f"allowusers{ids}", ids)
+    await adb.aset("core.antipm", "warns", 0)
     await message.edit("User Approved!")
 
 
@@ -178,8 +182,8 @@ async def add_contact(_, message: Message):
 async def del_contact(_, message: Message):
     ids = message.chat.id
 
-    db.set("core.antipm", f"disallowusers{ids}", ids)
-    db.remove("core.antipm", f"allowusers{ids}")
+    await adb.aset("core.antipm", f"disallowusers{ids}", ids)
+    await adb.aremove("core.antipm", f"allowusers{ids}")
     await message.edit("User DisApproved!")
 
 
@@ -216,10 +220,10 @@ async def set_antipm_msg(_, message: Message):
             "antipm message must contain <code>{warns}</code> to mention the warns count."
         )
 
-    old_afk_msg = db.get("core.antipm", "antipm_msg", None)
+    old_afk_msg = await adb.aget("core.antipm", "antipm_msg", None)
     if old_afk_msg:
-        db.remove("core.antipm", "antipm_msg")
-    db.set("core.antipm", "antipm_msg", afk_msg)
+        await adb.aremove("core.antipm", "antipm_msg")
+    await adb.aset("core.antipm", "antipm_msg", afk_msg)
     await message.edit(f"antipm message set to:\n\n{afk_msg}")
 
 
@@ -0,0 +1,54 @@
+#  Moon-Userbot - telegram userbot
+#  Copyright (C) 2020-present Moon Userbot Organization
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from datetime import datetime
+
+from pyrogram import Client, filters
+from pyrogram.types import Message
+
+from utils.boot import format_timeline
+from utils.db import db
+from utils.misc import modules_help, prefix
+
+
+@Client.on_message(filters.command("boottime", prefix) & filters.me)
+async def boottime(_, message: Message):
+    timeline = db.get("core.boot", "last")
+    if not timeline:
+        return await message.edit("<b>No boot timeline saved yet</b>")
+
+    full = len(message.command) > 1 and message.command[1] == "full"
+    date = datetime.fromtimestamp(timeline["date"]).strftime("%Y-%m-%d %H:%M:%S")
+    text = (
+        f"<b>Last boot ({timeline['reason']}, {date}) took {timeline['total']:.3f}s</b>\n\n"
+        + format_timeline(timeline, limit=None if full else 15)
+    )
+
+    history = db.get("core.boot", "history", [])[-6:-1]
+    if history:
+        text += "\n\n<b>Previous boots:</b>\n" + "\n".join(
+            f"<code>{item['total']:7.3f}s</code> {item['reason']}, "
+            f"{datetime.fromtimestamp(item['date']).strftime('%Y-%m-%d %H:%M')}"
+            for item in reversed(history)
+        )
+
+    await message.edit(text[:4096])
+
+
+modules_help["boottime"] = {
+    "boottime": "Show where the last startup spent its time, longest phases only",
+    "boottime full": "Show every phase of the last startup",
+}
@@ -9,6 +9,9 @@ import cohere
 
 co = cohere.Client(cohere_key)
 
+# oldest turns are dropped once the stored history grows past this size
+HISTORY_MAX_BYTES = 64 * 1024
+
 from utils.misc import modules_help, prefix
 from utils.scripts import format_exc
 from utils.db import db
@@ -33,7 +36,9 @@ async def cohere(c: Client, message: Message):
             )
             return
 
-        db.add_chat_history(user_id, {"role": "USER", "message": prompt})
+        db.add_chat_history(
+            user_id, {"role": "USER", "message": prompt}, HISTORY_MAX_BYTES
+        )
 
         await message.edit_text("<code>Umm, lemme think...</code>")
 
@@ -62,7 +67,9 @@ async def cohere(c: Client, message: Message):
         if output == "":
             output = "I can't seem to find an answer to that"
 
-        db.add_chat_history(user_id, {"role": "CHATBOT", "message": output})
+        db.add_chat_history(
+            user_id, {"role": "CHATBOT", "message": output}, HISTORY_MAX_BYTES
+        )
 
         await message.edit_text(f"<code>{tool_message}</code>")
 
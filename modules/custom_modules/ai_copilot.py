@@ -1,4 +1,4 @@
-import requests
+from utils import http
 from pyrogram import Client, enums, filters
 from pyrogram.types import Message
 from utils.misc import modules_help, prefix
@@ -9,7 +9,7 @@ async def fetch_copilot_response(query: str, message: Message, reply=False):
     """Fetch response from the Copilot API and send it back to the user."""
     response_msg = await message.reply("Thinking...") if reply else await message.edit("Thinking...")
     try:
-        response = requests.get(f"{COPILOT_API_URL}{query}")
+        response = await http.get(f"{COPILOT_API_URL}{query}")
         response.raise_for_status()
         data = response.json()
 
@@ -20,7 +20,7 @@ async def fetch_copilot_response(query: str, message: Message, reply=False):
             await response_msg.edit_text(response_content, parse_mode=enums.ParseMode.MARKDOWN)
         else:
             await message.edit(response_content, parse_mode=enums.ParseMode.MARKDOWN)
-    except requests.exceptions.RequestException:
+    except http.REQUEST_ERRORS:
         error_msg = "An error occurred while connecting to the API. Please try again later."
         if reply:
             await response_msg.edit_text(error_msg)
@@ -1,5 +1,5 @@
 import os
-import requests
+from utils import http
 from urllib.parse import quote
 from pyrogram import Client, enums, filters
 from pyrogram.types import Message
@@ -20,12 +20,12 @@ async def describe_image(client, message: Message):
     photo_path = await client.download_media(message.reply_to_message.photo.file_id)
 
     try:
-        upload_response = requests.post("https://x0.at", files={"file": open(photo_path, "rb")})
+        upload_response = await http.post("https://x0.at", files={"file": open(photo_path, "rb")})
         upload_response.raise_for_status()
         image_url = upload_response.text.strip()
 
         url = f"{GEMINIIMG_URL}?url={quote(image_url)}&q={quote(prompt)}"
-        response = requests.get(url)
+        response = await http.get(url)
         response.raise_for_status()
         data = response.json()
 
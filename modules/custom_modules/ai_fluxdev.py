@@ -1,6 +1,5 @@
 import os
 import io
-import time
 import aiohttp
 import asyncio
 import logging
@@ -10,7 +9,7 @@ from pyrogram.types import Message
 from concurrent.futures import ThreadPoolExecutor
 
 from utils.misc import modules_help, prefix
-from utils.scripts import format_exc, progress
+from utils.scripts import ProgressReporter, format_exc
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -62,7 +61,7 @@ async def imgflux_(client: Client, message: Message):
         image_path = "hf_flux_gen.jpg"
         await save_image(image_bytes, image_path)
 
-        await message.reply_photo(image_path, progress=progress, progress_args=(message, time.time(), "Uploading image..."))
+        await message.reply_photo(image_path, progress=ProgressReporter(message, "Uploading image...").update)
 
         if os.path.exists(image_path):
             os.remove(image_path)
@@ -1,4 +1,4 @@
-import requests
+from utils import http
 from pyrogram import Client, enums, filters
 from pyrogram.types import Message
 from utils.misc import modules_help, prefix
@@ -15,7 +15,7 @@ async def fetch_response(url: str, query: str, message: Message):
         else message.reply("<code>Umm, lemme think...</code>")
     )
     try:
-        response = requests.get(url)
+        response = await http.get(url)
         response.raise_for_status()
         data = response.json()
         response_text = data.get("text", "No answer found.")
@@ -26,7 +26,7 @@ async def fetch_response(url: str, query: str, message: Message):
         )
         if images:
             await message.reply_photo(images[0], caption=f"Prompt: {query}")
-    except (requests.exceptions.RequestException, ValueError):
+    except (http.REQUEST_ERRORS, ValueError):
         await response_msg.edit_text(
             "Error: Unable to retrieve data or invalid response format."
         )
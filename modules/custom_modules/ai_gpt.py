@@ -1,4 +1,4 @@
-import requests
+from utils import http
 from pyrogram import Client, enums, filters
 from pyrogram.types import Message
 from utils.misc import modules_help, prefix
@@ -10,7 +10,7 @@ async def fetch_gpt_response(query: str, message: Message, is_self: bool):
     response_msg = await (message.edit("<code>Umm, lemme think...</code>") if is_self else message.reply("<code>Umm, lemme think...</code>"))
     
     try:
-        response = requests.get(f"{GPT_API_URL}{query.strip()}")
+        response = await http.get(f"{GPT_API_URL}{query.strip()}")
         response.raise_for_status()
         data = response.json()
 
@@ -21,7 +21,7 @@ async def fetch_gpt_response(query: str, message: Message, is_self: bool):
             formatted_response = "Failed to fetch a response. Please try again."
 
         await response_msg.edit_text(formatted_response, parse_mode=enums.ParseMode.MARKDOWN)
-    except requests.exceptions.RequestException:
+    except http.REQUEST_ERRORS:
         await response_msg.edit_text("An error occurred while connecting to the API. Please try again later.")
     except Exception:
         await response_msg.edit_text("An unexpected error occurred. Please try again.")
@@ -1,4 +1,4 @@
-import requests
+from utils import http
 from pyrogram import Client, enums, filters
 from pyrogram.types import Message
 from utils.misc import modules_help, prefix
@@ -23,12 +23,12 @@ async def set_grok_api(_, message: Message):
     }
 
     try:
-        test_response = requests.post(GROK_API_URL, headers=headers, json=test_payload, timeout=10)
+        test_response = await http.post(GROK_API_URL, headers=headers, json=test_payload, timeout=10)
         test_response.raise_for_status()
         db.set("custom.grok", "api_key", new_api_key)
         await message.edit_text("Grok API key set and validated successfully!")
 
-    except requests.exceptions.RequestException:
+    except http.REQUEST_ERRORS:
         await message.edit_text("Failed to validate the API key. Please try again.")
 
 
@@ -59,7 +59,7 @@ async def fetch_grok_response(query: str, message: Message, reply=False):
     }
 
     try:
-        response = requests.post(GROK_API_URL, headers=headers, json=payload)
+        response = await http.post(GROK_API_URL, headers=headers, json=payload)
         response.raise_for_status()
 
         data = response.json()
@@ -73,7 +73,7 @@ async def fetch_grok_response(query: str, message: Message, reply=False):
 
         await response_msg.edit_text(response_content, parse_mode=enums.ParseMode.MARKDOWN)
 
-    except requests.exceptions.RequestException as e:
+    except http.REQUEST_ERRORS as e:
         await response_msg.edit_text(f"An error occurred: {str(e)}")
 
 
@@ -1,12 +1,13 @@
-import requests
+from utils import http
 from urllib.parse import quote
 from pyrogram import Client, filters
 from pyrogram.types import Message
 from pyrogram.filters import create
 from utils.misc import modules_help, prefix
 from utils.db import db
+from utils.settings import settings
 
-def google_translate(query, source_lang="auto", target_lang="en"):
+async def google_translate(query, source_lang="auto", target_lang="en"):
     url = "https://translate.google.com/translate_a/single"
     params = {
         "client": "gtx",
@@ -18,16 +19,18 @@ def google_translate(query, source_lang="auto", target_lang="en"):
     headers = {
         "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/114.0.0.0 Safari/537.36"
     }
-    response = requests.get(url, params=params, headers=headers)
+    response = await http.get(url, params=params, headers=headers)
     if response.status_code == 200:
         data = response.json()
         return "".join([item[0] for item in data[0]])
     else:
         raise Exception("Failed to fetch translation.")
 
-def auto_translate_filter(_, __, message: Message):
+translate_settings = settings("custom.gtranslate")
+
+async def auto_translate_filter(_, __, message: Message):
     """Filter to process messages only if translation is enabled for the chat."""
-    lang_code = db.get("custom.gtranslate", str(message.chat.id), None)
+    lang_code = translate_settings.get(str(message.chat.id))
     return bool(lang_code) and not message.text.startswith(prefix)
 
 auto_translate_filter = create(auto_translate_filter)
@@ -72,12 +75,12 @@ async def auto_translate(_, message: Message):
     if message.from_user and not message.from_user.is_self:
         return
 
-    lang_code = db.get("custom.gtranslate", str(message.chat.id), None)
+    lang_code = translate_settings.get(str(message.chat.id))
     if not lang_code:
         return
 
     try:
-        translated_text = google_translate(message.text, target_lang=lang_code)
+        translated_text = await google_translate(message.text, target_lang=lang_code)
         if translated_text.strip() and translated_text != message.text:
             await message.edit(translated_text)
     except Exception as e:
@@ -1,16 +1,19 @@
-import requests
+from utils import http
 from urllib.parse import quote
 from pyrogram import Client, filters
 from pyrogram.types import Message
 from pyrogram.filters import create
 from utils.misc import modules_help, prefix
 from utils.db import db
+from utils.settings import settings
 
 TRANSLATE_API = "https://delirius-apiofc.vercel.app/tools/translate?text={query}&language={lang}"
 
-def auto_translate_filter(_, __, message: Message):
+translate_settings = settings("custom.translate")
+
+async def auto_translate_filter(_, __, message: Message):
     """Filter to process messages only if translation is enabled for the chat."""
-    lang_code = db.get("custom.translate", str(message.chat.id), None)
+    lang_code = translate_settings.get(str(message.chat.id))
     return bool(lang_code) and not message.text.startswith(prefix)
 
 auto_translate_filter = create(auto_translate_filter)
@@ -55,19 +58,19 @@ async def auto_translate(_, message: Message):
     if message.from_user and not message.from_user.is_self:
         return
 
-    lang_code = db.get("custom.translate", str(message.chat.id), None)
+    lang_code = translate_settings.get(str(message.chat.id))
     if not lang_code:
         return
 
     try:
-        response = requests.get(TRANSLATE_API.format(query=quote(message.text), lang=lang_code))
+        response = await http.get(TRANSLATE_API.format(query=quote(message.text), lang=lang_code))
         response.raise_for_status()
         data = response.json()
 
         translated_text = data.get("data", "No translation found.")
         if translated_text.strip() and translated_text != message.text:
             await message.edit(translated_text)
-    except requests.exceptions.RequestException as e:
+    except http.REQUEST_ERRORS as e:
         await message.reply(f"Translation failed: {e}")
 
 modules_help["auto_translate"] = {
@@ -75,6 +75,7 @@ async def backup(client: Client, message: Message):
         if config.db_type in ["mongo", "mongodb"]:
             dump_mongo(db._database.list_collection_names(), "backups/", db._database)
         else:
+            db.flush()
             shutil.copy(config.db_name, f"backups/{config.db_name}")
 
         timestamp = get_timestamp()
@@ -114,6 +115,7 @@ async def restore(client: Client, message: Message):
         if config.db_type in ["mongo", "mongodb"]:
             restore_mongo("backups/", db._database)
         else:
+            db.flush()
             shutil.copy(f"backups/{config.db_name}", config.db_name)
 
         await message.edit("<b>Database restored successfully!</b>", parse_mode=enums.ParseMode.HTML)
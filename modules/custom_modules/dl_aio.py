@@ -1,11 +1,10 @@
 import json
-import requests
+from utils import http
 import os
-import time
 from pyrogram import Client, filters
 from pyrogram.types import Message
 from utils.misc import modules_help, prefix
-from utils.scripts import progress
+from utils.scripts import ProgressReporter
 
 API_URL = "https://bk9.fun/download/alldownload?url="
 
@@ -31,7 +30,7 @@ async def aio_downloader(client: Client, message: Message):
         f"<code>Fetching video details...</code>"
     )
     
-    api_response = requests.get(f"{API_URL}{video_url}")
+    api_response = await http.get(f"{API_URL}{video_url}")
     if api_response.status_code != 200:
         await ms.edit_text(f"<code>Failed to fetch video details. API Error.</code>")
         return
@@ -47,25 +46,19 @@ async def aio_downloader(client: Client, message: Message):
 
         await ms.edit_text(f"<code>Downloading {quality}-quality video...</code>")
         
-        video_response = requests.get(download_url, stream=True)
-        if video_response.status_code != 200:
+        video_file = f"{video_title[:50].strip()}.mp4"
+        try:
+            await http.download(download_url, video_file)
+        except http.REQUEST_ERRORS:
             await ms.edit_text(f"<code>Failed to download video. Error occurred.</code>")
             return
 
-        video_file = f"{video_title[:50].strip()}.mp4"
-        with open(video_file, "wb") as f:
-            for chunk in video_response.iter_content(chunk_size=1024):
-                if chunk:
-                    f.write(chunk)
-
-        c_time = time.time()
         await ms.edit_text(f"<code>Uploading {quality}-quality video...</code>")
         await client.send_video(
             chat_id,
             video=video_file,
             caption=f"<b>Title:</b> {video_title}\n<b>Quality:</b> {quality.capitalize()}",
-            progress=progress,
-            progress_args=(ms, c_time, f"<code>Uploading {quality}-quality video...</code>")
+            progress=ProgressReporter(ms, f"<code>Uploading {quality}-quality video...</code>").update
         )
 
         await ms.delete()
@@ -1,11 +1,10 @@
 import json
-import requests
-import time
+from utils import http
 import os
 from pyrogram import Client, filters
 from pyrogram.types import Message
 from utils.misc import modules_help, prefix
-from utils.scripts import progress
+from utils.scripts import ProgressReporter
 
 @Client.on_message(filters.command(["amusic", "applemusic"], prefix) & filters.me)
 async def apple_music(client: Client, message: Message):
@@ -23,7 +22,7 @@ async def apple_music(client: Client, message: Message):
     ms = await message.edit_text(f"<code>Searching for {query} on Apple Music...</code>")
     
     search_url = f"https://delirius-apiofc.vercel.app/search/applemusicv2?query={query}"
-    search_response = requests.get(search_url)
+    search_response = await http.get(search_url)
     search_result = search_response.json()
 
     if search_result['status'] and search_result['data']:
@@ -36,7 +35,7 @@ async def apple_music(client: Client, message: Message):
         await ms.edit_text(f"<code>Found: {song_name} by {song_artist}</code>\n<code>Fetching download link...</code>")
 
         download_url = f"https://delirius-apiofc.vercel.app/download/applemusicdl?url={song_url}"
-        download_response = requests.get(download_url)
+        download_response = await http.get(download_url)
         download_result = download_response.json()
 
         if download_result['status']:
@@ -46,23 +45,21 @@ async def apple_music(client: Client, message: Message):
 
             await ms.edit_text(f"<code>Downloading {song_name}...</code>")
 
-            thumb_response = requests.get(song_thumb)
+            thumb_response = await http.get(song_thumb)
             with open(f"{song_name}.jpg", "wb") as f:
                 f.write(thumb_response.content)
 
-            song_response = requests.get(song_download_link)
+            song_response = await http.get(song_download_link)
             with open(f"{song_name}.mp3", "wb") as f:
                 f.write(song_response.content)
 
             await ms.edit_text(f"<code>Uploading {song_name}...</code>")
-            c_time = time.time()
             
             await client.send_audio(
                 chat_id,
                 f"{song_name}.mp3",
                 caption=f"<b>Song Name:</b> {song_name}\n<b>Artist:</b> {song_artist}",
-                progress=progress,
-                progress_args=(ms, c_time, f"<code>Uploading {song_name}...</code>"),
+                progress=ProgressReporter(ms, f"<code>Uploading {song_name}...</code>").update,
                 thumb=f"{song_name}.jpg"
             )
             
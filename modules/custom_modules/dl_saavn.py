@@ -1,13 +1,12 @@
 import json
-import requests
-import time
+from utils import http
 import os
 
 from pyrogram import Client, filters
 from pyrogram.types import Message
 
 from utils.misc import modules_help, prefix
-from utils.scripts import progress
+from utils.scripts import ProgressReporter
 
 @Client.on_message(filters.command(["svn", "saavn"], prefix) & filters.me)
 async def saavn(client: Client, message: Message):
@@ -22,7 +21,7 @@ async def saavn(client: Client, message: Message):
         )
         return
     ms = await message.edit_text(f"<code>Searching for {query} on saavn</code>")
-    response = requests.get(f"https://rsjiprivate-api.vercel.app/api/search/songs?query={query}")
+    response = await http.get(f"https://rsjiprivate-api.vercel.app/api/search/songs?query={query}")
 
     result = json.loads(response.text)
 
@@ -34,16 +33,15 @@ async def saavn(client: Client, message: Message):
 
         await ms.edit_text(f"<code>Found: {song_name} </code>\n Downloading...")
         with open(f"{song_name}.jpg", "wb") as f:
-            f.write(requests.get(thumb).content)
+            f.write((await http.get(thumb)).content)
 
-        song = requests.get(song_url)
+        song = await http.get(song_url)
 
         with open(f"{song_name}.mp3", "wb") as f:
             f.write(song.content)
 
         await ms.edit_text(f"<code>Uploading {song_name}... </code>")
-        c_time = time.time()
-        await client.send_audio(chat_id, f"{song_name}.mp3", caption=f"<b>Song Name:</b> {song_name}", progress=progress, progress_args=(ms, c_time, f'`Uploading {song_name}...`'), thumb=f"{song_name}.jpg")
+        await client.send_audio(chat_id, f"{song_name}.mp3", caption=f"<b>Song Name:</b> {song_name}", progress=ProgressReporter(ms, f'`Uploading {song_name}...`').update, thumb=f"{song_name}.jpg")
         await ms.delete()
         if os.path.exists(f"{song_name}.jpg"):
             os.remove(f"{song_name}.jpg")
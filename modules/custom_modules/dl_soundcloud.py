@@ -1,11 +1,10 @@
 import aiohttp
 import os
 import re
-import time
 from pyrogram import Client, filters
 from pyrogram.types import Message
 from utils.misc import modules_help, prefix
-from utils.scripts import progress
+from utils.scripts import ProgressReporter
 
 BASE_URL = "https://api.agatz.xyz/api"
 
@@ -73,14 +72,12 @@ async def soundcloud_music(client: Client, message: Message):
                 song_file.write(await song_response.read())
 
     await status_message.edit(f"<code>Uploading {song_title}...</code>")
-    c_time = time.time()
 
     await client.send_audio(
         chat_id,
         song_path,
         caption=f"<b>Song Name:</b> {song_title}",
-        progress=progress,
-        progress_args=(status_message, c_time, f"<code>Uploading {song_title}...</code>"),
+        progress=ProgressReporter(status_message, f"<code>Uploading {song_title}...</code>").update,
         thumb=thumbnail_path
     )
 
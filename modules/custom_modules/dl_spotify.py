@@ -1,11 +1,10 @@
 import json
-import requests
-import time
+from utils import http
 import os
 from pyrogram import Client, filters
 from pyrogram.types import Message
 from utils.misc import modules_help, prefix
-from utils.scripts import progress
+from utils.scripts import ProgressReporter
 
 
 @Client.on_message(filters.command(["sdl", "spotify"], prefix) & filters.me)
@@ -24,7 +23,7 @@ async def spotify_download(client: Client, message: Message):
     ms = await message.edit_text(f"<code>Searching for {query} on Spotify...</code>")
 
     search_url = f"https://delirius-apiofc.vercel.app/search/spotify?q={query}&limit=2"
-    search_response = requests.get(search_url)
+    search_response = await http.get(search_url)
     search_result = search_response.json()
 
     if search_result['status'] and search_result['data']:
@@ -37,7 +36,7 @@ async def spotify_download(client: Client, message: Message):
         await ms.edit_text(f"<code>Found: {song_name} by {song_artist}</code>\n<code>Fetching download link...</code>")
 
         download_url = f"https://delirius-apiofc.vercel.app/download/spotifydlv3?url={song_url}"
-        download_response = requests.get(download_url)
+        download_response = await http.get(download_url)
         download_result = download_response.json()
 
         if download_result['status']:
@@ -50,25 +49,23 @@ async def spotify_download(client: Client, message: Message):
 
             thumb_path = None
             if song_thumb:
-                thumb_response = requests.get(song_thumb)
+                thumb_response = await http.get(song_thumb)
                 thumb_path = f"{song_name}.jpg"
                 with open(thumb_path, "wb") as f:
                     f.write(thumb_response.content)
 
             song_path = f"{song_name}.mp3"
-            song_response = requests.get(song_download_link)
+            song_response = await http.get(song_download_link)
             with open(song_path, "wb") as f:
                 f.write(song_response.content)
 
             await ms.edit_text(f"<code>Uploading {song_name}...</code>")
-            c_time = time.time()
 
             await client.send_audio(
                 chat_id,
                 song_path,
                 caption=f"<b>Song Name:</b> {song_name}\n<b>Artist:</b> {song_artist}",
-                progress=progress,
-                progress_args=(ms, c_time, f"<code>Uploading {song_name}...</code>"),
+                progress=ProgressReporter(ms, f"<code>Uploading {song_name}...</code>").update,
                 thumb=thumb_path,
             )
 
@@ -1,6 +1,6 @@
 from pyrogram import Client, filters, enums
 from pyrogram.types import Message
-import requests
+from utils import http
 import logging
 import os
 from utils.misc import modules_help, prefix
@@ -17,12 +17,12 @@ if not os.path.exists(TEMP_DIR):
 
 async def fetch_videos():
     try:
-        response = requests.get(VIDEO_API_URL)
+        response = await http.get(VIDEO_API_URL)
         response.raise_for_status()
         videos = response.json()
         logging.debug(f"Fetched videos: {videos}")
         return videos
-    except requests.RequestException as e:
+    except http.REQUEST_ERRORS as e:
         logging.error(f"Error fetching videos: {e}")
         return []
 
@@ -35,7 +35,7 @@ async def get_videos(number_of_videos):
 
 async def save_video_to_temp(video_url):
     try:
-        response = requests.get(video_url)
+        response = await http.get(video_url)
         response.raise_for_status()
         
         video_data = response.content
@@ -45,7 +45,7 @@ async def save_video_to_temp(video_url):
             f.write(video_data)
         
         return video_file_name
-    except requests.RequestException as e:
+    except http.REQUEST_ERRORS as e:
         logging.error(f"Error saving video: {e}")
         return None
 
@@ -59,11 +59,11 @@ async def delete_temp_video(file_path):
 
 async def fetch_waifu_image():
     try:
-        response = requests.get(WAIFU_API_URL)
+        response = await http.get(WAIFU_API_URL)
         response.raise_for_status()
         data = response.json()
         return data.get("url")
-    except requests.RequestException as e:
+    except http.REQUEST_ERRORS as e:
         logging.error(f"Error fetching waifu image: {e}")
         return None
 
@@ -99,7 +99,7 @@ async def fetch_and_upload_videos(client: Client, message: Message):
                         )
                         
                         await delete_temp_video(video_file_path)
-                    except requests.RequestException as e:
+                    except http.REQUEST_ERRORS as e:
                         await message.reply(f"Error sending video: {e}")
     else:
         await message.reply("No videos available.")
@@ -117,7 +117,7 @@ async def fetch_and_send_waifu_image(client: Client, message: Message):
                 chat_id=message.chat.id,
                 photo=image_url
             )
-        except requests.RequestException as e:
+        except http.REQUEST_ERRORS as e:
             await message.reply(f"Error sending waifu image: {e}")
     else:
         await message.reply("No waifu image available.")
@@ -1,10 +1,9 @@
 import os
-import time
-import requests
+from utils import http
 from pyrogram import Client, filters
 from pyrogram.types import Message
 from utils.misc import modules_help, prefix
-from utils.scripts import progress
+from utils.scripts import ProgressReporter
 
 YOUTUBE_SEARCH_API = "https://api.agatz.xyz/api/ytsearch?message="
 YOUTUBE_DOWNLOAD_API = "https://api.agatz.xyz/api/ytmp3?url="
@@ -26,7 +25,7 @@ async def youtube_music(client: Client, message: Message):
     ms = await message.edit_text(f"<code>Searching for {query} on YouTube Music...</code>")
     
     try:
-        search_response = requests.get(f"{YOUTUBE_SEARCH_API}{query}")
+        search_response = await http.get(f"{YOUTUBE_SEARCH_API}{query}")
         search_response.raise_for_status()
         search_result = search_response.json()
     except Exception as e:
@@ -44,7 +43,7 @@ async def youtube_music(client: Client, message: Message):
     await ms.edit_text(f"<b>Found:</b> <code>{song_name}</code>\n<b>Author:</b> <code>{song_author}</code>\n<code>Fetching download link...</code>")
 
     try:
-        download_response = requests.get(f"{YOUTUBE_DOWNLOAD_API}{song_url}")
+        download_response = await http.get(f"{YOUTUBE_DOWNLOAD_API}{song_url}")
         download_response.raise_for_status()
         download_result = download_response.json()
     except Exception as e:
@@ -62,9 +61,7 @@ async def youtube_music(client: Client, message: Message):
 
     await ms.edit_text(f"<code>Downloading {song_name}...</code>")
     try:
-        with open(f"{song_name}.mp3", "wb") as song_file:
-            for chunk in requests.get(download_link, stream=True).iter_content(1024):
-                song_file.write(chunk)
+        await http.download(download_link, f"{song_name}.mp3")
     except Exception as e:
         await ms.edit_text(f"<code>Error while downloading song: {str(e)}</code>")
         return
@@ -73,20 +70,18 @@ async def youtube_music(client: Client, message: Message):
     try:
         thumb_file = f"{song_name}.jpg"
         with open(thumb_file, "wb") as thumb_f:
-            thumb_f.write(requests.get(song_thumb).content)
+            thumb_f.write((await http.get(song_thumb)).content)
     except:
         pass  # Ignore thumbnail errors
 
     await ms.edit_text(f"<code>Uploading {song_name}...</code>")
-    c_time = time.time()
     try:
         await client.send_audio(
             chat_id,
             audio=f"{song_name}.mp3",
             caption=f"<b>Song Name:</b> {song_name}\n<b>Author:</b> {song_author}",
             thumb=thumb_file,
-            progress=progress,
-            progress_args=(ms, c_time, f"<code>Uploading {song_name}...</code>"),
+            progress=ProgressReporter(ms, f"<code>Uploading {song_name}...</code>").update,
         )
     except Exception as e:
         await ms.edit_text(f"<code>Error while uploading song: {str(e)}</code>")
@@ -1,8 +1,8 @@
 import os
 import httpx
-import subprocess
 from pyrogram import Client, filters, enums
 from pyrogram.types import Message
+from utils import workers
 from utils.misc import modules_help, prefix
 from utils.db import db
 
@@ -12,25 +12,23 @@ DEFAULT_PARAMS = {
     "similarity_boost": 0.9,
 }
 
-def process_audio(input_path: str, output_path: str, speed: float, volume: float):
+async def process_audio(input_path: str, output_path: str, speed: float, volume: float):
     """
-    Process the audio file using FFmpeg.
+    Process the audio file using FFmpeg, in the worker pool.
     Adjusts speed, volume, and applies filters for natural sound.
     :param input_path: Path to the original audio file.
     :param output_path: Path to save the processed audio file.
     :param speed: Speed adjustment factor (e.g., 1.0 for normal speed, 0.9 for slower).
     :param volume: Volume adjustment factor (e.g., 1.0 for no change, 0.8 for reduced volume).
     """
-    subprocess.run(
-        [
-            "ffmpeg",
-            "-i", input_path,
-            "-filter:a",
-            f"atempo={speed},volume={volume},acompressor=threshold=-20dB:ratio=2.5:attack=5:release=50",
-            "-vn",  # No video
-            output_path,
-        ],
-        check=True
+    await workers.run_process(
+        "ffmpeg",
+        "-y",
+        "-i", input_path,
+        "-filter:a",
+        f"atempo={speed},volume={volume},acompressor=threshold=-20dB:ratio=2.5:attack=5:release=50",
+        "-vn",  # No video
+        output_path,
     )
 
 async def generate_elevenlabs_audio(text: str):
@@ -114,7 +112,7 @@ async def elevenlabs_command(client: Client, message: Message):
         processed_audio_path = "elevenlabs_voice_processed.mp3"
         
         # Replacing the audio processing from Code 1 here
-        process_audio(original_audio_path, processed_audio_path, speed=0.9, volume=0.9)
+        await process_audio(original_audio_path, processed_audio_path, speed=0.9, volume=0.9)
 
         await client.send_voice(chat_id=message.chat.id, voice=processed_audio_path)
 
@@ -1,18 +1,33 @@
-from pyrogram import Client, filters, enums
+import asyncio
+import csv
+import datetime
+import gzip
+import html
+import io
+import json
+import os
+import time
+
+import pyrogram
+from pyrogram import Client, filters, enums, raw
 from pyrogram.types import Message
+from utils.db import adb, db
 from utils.misc import modules_help, prefix
+from utils.ratelimit import limiter
+from utils.scripts import ProgressReporter, format_exc
 
-import os
-import datetime
+DB_MODULE = "custom.exchat"
+EXPORT_DIR = "downloads"
+PAGE_SIZE = 100
+PROGRESS_INTERVAL = 5
 
-def generate_html(messages, owner_username, other_username, export_datetime):
-    html = f'''
+HTML_HEAD = '''
 <!DOCTYPE html>
 <html lang="en">
 <head>
     <meta charset="UTF-8">
     <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>DM with {owner_username}, {other_username}</title>
+    <title>DM with {owner}, {other}</title>
     <link rel="stylesheet" href="https://stackpath.bootstrapcdn.com/bootstrap/4.5.2/css/bootstrap.min.css">
     <link rel="stylesheet" href="https://cdnjs.cloudflare.com/ajax/libs/font-awesome/5.15.3/css/all.min.css">
     <style>
@@ -165,7 +180,7 @@ def generate_html(messages, owner_username, other_username, export_datetime):
         <i class="fas fa-adjust"></i>
     </button>
     <div class="container">
-        <h1>DM with {owner_username}, {other_username}</h1>
+        <h1>DM with {owner}, {other}</h1>
         <div class="search-container">
             <input type="text" id="searchInput" class="search-bar" onkeyup="searchMessages()" placeholder="Search for messages...">
             <label class="sort-checkbox">
@@ -173,17 +188,9 @@ def generate_html(messages, owner_username, other_username, export_datetime):
             </label>
         </div>
         <div id="messages">
-    '''
-    for msg in messages:
-        author_class = "owner" if msg['author_color'] == "#C9DABF" else "other"
-        html += f'''
-        <div class="message" data-timestamp="{msg['timestamp']}">
-            <div class="author {author_class}">{msg['author']}</div>
-            <div class="text">{msg['text']}</div>
-            <div class="timestamp">{msg['timestamp']}</div>
-        </div>
-        '''
-    html += f'''
+'''
+
+HTML_FOOT = '''
         </div>
         <div class="footer">
             Exported on {export_datetime}
@@ -191,40 +198,204 @@ def generate_html(messages, owner_username, other_username, export_datetime):
     </div>
 </body>
 </html>
-    '''
-    return html
+'''
+
+HTML_MESSAGE = '''
+        <div class="message" data-timestamp="{timestamp}">
+            <div class="author {author_class}">{author}</div>
+            <div class="text">{text}</div>
+            <div class="timestamp">{timestamp}</div>
+        </div>
+        '''
+
+CSV_FIELDS = ["id", "timestamp", "author_id", "author", "outgoing", "text"]
+
+
+def html_head(owner: str, other: str) -> str:
+    return HTML_HEAD.format(owner=html.escape(owner), other=html.escape(other))
+
+
+def html_foot() -> str:
+    export_datetime = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    return HTML_FOOT.format(export_datetime=export_datetime)
+
+
+def render_html(records: list) -> str:
+    return "".join(
+        HTML_MESSAGE.format(
+            timestamp=record["timestamp"],
+            author_class="owner" if record["outgoing"] else "other",
+            author=html.escape(record["author"]),
+            text=html.escape(record["text"]),
+        )
+        for record in records
+    )
+
+
+def render_jsonl(records: list) -> str:
+    return "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records)
+
+
+def render_csv(records: list) -> str:
+    out = io.StringIO()
+    csv.DictWriter(out, CSV_FIELDS).writerows(records)
+    return out.getvalue()
+
+
+# format -> (file start, rows of a page, file end)
+FORMATS = {
+    "html": (html_head, render_html, html_foot),
+    "jsonl": (None, render_jsonl, None),
+    "csv": (
+        lambda owner, other: ",".join(CSV_FIELDS) + "\r\n",
+        render_csv,
+        None,
+    ),
+}
+
+
+def to_record(msg: Message, owner_id: int) -> dict:
+    return {
+        "id": msg.id,
+        "timestamp": msg.date.strftime("%Y-%m-%d %H:%M:%S"),
+        "author_id": msg.from_user.id if msg.from_user else None,
+        "author": msg.from_user.first_name if msg.from_user else "Unknown",
+        "outgoing": bool(msg.from_user and msg.from_user.id == owner_id),
+        "text": msg.text or msg.caption or "",
+    }
+
+
+async def history_pages(client: Client, chat_id: int, after_id: int):
+    """Messages newer than after_id, oldest first, one page at a time"""
+    peer = await client.resolve_peer(chat_id)
+    while True:
+        # negative add_offset pages towards newer messages
+        result = await client.invoke(
+            raw.functions.messages.GetHistory(
+                peer=peer,
+                offset_id=after_id + 1,
+                offset_date=0,
+                add_offset=-PAGE_SIZE,
+                limit=PAGE_SIZE,
+                max_id=0,
+                min_id=after_id,
+                hash=0,
+            )
+        )
+        messages = await pyrogram.utils.parse_messages(client, result, replies=0)
+        messages = sorted(
+            (msg for msg in messages if not msg.empty and msg.id > after_id),
+            key=lambda msg: msg.id,
+        )
+        if not messages:
+            return
+        after_id = messages[-1].id
+        yield messages
+
+
+def write_member(file, text: str) -> int:
+    """Append text as a complete gzip member, return the new file size"""
+    file.write(gzip.compress(text.encode()))
+    file.flush()
+    return file.tell()
+
 
 @Client.on_message(filters.command("exchat", prefix) & filters.me)
 async def export_chat(client: Client, message: Message):
+    args = message.command[1:]
+    fmt = next((arg for arg in args if arg in FORMATS), "html")
+    incremental = "new" in args
     please_wait = await message.edit("Please wait...")
     chat_id = message.chat.id
     owner = await client.get_me()
-    owner_username = owner.username
-    other_username = (await client.get_chat(chat_id)).title or (await client.get_chat(chat_id)).first_name or "Unknown"
-    messages = []
-    
-    async for msg in client.get_chat_history(chat_id, limit=None):
-        author_color = "#C9DABF" if msg.from_user and msg.from_user.id == owner.id else "#F7E7DC"
-        messages.append({
-            "author": msg.from_user.first_name if msg.from_user else "Unknown",
-            "author_color": author_color,
-            "text": msg.text or msg.caption or "",
-            "timestamp": msg.date.strftime("%Y-%m-%d %H:%M:%S")
-        })
+    chat = await client.get_chat(chat_id)
+    other_username = chat.title or chat.first_name or "Unknown"
+    head, render, foot = FORMATS[fmt]
 
-    export_datetime = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    html_content = generate_html(messages[::-1], owner_username, other_username, export_datetime)  # Reverse to maintain chronological order
+    # Every page is written as a separate gzip member, which gzip tools read
+    # as one stream. An export cut short by an error or restart continues
+    # after the last complete member.
+    key = f"{chat_id}.{fmt}"
+    state = db.get(DB_MODULE, key) or {}
+    partial = state.get("partial")
+    if partial and os.path.exists(partial["path"]):
+        file_path = partial["path"]
+    else:
+        os.makedirs(EXPORT_DIR, exist_ok=True)
+        file_path = os.path.join(
+            EXPORT_DIR,
+            f"chat_export_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}"
+            f".{fmt}.gz",
+        )
+        partial = {
+            "path": file_path,
+            "last_id": state.get("exported", 0) if incremental else 0,
+            "count": 0,
+            "size": 0,
+            "done": False,
+        }
 
-    file_name = f"chat_export_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.html"
-    file_path = os.path.join(os.getcwd(), file_name)
-    
-    with open(file_path, "w", encoding="utf-8") as file:
-        file.write(html_content)
+    if not partial["done"]:
+        last_progress = time.monotonic()
+        try:
+            with open(file_path, "ab") as file:
+                file.truncate(partial["size"])
+                if not partial["size"] and head is not None:
+                    partial["size"] = await asyncio.to_thread(
+                        write_member,
+                        file,
+                        head(owner.username or owner.first_name, other_username),
+                    )
+                async for page in history_pages(client, chat_id, partial["last_id"]):
+                    records = [to_record(msg, owner.id) for msg in page]
+                    # compressing is CPU work, keep it off the event loop
+                    partial["size"] = await asyncio.to_thread(
+                        write_member, file, render(records)
+                    )
+                    partial["last_id"] = page[-1].id
+                    partial["count"] += len(records)
+                    state["partial"] = partial
+                    await adb.aset(DB_MODULE, key, state)
+                    if time.monotonic() - last_progress >= PROGRESS_INTERVAL:
+                        last_progress = time.monotonic()
+                        await limiter.edit(
+                            please_wait,
+                            f"Exported {partial['count']} messages...",
+                            wait=False,
+                        )
+                if foot is not None:
+                    partial["size"] = await asyncio.to_thread(
+                        write_member, file, foot()
+                    )
+            partial["done"] = True
+            state["partial"] = partial
+            await adb.aset(DB_MODULE, key, state)
+        except Exception as e:
+            return await please_wait.edit(
+                f"{format_exc(e)}\nRun the command again to continue the export"
+            )
 
-    await client.send_document(chat_id, file_path)
+    try:
+        await client.send_document(
+            chat_id,
+            file_path,
+            caption=f"{partial['count']} messages",
+            progress=ProgressReporter(
+                please_wait, "Uploading...", os.path.basename(file_path)
+            ).update,
+        )
+    except Exception as e:
+        return await please_wait.edit(
+            f"{format_exc(e)}\nRun the command again to retry the upload"
+        )
+    state.pop("partial", None)
+    state["exported"] = partial["last_id"]
+    await adb.aset(DB_MODULE, key, state)
     os.remove(file_path)
     await please_wait.delete()
 
+
 modules_help["exchat"] = {
-    "exchat": "Export all messages in the chat to a HTML file"
+    "exchat [html|jsonl|csv]": "Export all messages in the chat to a gzipped HTML, JSONL or CSV file",
+    "exchat [html|jsonl|csv] new": "Export only messages after the last export of the chat",
 }
@@ -1,5 +1,5 @@
 import os
-import requests
+from utils import http
 from urllib.parse import quote
 from pyrogram import Client, filters, enums
 from pyrogram.types import Message
@@ -35,7 +35,7 @@ async def google_command(client, message: Message):
             screenshot_url = (
                 f"{APIFLASH_API_URL}?access_key={APIFLASH_API_KEY}&url={quote(selected_result['url'])}"
             )
-            screenshot_response = requests.get(screenshot_url)
+            screenshot_response = await http.get(screenshot_url)
             screenshot_response.raise_for_status()
 
             with open("screenshot.jpg", "wb") as f:
@@ -58,7 +58,7 @@ async def google_command(client, message: Message):
     await message.edit(f"Searching for `{query}`...", parse_mode=enums.ParseMode.MARKDOWN)
 
     try:
-        response = requests.get(f"{GOOGLE_SEARCH_API}{quote(query)}")
+        response = await http.get(f"{GOOGLE_SEARCH_API}{quote(query)}")
         response.raise_for_status()
         data = response.json()
 
@@ -79,7 +79,7 @@ async def google_command(client, message: Message):
 
         google_search_url = f"https://www.google.com/search?q={quote(query)}"
         screenshot_url = f"{APIFLASH_API_URL}?access_key={APIFLASH_API_KEY}&url={quote(google_search_url)}"
-        screenshot_response = requests.get(screenshot_url)
+        screenshot_response = await http.get(screenshot_url)
         screenshot_response.raise_for_status()
 
         with open("google_search_page.jpg", "wb") as f:
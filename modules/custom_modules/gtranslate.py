@@ -1,9 +1,9 @@
-import requests
+from utils import http
 from pyrogram import Client, filters, enums
 from pyrogram.types import Message
 from utils.misc import modules_help, prefix
 
-def google_translate(query, source_lang="auto", target_lang="en"):
+async def google_translate(query, source_lang="auto", target_lang="en"):
     url = "https://translate.google.com/translate_a/single"
     params = {
         "client": "gtx",
@@ -15,7 +15,7 @@ def google_translate(query, source_lang="auto", target_lang="en"):
     headers = {
         "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/114.0.0.0 Safari/537.36"
     }
-    response = requests.get(url, params=params, headers=headers)
+    response = await http.get(url, params=params, headers=headers)
     if response.status_code == 200:
         data = response.json()
         return "".join([item[0] for item in data[0]])
@@ -44,7 +44,7 @@ async def translate_text(client, message: Message):
     processing_message = await (message.edit("Translating...") if message.from_user.is_self else message.reply("Translating..."))
 
     try:
-        translated_text = google_translate(query, target_lang=target_lang)
+        translated_text = await google_translate(query, target_lang=target_lang)
         await processing_message.edit(f"**Translated Text ({target_lang.upper()}):**\n{translated_text}", parse_mode=enums.ParseMode.MARKDOWN)
     except Exception as e:
         await processing_message.edit(f"Failed to translate the text: {str(e)}")
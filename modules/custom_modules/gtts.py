@@ -1,4 +1,4 @@
-import requests
+from utils import http
 import os
 from pyrogram import Client, filters
 from pyrogram.types import Message
@@ -8,13 +8,8 @@ GOOGLE_TTS_URL = "https://translate.google.com/translate_tts?ie=UTF-8&client=tw-
 
 async def download_audio(url, output_file):
     try:
-        response = requests.get(url, stream=True)
-        response.raise_for_status()
-        with open(output_file, "wb") as file:
-            for chunk in response.iter_content(chunk_size=1024):
-                file.write(chunk)
-        return output_file
-    except requests.RequestException:
+        return await http.download(url, output_file)
+    except http.REQUEST_ERRORS:
         return None
 
 @Client.on_message(filters.command(["gtts"], prefix))
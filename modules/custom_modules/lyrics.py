@@ -1,4 +1,4 @@
-import requests
+from utils import http
 from pyrogram import Client, enums, filters
 from pyrogram.types import Message
 from utils.misc import modules_help, prefix
@@ -9,7 +9,7 @@ def format_lyrics_result(data):
 async def search_lyrics(api_url, format_function, message, query):
     await message.edit("Searching...")
     url = f"{api_url}{query}"
-    response = requests.get(url)
+    response = await http.get(url)
     
     if response.status_code == 200:
         try:
@@ -12,8 +12,16 @@ from collections import defaultdict
 
 from utils.db import db
 from utils.misc import modules_help, prefix
+from utils.settings import settings
 
-mlog_enabled = filters.create(lambda _, __, ___: db.get("custom.mlog", "status", False))
+mlog_settings = settings("custom.mlog")
+
+
+async def mlog_enabled_filter(_, __, ___):
+    return mlog_settings.get("status", False)
+
+
+mlog_enabled = filters.create(mlog_enabled_filter)
 
 # Media cache and processing tasks
 user_media_cache = defaultdict(list)
@@ -76,7 +84,7 @@ async def process_media(client: Client, user):
     if user_id == me.id:
         return
 
-    chat_id = db.get("custom.mlog", "chat")
+    chat_id = mlog_settings.get("chat")
     if not chat_id:
         return await client.send_message(
             "me",
@@ -1,7 +1,6 @@
-import requests
+from utils import http, media
 from pyrogram import Client, filters
 from pyrogram.types import Message
-import os
 
 from utils.misc import modules_help, prefix
 
@@ -9,6 +8,27 @@ OCR_SPACE_API_KEY = "K83738930788957"
 OCR_SPACE_URL = "https://api.ocr.space/parse/image"
 
 
+async def ocr_image(message: Message) -> str:
+    """Text recognized in photo of message, recognized once per photo"""
+
+    async def recognize() -> bytes:
+        with await media.download(message) as photo:
+            response = await http.post(
+                OCR_SPACE_URL,
+                files={"file": photo},
+                data={"apikey": OCR_SPACE_API_KEY},
+                timeout=10  # Optional timeout
+            )
+        if response.status_code != 200:
+            raise RuntimeError("An error occurred, please try again later.")
+        result = response.json()
+        if result["IsErroredOnProcessing"]:
+            raise RuntimeError("Error occurred during OCR processing. Please try again.")
+        return result["ParsedResults"][0]["ParsedText"].encode()
+
+    return (await media.cached(message, "ocr", recognize)).decode()
+
+
 @Client.on_message(filters.command(["ocr"], prefix) & filters.me)
 async def ocr_space(_, message: Message):
     if not message.reply_to_message or not message.reply_to_message.photo:
@@ -17,30 +37,14 @@ async def ocr_space(_, message: Message):
 
     await message.edit("Processing image...")
 
-    photo = await message.reply_to_message.download()
     try:
-        with open(photo, 'rb') as image_file:
-            response = requests.post(
-                OCR_SPACE_URL,
-                files={"file": image_file},
-                data={"apikey": OCR_SPACE_API_KEY},
-                timeout=10  # Optional timeout
-            )
-
-        if response.status_code == 200:
-            result = response.json()
-            if result["IsErroredOnProcessing"]:
-                await message.edit("Error occurred during OCR processing. Please try again.")
-            else:
-                parsed_text = result["ParsedResults"][0]["ParsedText"]
-                await message.edit(f"<b>Extracted Text:</b>\n{parsed_text}")
-        else:
-            await message.edit("An error occurred, please try again later.")
+        parsed_text = await ocr_image(message.reply_to_message)
+        await message.edit(f"<b>Extracted Text:</b>\n{parsed_text}")
+    except RuntimeError as e:
+        await message.edit(str(e))
     except Exception as e:
         await message.edit("An unexpected error occurred.")
         print(f"Error: {e}")
-    finally:
-        os.remove(photo)  # Clean up the downloaded file
 
 modules_help["ocr"] = {
     "ocr": "Reply to an image with this command to extract text from it using OCR.Space API."
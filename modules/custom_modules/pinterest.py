@@ -2,7 +2,7 @@ from pyrogram import Client, filters, enums
 from pyrogram.types import Message, InputMediaPhoto
 from io import BytesIO
 from PIL import Image
-import requests
+from utils import http
 import asyncio
 from utils.misc import modules_help, prefix
 
@@ -27,7 +27,7 @@ def resize_image(image_bytes):
 
 async def download_image(url):
     try:
-        response = requests.get(url)
+        response = await http.get(url)
         if response.status_code == 200:
             img_bytes = BytesIO(response.content)
             return resize_image(img_bytes)
@@ -48,7 +48,7 @@ async def pinterest_search(client: Client, message: Message):
     status_message = await message.edit("Searching for images...", parse_mode=enums.ParseMode.MARKDOWN)
 
     url = f"{API_URL}{query}"
-    response = requests.get(url)
+    response = await http.get(url)
 
     if response.status_code == 200:
         data = response.json()
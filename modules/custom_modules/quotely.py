@@ -1,11 +1,12 @@
 import base64
-from io import BytesIO
-import requests
+from utils import http
+from utils.mediacache import media_cache
 from pyrogram import Client, filters, errors, types
 from pyrogram.types import Message
 
+from utils.imaging import resize_image_async
 from utils.misc import modules_help, prefix
-from utils.scripts import with_reply, format_exc, resize_image
+from utils.scripts import with_reply, format_exc
 
 
 @Client.on_message(filters.command(["sq", "sq"], prefix))
@@ -60,14 +61,14 @@ async def uquote_cmd(client: Client, message: Message):
         "text_color": "#fff",
     }
 
-    response = requests.post(url, json=params)
+    response = await http.post(url, json=params)
     if not response.ok:
         return await mm.edit(
             f"<b>Quotes API error!</b>\n" f"<code>{response.text}</code>"
         )
 
-    resized = resize_image(
-        BytesIO(response.content), img_type="PNG" if is_png else "WEBP"
+    resized = await resize_image_async(
+        response.content, img_type="PNG" if is_png else "WEBP"
     )
     await mm.edit("<b>Sending...</b>")
 
@@ -118,12 +119,12 @@ async def ufake_quote_cmd(client: Client, message: types.Message):
         "text_color": "#fff",
     }
 
-    response = requests.post(url, json=params)
+    response = await http.post(url, json=params)
     if not response.ok:
         return await mm.edit(f"<b>Quotes API error!</b>\n<code>{response.text}</code>")
 
-    resized = resize_image(
-        BytesIO(response.content), img_type="PNG" if is_png else "WEBP"
+    resized = await resize_image_async(
+        response.content, img_type="PNG" if is_png else "WEBP"
     )
     await mm.edit("<b>Sending...</b>")
 
@@ -137,18 +138,10 @@ async def ufake_quote_cmd(client: Client, message: types.Message):
         await mm.delete()
 
 
-files_cache = {}
-
-
 async def render_message(app: Client, message: types.Message) -> dict:
-    async def get_file(file_id) -> str:
-        if file_id in files_cache:
-            return files_cache[file_id]
-
-        content = await app.download_media(file_id, in_memory=True)
-        data = base64.b64encode(bytes(content.getbuffer())).decode()
-        files_cache[file_id] = data
-        return data
+    async def get_file(file_id, unique_id) -> str:
+        data = await media_cache.download(app, file_id, unique_id)
+        return base64.b64encode(data).decode()
 
     # text
     if message.photo:
@@ -162,9 +155,9 @@ async def render_message(app: Client, message: types.Message) -> dict:
 
     # media
     if message.photo:
-        media = await get_file(message.photo.file_id)
+        media = await get_file(message.photo.file_id, message.photo.file_unique_id)
     elif message.sticker:
-        media = await get_file(message.sticker.file_id)
+        media = await get_file(message.sticker.file_id, message.sticker.file_unique_id)
     else:
         media = ""
 
@@ -221,10 +214,12 @@ async def render_message(app: Client, message: types.Message) -> dict:
                 )
 
         if from_user.photo:
-            author["avatar"] = await get_file(from_user.photo.big_file_id)
+            author["avatar"] = await get_file(
+                from_user.photo.big_file_id, from_user.photo.big_photo_unique_id
+            )
         elif not from_user.photo and from_user.username:
             # may be user blocked us, we will try to get avatar via t.me
-            t_me_page = requests.get(f"https://t.me/{from_user.username}").text
+            t_me_page = (await http.get(f"https://t.me/{from_user.username}")).text
             sub = '<meta property="og:image" content='
             index = t_me_page.find(sub)
             if index != -1:
@@ -235,7 +230,7 @@ async def render_message(app: Client, message: types.Message) -> dict:
                     and link[0] != "https://telegram.org/img/t_logo.png"
                 ):
                     # found valid link
-                    avatar = requests.get(link[0]).content
+                    avatar = (await http.get(link[0])).content
                     author["avatar"] = base64.b64encode(avatar).decode()
                 else:
                     author["avatar"] = ""
@@ -253,7 +248,10 @@ async def render_message(app: Client, message: types.Message) -> dict:
         author["rank"] = "channel" if message.sender_chat.type == "channel" else ""
 
         if message.sender_chat.photo:
-            author["avatar"] = await get_file(message.sender_chat.photo.big_file_id)
+            author["avatar"] = await get_file(
+                message.sender_chat.photo.big_file_id,
+                message.sender_chat.photo.big_photo_unique_id,
+            )
         else:
             author["avatar"] = ""
     author["via_bot"] = message.via_bot.username if message.via_bot else ""
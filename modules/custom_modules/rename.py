@@ -1,9 +1,8 @@
-import os
-import time
 from pyrogram import Client, filters
 from pyrogram.types import Message
+from utils import media
 from utils.misc import modules_help, prefix
-from utils.scripts import format_exc, progress
+from utils.scripts import ProgressReporter, format_exc
 
 
 @Client.on_message(filters.command("rename", prefix) & filters.me)
@@ -18,33 +17,27 @@ async def rename_file(client: Client, message: Message):
     status_msg = await message.edit("<code>Renaming...</code>")
 
     try:
-        # Download the replied-to file
-        start_time = time.time()
-        original_file = await message.reply_to_message.download(
-            progress=progress,
-            progress_args=(status_msg, start_time, "`Renaming...`"),
-        )
-
-        # Rename the file
-        os.rename(original_file, new_name)
-        await status_msg.edit("<code>Done, Uploading...</code>")
-
-        # Upload the renamed file
-        await client.send_document(
-            message.chat.id,
-            new_name,
-            reply_to_message_id=message.id,
-            progress=progress,
-            progress_args=(status_msg, start_time, "`Done, Uploading...`"),
-        )
+        # Download the replied-to file, already under the new name
+        with await media.download(
+            message.reply_to_message,
+            name=new_name,
+            progress=ProgressReporter(status_msg, "`Renaming...`").update,
+        ) as renamed_file:
+            await status_msg.edit("<code>Done, Uploading...</code>")
+
+            # Upload the renamed file
+            await client.send_document(
+                message.chat.id,
+                renamed_file,
+                file_name=new_name,
+                reply_to_message_id=message.id,
+                progress=ProgressReporter(status_msg, "`Done, Uploading...`").update,
+            )
 
     except Exception as e:
         await status_msg.edit(format_exc(e))
 
     finally:
-        # Cleanup the renamed file
-        if os.path.exists(new_name):
-            os.remove(new_name)
         await status_msg.delete()
 
 
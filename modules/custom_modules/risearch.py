@@ -1,5 +1,5 @@
 from utils.misc import modules_help, prefix
-import requests
+from utils import http
 from pyrogram import Client, filters
 from pyrogram.types import Message
 from modules.url import generate_screenshot
@@ -45,7 +45,7 @@ async def reverse_image_search(client: Client, message: Message):
     try:
         # Download and upload the image
         photo_path = await message.reply_to_message.download()
-        img_url = upload_image(photo_path)
+        img_url = await upload_image(photo_path)
         print(img_url)
         if not img_url:
             await processing_message.edit("Error: Could not upload the image.")
@@ -62,11 +62,11 @@ async def reverse_image_search(client: Client, message: Message):
             os.remove(photo_path)
 
 
-def upload_image(photo_path):
+async def upload_image(photo_path):
     """Uploads an image to tmpfiles.org and returns the direct download URL."""
     try:
         with open(photo_path, "rb") as image_file:
-            response = requests.post(
+            response = await http.post(
                 "https://tmpfiles.org/api/v1/upload", files={"file": image_file}
             )
         if response.status_code == 200:
@@ -84,7 +84,7 @@ def upload_image(photo_path):
 
 async def send_screenshot(client, message, url, engine_name):
     """Takes a screenshot of the URL and sends it to the chat."""
-    screenshot_data = generate_screenshot(url)
+    screenshot_data = await generate_screenshot(url)
     if screenshot_data:
         await client.send_photo(
             message.chat.id,
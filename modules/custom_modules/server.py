@@ -7,7 +7,7 @@ import time
 from pyrogram import Client, filters, enums
 from pyrogram.types import Message
 from pyrogram.enums.chat_type import ChatType
-import requests
+from utils import http
 
 # noinspection PyUnresolvedReferences
 from utils.misc import modules_help, prefix
@@ -146,7 +146,7 @@ async def serverinfo_cmd(_: Client, message: Message):
 
     try:
         if message.chat.type == enums.ChatType.PRIVATE:
-            ip = requests.get("https://api.ipify.org?format=text").text
+            ip = (await http.get("https://api.ipify.org?format=text")).text
         else:
             ip = "***"
         inf.append(escape_html(ip))
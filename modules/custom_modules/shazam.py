@@ -1,5 +1,5 @@
 import os
-import requests
+from utils import http
 from urllib.parse import quote
 from pyrogram import Client, filters, enums
 from pyrogram.types import Message
@@ -21,13 +21,13 @@ async def shazam_music(client, message: Message):
     try:
         await message.edit("Uploading audio file...")
         with open(audio_path, "rb") as audio_file:
-            upload_response = requests.post("https://x0.at", files={"file": audio_file})
+            upload_response = await http.post("https://x0.at", files={"file": audio_file})
             upload_response.raise_for_status()
             audio_url = upload_response.text.strip()
         
         await message.edit("Analyzing audio file...")
         url = f"{MUSIC_API_URL}?url={quote(audio_url)}&apikey={API_KEY}"
-        response = requests.get(url)
+        response = await http.get(url)
         response.raise_for_status()
         data = response.json()
 
@@ -1,10 +1,29 @@
 import asyncio
 import logging
+import time
+from typing import Dict, List
 
-from pyrogram import Client, enums, filters
-from pyrogram.errors import RPCError
+from pyrogram import Client, enums, filters, raw
+from pyrogram.errors import ChatForwardsRestricted, RPCError
+from pyrogram.types import Message
+from utils.db import adb
 from utils.misc import modules_help, prefix
+from utils.ratelimit import limiter
 from utils.scripts import text, edit_or_reply, format_exc
+from utils.settings import settings
+
+DB_MODULE = "custom.shift"
+# messages fetched per history request and forwarded per request
+PAGE_SIZE = 100
+# pages fetched ahead of the ones being sent
+PREFETCH = 2
+PROGRESS_INTERVAL = 5
+CHECKPOINT_INTERVAL = 10
+# new messages in followed chats are collected for this long, so albums
+# arrive in one piece
+FOLLOW_DELAY = 2
+
+shift_settings = settings(DB_MODULE)
 
 
 # Helper function to get text from a message
@@ -16,82 +35,320 @@ def text(message):
 def parse_limit(limit):
     return int(limit) if limit and limit.isdigit() else None
 
-fromchat = None
-tochat = None
+
+class Mirror:
+    """
+    Copy messages of one chat to another, oldest first
+
+    Messages are forwarded without the author in batches of up to 100, so
+    albums stay albums. When the source forbids forwarding, they are copied
+    one by one, albums with copy_media_group. Everything goes through the
+    rate limiter, which slows down on FloodWait. The id of the last copied
+    message is saved, so the next run continues after it.
+    """
+
+    def __init__(self, client: Client, source: int, destination: int):
+        self.client = client
+        self.source = source
+        self.destination = destination
+        self.cursor = 0
+        self.copied = 0
+        self.forward = True
+        self._lock = asyncio.Lock()
+
+    @property
+    def _key(self) -> str:
+        return f"mirror{self.source}:{self.destination}"
+
+    def load(self) -> bool:
+        """Continue from the saved cursor, False if there is none"""
+        state = shift_settings.get(self._key)
+        if not state:
+            return False
+        self.cursor = state["cursor"]
+        self.forward = state.get("forward", True)
+        return True
+
+    async def checkpoint(self):
+        await adb.aset(
+            DB_MODULE, self._key, {"cursor": self.cursor, "forward": self.forward}
+        )
+
+    async def start_from_last(self, count: int):
+        """Start with the last count messages of the source"""
+        async for message in self.client.get_chat_history(
+            self.source, limit=1, offset=count - 1
+        ):
+            self.cursor = message.id - 1
+
+    async def _pages(self, queue: asyncio.Queue):
+        peer = await self.client.resolve_peer(self.source)
+        cursor = self.cursor
+        cancelled = False
+        try:
+            while True:
+                # negative add_offset pages towards newer messages
+                result = await self.client.invoke(
+                    raw.functions.messages.GetHistory(
+                        peer=peer,
+                        offset_id=cursor + 1,
+                        offset_date=0,
+                        add_offset=-PAGE_SIZE,
+                        limit=PAGE_SIZE,
+                        max_id=0,
+                        min_id=cursor,
+                        hash=0,
+                    )
+                )
+                messages = sorted(
+                    (msg for msg in result.messages if msg.id > cursor),
+                    key=lambda msg: msg.id,
+                )
+                if not messages:
+                    break
+                cursor = messages[-1].id
+                await queue.put(messages)
+        except asyncio.CancelledError:
+            cancelled = True
+            raise
+        finally:
+            # tells run() there is nothing more, also after errors
+            if not cancelled:
+                await queue.put(None)
+
+    @staticmethod
+    def _batches(messages: list) -> List[List[int]]:
+        """Ids of messages to send, in batches that don't split albums"""
+        batches = [[]]
+
+        def add(ids: List[int]):
+            if len(batches[-1]) + len(ids) > PAGE_SIZE:
+                batches.append([])
+            batches[-1].extend(ids)
+
+        album, album_id = [], None
+        for msg in messages:
+            if not isinstance(msg, raw.types.Message):
+                # service messages can't be forwarded or copied
+                continue
+            if album and msg.grouped_id != album_id:
+                add(album)
+                album = []
+            if msg.grouped_id:
+                album_id = msg.grouped_id
+                album.append(msg.id)
+                continue
+            add([msg.id])
+        if album:
+            add(album)
+        return [batch for batch in batches if batch]
+
+    async def _copy(self, ids: List[int]):
+        messages = await self.client.get_messages(self.source, ids)
+        done = set()
+        for message in messages:
+            if message.empty or message.id in done:
+                continue
+            if message.media_group_id:
+                group = [
+                    msg.id
+                    for msg in messages
+                    if msg.media_group_id == message.media_group_id
+                ]
+                done.update(group)
+                await limiter.call(
+                    self.destination,
+                    "send",
+                    self.client.copy_media_group,
+                    self.destination,
+                    self.source,
+                    message.id,
+                )
+            else:
+                await limiter.call(
+                    self.destination, "send", message.copy, self.destination
+                )
+
+    async def _send(self, ids: List[int]):
+        if self.forward:
+            try:
+                await limiter.call(
+                    self.destination,
+                    "send",
+                    self.client.forward_messages,
+                    self.destination,
+                    self.source,
+                    ids,
+                    drop_author=True,
+                )
+                return
+            except ChatForwardsRestricted:
+                self.forward = False
+        await self._copy(ids)
+
+    async def run(self, progress=None):
+        """Copy everything after the cursor, return number of messages copied"""
+        async with self._lock:
+            queue = asyncio.Queue(PREFETCH)
+            fetcher = asyncio.ensure_future(self._pages(queue))
+            last_progress = last_checkpoint = time.monotonic()
+            copied = 0
+            # album at the end of a page may continue on the next one
+            carry = []
+            try:
+                while True:
+                    page = await queue.get()
+                    messages = carry + (page or [])
+                    carry = []
+                    if not messages:
+                        break
+                    last = messages[-1]
+                    if page and getattr(last, "grouped_id", None):
+                        while (
+                            messages
+                            and getattr(messages[-1], "grouped_id", None)
+                            == last.grouped_id
+                        ):
+                            carry.insert(0, messages.pop())
+                    for ids in self._batches(messages):
+                        await self._send(ids)
+                        copied += len(ids)
+                        self.copied += len(ids)
+                    self.cursor = carry[0].id - 1 if carry else last.id
+                    if page is None:
+                        break
+                    now = time.monotonic()
+                    if (
+                        progress is not None
+                        and now - last_progress >= PROGRESS_INTERVAL
+                    ):
+                        last_progress = now
+                        await progress(self)
+                    if now - last_checkpoint >= CHECKPOINT_INTERVAL:
+                        last_checkpoint = now
+                        await self.checkpoint()
+                await fetcher
+            finally:
+                fetcher.cancel()
+                await self.checkpoint()
+            return copied
+
+
+# mirrors of followed chats by source chat id
+mirrors: Dict[int, List[Mirror]] = {}
+_pending_syncs: Dict[int, asyncio.Task] = {}
+
+
+def followed(chat_id: int) -> List[int]:
+    return shift_settings.get(f"follow{chat_id}") or []
+
+
+async def _sync(client: Client, chat_id: int):
+    await asyncio.sleep(FOLLOW_DELAY)
+    _pending_syncs.pop(chat_id, None)
+    if chat_id not in mirrors:
+        mirrors[chat_id] = []
+    destinations = followed(chat_id)
+    known = {mirror.destination for mirror in mirrors[chat_id]}
+    for destination in destinations:
+        if destination not in known:
+            mirror = Mirror(client, chat_id, destination)
+            mirror.load()
+            mirrors[chat_id].append(mirror)
+    for mirror in mirrors[chat_id]:
+        if mirror.destination not in destinations:
+            continue
+        try:
+            await mirror.run()
+        except RPCError:
+            logging.exception(
+                "Failed to mirror %s to %s", mirror.source, mirror.destination
+            )
+
+
+async def followed_filter(_, __, message: Message):
+    return bool(followed(message.chat.id))
+
+
+@Client.on_message(filters.create(followed_filter), group=1)
+async def follow_handler(client: Client, message: Message):
+    chat_id = message.chat.id
+    if chat_id not in _pending_syncs:
+        _pending_syncs[chat_id] = asyncio.ensure_future(_sync(client, chat_id))
+
+
+async def _chat_id(client: Client, chat) -> int:
+    return chat if isinstance(chat, int) else (await client.get_chat(chat)).id
+
 
 @Client.on_message(filters.command("shift", prefix) & filters.me)
 async def shift(client, message):
     lol = await edit_or_reply(message, "Processing please wait")
-    x = message.text.split(None, 1)[1]
-    x = x.replace(" ", "")
     try:
-        fromchat, tochat, limit = x.split("|")
-    except:
+        x = message.text.split(None, 1)[1]
+    except IndexError:
+        return await lol.edit("Check command syntax")
+    x = x.replace(" ", "")
+
+    if x.startswith("stop"):
         try:
-            fromchat, tochat, limit = x.split("|")
-        except:
-            await lol.edit("Check command syntax", parse_mode=enums.ParseMode.HTML)
+            fromchat = await _chat_id(client, parse_chat(x[4:]))
+        except (ValueError, RPCError):
+            return await lol.edit("Enter a vailed username or id")
+        await adb.aremove(DB_MODULE, f"follow{fromchat}")
+        mirrors.pop(fromchat, None)
+        return await lol.edit(f"Stopped following {fromchat}")
+
+    args = x.split("|")
+    if len(args) not in (3, 4) or (len(args) == 4 and args[3] != "follow"):
+        return await lol.edit("Check command syntax", parse_mode=enums.ParseMode.HTML)
     try:
-        fromchat = int(fromchat)
-    except:
-        if not (fromchat.startswith("@")):
-            await lol.edit("Enter a vailed username or id")
-            return
+        fromchat, tochat = parse_chat(args[0]), parse_chat(args[1])
+    except ValueError:
+        return await lol.edit("Enter a vailed username or id")
+    limit = parse_limit(args[2])
+    if limit is None and args[2].lower() != "none":
+        return await lol.edit("Enter a vailed limit")
+    follow = len(args) == 4
+
     try:
-        tochat = int(tochat)
-    except:
-        if not (tochat.startswith("@")):
-            await lol.edit("Enter a vailed username or id")
-            return
+        fromchat = await _chat_id(client, fromchat)
+        tochat = await _chat_id(client, tochat)
+        mirror = Mirror(client, fromchat, tochat)
+        if not mirror.load() and limit:
+            await mirror.start_from_last(limit)
 
-    a = 0
-    if limit == "None" or limit == "none":
-        try:
-            async for message in client.get_chat_history(fromchat):
-                try:
-                    await message.copy(tochat)
-                    a = a + 1
-                except Exception as e:
-                    await lol.edit(e)
-                    pass
-                except RPCError as i:
-                    await lol.edit(i)
-                    pass
-
-                await asyncio.sleep(1)
-            await lol.edit(
-                f"Successfully shifted {a} messages from {fromchat} to {tochat}"
+        async def progress(mirror: Mirror):
+            await limiter.edit(
+                lol, f"Shifted {mirror.copied} messages...", wait=False
             )
-        except RPCError as i:
-            await lol.edit(i)
-            return
-    else:
-        try:
-            limit = int(limit)
-        except:
-            lol.edit("Enter a vailed limit")
-            return
-        try:
-            async for message in client.get_chat_history(
-                fromchat, limit=limit
-            ):
-                try:
-                    await message.copy(tochat)
-
-                    a = a + 1
-                except Exception as e:
-                    await lol.edit(e)
-                    pass
-                except RPCError as i:
-                    await lol.edit(i)
-                    pass
-                await asyncio.sleep(1)
-            await lol.edit(
-                f"Successfully shifted {a} messages from {fromchat} to {tochat}"
-            )
-        except RPCError as i:
-            await lol.edit(i)
-            return
+
+        if follow and not any(
+            item.destination == tochat for item in mirrors.get(fromchat, [])
+        ):
+            mirrors.setdefault(fromchat, []).append(mirror)
+        await mirror.run(progress)
+    except RPCError as e:
+        return await lol.edit(format_exc(e))
+
+    result = (
+        f"Successfully shifted {mirror.copied} messages from {fromchat} to {tochat}"
+    )
+    if follow:
+        destinations = followed(fromchat)
+        if tochat not in destinations:
+            await adb.aset(DB_MODULE, f"follow{fromchat}", [*destinations, tochat])
+        result += ", following new messages"
+    await limiter.edit(lol, result)
+
+
+def parse_chat(chat: str):
+    try:
+        return int(chat)
+    except ValueError:
+        if not chat.startswith("@"):
+            raise
+        return chat
 
 
 @Client.on_message(filters.command("dmshift", prefix) & filters.me)
@@ -131,7 +388,10 @@ async def dmshift(client, message):
 
 
 modules_help["shift"] = {
-    "shift": "Steal all from one chat to other chat \n .shift fromchat | to chat | limit none for no limits\nNote: | is essential",
+    "shift": "Steal all from one chat to other chat \n .shift fromchat | to chat | limit none for no limits\nNote: | is essential"
+    "\nRunning it again continues after the last shifted message",
+    "shift [from] | [to] | [limit] | follow": "Shift, then keep shifting new messages of the chat",
+    "shift stop [from]": "Stop following the chat",
     "dmshift": "forward a message to someone without forward tag",
     "Special Thanks": "FridayUB",
 }
@@ -1,4 +1,4 @@
-import requests
+from utils import http
 from pyrogram import Client, filters, enums
 from pyrogram.types import Message
 from utils.misc import modules_help, prefix
@@ -24,7 +24,7 @@ async def translate_text(client, message: Message):
     
     try:
         # Call the translation API
-        response = requests.get(TRANSLATE_API.format(query=query))
+        response = await http.get(TRANSLATE_API.format(query=query))
         response.raise_for_status()
         data = response.json()
 
@@ -33,7 +33,7 @@ async def translate_text(client, message: Message):
 
         # Send the translation result
         await processing_message.edit(f"{translated_text}", parse_mode=enums.ParseMode.MARKDOWN)
-    except requests.exceptions.RequestException:
+    except http.REQUEST_ERRORS:
         await processing_message.edit("Failed to translate the text. Please try again later.")
     except ValueError:
         await processing_message.edit("Invalid response received from the translation API.")
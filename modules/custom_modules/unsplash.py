@@ -6,7 +6,7 @@ import shutil
 import aiohttp
 from pyrogram import Client, enums, filters
 from pyrogram.types import Message
-import requests
+from utils import http
 from utils.misc import modules_help, prefix
 
 
@@ -55,7 +55,7 @@ async def unsplash(client: Client, message: Message):
                 for ia in range(len(images), count):
                     img = data["results"][ia]["urls"]["raw"]
                     if img.startswith("https://images.unsplash.com/photo"):
-                        image_content = requests.get(img).content
+                        image_content = (await http.get(img)).content
                         with open(f"{unsplash_dir}/unsplash_{ia}.jpg", "wb") as f:
                             f.write(image_content)
                         imgr = f"{unsplash_dir}/unsplash_{ia}.jpg"
@@ -1,4 +1,4 @@
-import requests
+from utils import http
 import os
 from pyrogram import Client, filters
 from pyrogram.types import Message
@@ -25,13 +25,8 @@ def set_default_character_in_db(character: str):
 async def download_voice(url: str, output_file: str):
     """Download the voice file from the given URL."""
     try:
-        response = requests.get(url, stream=True, timeout=10)
-        response.raise_for_status()
-        with open(output_file, "wb") as file:
-            for chunk in response.iter_content(chunk_size=1024):
-                file.write(chunk)
-        return output_file
-    except requests.RequestException:
+        return await http.download(url, output_file, timeout=10)
+    except http.REQUEST_ERRORS:
         return None
 
 @Client.on_message(filters.command(["set_character"], prefix) & filters.me)
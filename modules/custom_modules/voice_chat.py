@@ -1,6 +1,9 @@
 import os
+
+import aiofiles
 from pyrogram import Client, filters
 from pyrogram.types import Message
+from utils import media, workers
 from utils.misc import modules_help, prefix
 from utils.scripts import with_reply, restart
 from pytgcalls import GroupCallFactory
@@ -53,15 +56,23 @@ async def start_playout(client, message: Message):
         except Exception as e:
             return await status_msg.edit(f"<b>Failed to join VC: <code>{e}</code></b>")
 
-    await status_msg.edit("<b>Downloading...</b>")
-    audio_file = await message.reply_to_message.download()
+    async def convert() -> bytes:
+        await status_msg.edit("<b>Downloading...</b>")
+        audio_file = await message.reply_to_message.download()
+        await status_msg.edit("<b>Converting...</b>")
+        try:
+            return await workers.run_process(
+                *ffmpeg.input(audio_file)
+                .output("pipe:1", format="s16le", acodec="pcm_s16le", ac=2, ar="48k")
+                .compile()
+            )
+        finally:
+            await clean_up(audio_file)
 
     input_filename = "input.raw"
-    await status_msg.edit("<b>Converting...</b>")
-    ffmpeg.input(audio_file).output(
-        input_filename, format="s16le", acodec="pcm_s16le", ac=2, ar="48k"
-    ).overwrite_output().run()
-    await clean_up(audio_file)
+    pcm = await media.cached(message.reply_to_message, "pcm", convert)
+    async with aiofiles.open(input_filename, "wb") as f:
+        await f.write(pcm)
 
     GROUP_CALL.input_filename = input_filename
     await status_msg.edit(f"<b>Playing {message.reply_to_message.audio.title}</b>...")
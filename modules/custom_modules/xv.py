@@ -1,7 +1,8 @@
-import requests
+from utils import http
 from pyrogram import Client, filters, enums
 from pyrogram.types import Message
 from io import BytesIO
+from urllib.parse import quote
 from utils.misc import modules_help, prefix
 
 BASE_URL = "https://api-aswin-sparky.koyeb.app/api"
@@ -10,22 +11,22 @@ DOWNLOAD_ENDPOINT = "/downloader/xdl?url="
 
 search_results = {}
 
-def fetch_data(endpoint, param):
+async def fetch_data(endpoint, param):
     try:
-        url = f"{BASE_URL}{endpoint}{requests.utils.quote(param)}"
-        response = requests.get(url)
+        url = f"{BASE_URL}{endpoint}{quote(param)}"
+        response = await http.get(url)
         response.raise_for_status()
         return response.json()
     except Exception as e:
         print(f"Error fetching data from {url}: {e}")
         return None
 
-def video_search(query):
-    data = fetch_data(SEARCH_ENDPOINT, query)
+async def video_search(query):
+    data = await fetch_data(SEARCH_ENDPOINT, query)
     return data.get("data") if data and data.get("status") else None
 
-def get_video_download_link(video_url):
-    data = fetch_data(DOWNLOAD_ENDPOINT, video_url)
+async def get_video_download_link(video_url):
+    data = await fetch_data(DOWNLOAD_ENDPOINT, video_url)
     if data and data.get("status"):
         return data["data"]
     return None
@@ -51,12 +52,12 @@ async def xvideos_command(client, message: Message):
         await message.edit(f"Downloading **{selected_result['title']}**, please wait...", parse_mode=enums.ParseMode.MARKDOWN)
 
         try:
-            download_link = get_video_download_link(selected_result["url"])
+            download_link = await get_video_download_link(selected_result["url"])
             if not download_link:
                 await message.edit("Failed to fetch the download link.", parse_mode=enums.ParseMode.MARKDOWN)
                 return
 
-            video_data = BytesIO(requests.get(download_link).content)
+            video_data = BytesIO((await http.get(download_link)).content)
             video_data.name = f"{number + 1}.mp4"
 
             caption = f">**Title:** {selected_result['title']}\n**Duration:** {selected_result['duration']}"
@@ -77,7 +78,7 @@ async def xvideos_command(client, message: Message):
     await message.edit(f"Searching for `{query}`...", parse_mode=enums.ParseMode.MARKDOWN)
 
     try:
-        results = video_search(query)
+        results = await video_search(query)
         if not results:
             await message.edit("No results found. Please try again.", parse_mode=enums.ParseMode.MARKDOWN)
             return
@@ -11,13 +11,13 @@ import urllib.parse
 from random import choice
 from subprocess import PIPE, Popen
 
-import requests
 from bs4 import BeautifulSoup
 from humanize import naturalsize
 
 from pyrogram import Client, enums, filters
 from pyrogram.types import Message
 
+from utils import http
 from utils.misc import modules_help, prefix
 
 
@@ -60,25 +60,25 @@ async def direct_link_generator(_, m: Message):
         await m.edit(reply, parse_mode=enums.ParseMode.MARKDOWN)
     for link in links:
         if "drive.google.com" in link:
-            reply += gdrive(link)
+            reply += await gdrive(link)
         elif "yadi.sk" in link:
-            reply += yandex_disk(link)
+            reply += await yandex_disk(link)
         elif "cloud.mail.ru" in link:
             reply += cm_ru(link)
         elif "mediafire.com" in link:
-            reply += mediafire(link)
+            reply += await mediafire(link)
         elif "sourceforge.net" in link:
-            reply += sourceforge(link)
+            reply += await sourceforge(link)
         elif "osdn.net" in link:
-            reply += osdn(link)
+            reply += await osdn(link)
         elif "androidfilehost.com" in link:
-            reply += androidfilehost(link)
+            reply += await androidfilehost(link)
         else:
             reply += re.findall(r"\bhttps?://(.*?[^/]+)", link)[0] + " is not supported"
     await m.edit(reply, parse_mode=enums.ParseMode.MARKDOWN)
 
 
-def gdrive(url: str) -> str:
+async def gdrive(url: str) -> str:
     """GDrive direct links generator"""
     drive = "https://drive.google.com"
     try:
@@ -95,7 +95,7 @@ def gdrive(url: str) -> str:
     elif link.find("uc?id=") != -1:
         file_id = link.split("uc?id=")[1].strip()
     url = f"{drive}/uc?export=download&id={file_id}"
-    download = requests.get(url, stream=True, allow_redirects=False)
+    download = await http.get(url, allow_redirects=False)
     cookies = download.cookies
     try:
         # In case of small file size, Google downloads directly
@@ -114,9 +114,7 @@ def gdrive(url: str) -> str:
     if page_element is not None:
         export = drive + page_element.get("href")
         name = page.find("span", {"class": "uc-name-size"}).text
-        response = requests.get(
-            export, stream=True, allow_redirects=False, cookies=cookies
-        )
+        response = await http.get(export, allow_redirects=False, cookies=cookies)
         dl_url = response.headers["location"]
         if "accounts.google.com" in dl_url:
             name = page.find("span", {"class": "uc-name-size"}).text
@@ -131,7 +129,7 @@ def gdrive(url: str) -> str:
     return reply
 
 
-def yandex_disk(url: str) -> str:
+async def yandex_disk(url: str) -> str:
     """Yandex.Disk direct links generator
     Based on https://github.com/wldhx/yadisk-direct"""
     reply = ""
@@ -142,7 +140,7 @@ def yandex_disk(url: str) -> str:
         return reply
     api = "https://cloud-api.yandex.net/v1/disk/public/resources/download?public_key={}"
     try:
-        dl_url = requests.get(api.format(link)).json()["href"]
+        dl_url = (await http.get(api.format(link))).json()["href"]
         name = dl_url.split("filename=")[1].split("&disposition")[0]
         reply += f"[{name}]({dl_url})\n"
     except KeyError:
@@ -177,7 +175,7 @@ def cm_ru(url: str) -> str:
     return reply
 
 
-def mediafire(url: str) -> str:
+async def mediafire(url: str) -> str:
     """MediaFire direct links generator"""
     try:
         link = re.findall(r"\bhttps?://.*mediafire\.com\S+", url)[0]
@@ -185,7 +183,7 @@ def mediafire(url: str) -> str:
         reply = "`No MediaFire links found`\n"
         return reply
     reply = ""
-    page = BeautifulSoup(requests.get(link).content, "lxml")
+    page = BeautifulSoup((await http.get(link)).content, "lxml")
     info = page.find("a", {"aria-label": "Download file"})
     dl_url = info.get("href")
     size = re.findall(r"\(.*\)", info.text)[0]
@@ -194,7 +192,7 @@ def mediafire(url: str) -> str:
     return reply
 
 
-def sourceforge(url: str) -> str:
+async def sourceforge(url: str) -> str:
     """SourceForge direct links generator"""
     try:
         link = re.findall(r"\bhttps?://.*sourceforge\.net\S+", url)[0]
@@ -208,7 +206,7 @@ def sourceforge(url: str) -> str:
         f"https://sourceforge.net/settings/mirror_choices?"
         f"projectname={project}&filename={file_path}"
     )
-    page = BeautifulSoup(requests.get(mirrors).content, "html.parser")
+    page = BeautifulSoup((await http.get(mirrors)).content, "html.parser")
     info = page.find("ul", {"id": "mirrorList"}).findAll("li")
     for mirror in info[1:]:
         name = re.findall(r"\((.*)\)", mirror.text.strip())[0]
@@ -219,7 +217,7 @@ def sourceforge(url: str) -> str:
     return reply
 
 
-def osdn(url: str) -> str:
+async def osdn(url: str) -> str:
     """OSDN direct links generator"""
     osdn_link = "https://osdn.net"
     try:
@@ -227,7 +225,9 @@ def osdn(url: str) -> str:
     except IndexError:
         reply = "`No OSDN links found`\n"
         return reply
-    page = BeautifulSoup(requests.get(link, allow_redirects=True).content, "lxml")
+    page = BeautifulSoup(
+        (await http.get(link, allow_redirects=True)).content, "lxml"
+    )
     info = page.find("a", {"class": "mirror_link"})
     link = urllib.parse.unquote(osdn_link + info["href"])
     reply = f"Mirrors for __{link.split('/')[-1]}__\n"
@@ -240,7 +240,7 @@ def osdn(url: str) -> str:
     return reply
 
 
-def androidfilehost(url: str) -> str:
+async def androidfilehost(url: str) -> str:
     """AFH direct links generator"""
     try:
         link = re.findall(r"\bhttps?://.*androidfilehost.*fid.*\S+", url)[0]
@@ -248,10 +248,9 @@ def androidfilehost(url: str) -> str:
         reply = "`No AFH links found`\n"
         return reply
     fid = re.findall(r"\?fid=(.*)", link)[0]
-    session = requests.Session()
-    user_agent = useragent()
+    user_agent = await useragent()
     headers = {"user-agent": user_agent}
-    res = session.get(link, headers=headers, allow_redirects=True)
+    res = await http.get(link, headers=headers, allow_redirects=True)
     headers = {
         "origin": "https://androidfilehost.com",
         "accept-encoding": "gzip, deflate, br",
@@ -269,7 +268,7 @@ def androidfilehost(url: str) -> str:
     reply = ""
     error = "`Error: Can't find Mirrors for the link`\n"
     try:
-        req = session.post(
+        req = await http.post(
             "https://androidfilehost.com/libs/otf/mirrors.otf.php",
             headers=headers,
             data=data,
@@ -288,14 +287,16 @@ def androidfilehost(url: str) -> str:
     return reply
 
 
-def useragent():
+async def useragent():
     """
     useragent random setter
     """
     useragents = BeautifulSoup(
-        requests.get(
-            "https://developers.whatismybrowser.com/"
-            "useragents/explore/operating_system_name/android/"
+        (
+            await http.get(
+                "https://developers.whatismybrowser.com/"
+                "useragents/explore/operating_system_name/android/"
+            )
         ).content,
         "lxml",
     ).findAll("td", {"class": "useragent"})
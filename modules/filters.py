@@ -14,6 +14,9 @@
 #  You should have received a copy of the GNU General Public License
 #  along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
+import re
+from typing import Dict, Optional
+
 from pyrogram import Client, ContinuePropagation, errors, filters
 from pyrogram.types import (
     InputMediaAudio,
@@ -23,118 +26,210 @@ from pyrogram.types import (
     Message,
 )
 
-from utils.db import db
+from utils.db import adb, db
+from utils.handlers import forget_media_group, send_cached_media_group
 from utils.misc import modules_help, prefix
 from utils.scripts import format_exc
 
+FILTER_MODES = {"-c": "contains", "-r": "regex", "-w": "wildcard"}
+
+
+def compile_trigger(name: str, mode: str) -> str:
+    if mode == "contains":
+        return re.escape(name)
+    if mode == "wildcard":
+        pattern = re.escape(name).replace(r"\*", ".*").replace(r"\?", ".")
+        return rf"\A(?:{pattern})\Z"
+    return name
+
+
+class ChatFilters:
+    """Triggers of a single chat, compiled for matching"""
+
+    def __init__(self, chat_filters: dict):
+        self.filters = chat_filters
+        self.exact = {}
+        self.names = {}
+        self.regexes = []
+        patterns = []
+        for name, value in chat_filters.items():
+            mode = value.get("MODE", "exact")
+            if mode == "exact":
+                self.exact[name] = value
+            elif mode == "regex":
+                # user regexes are compiled on their own, wrapping them in a
+                # named group would shift their numbered backreferences
+                try:
+                    self.regexes.append(
+                        (re.compile(name, re.IGNORECASE | re.DOTALL), name)
+                    )
+                except re.error:
+                    continue
+            else:
+                self.names[f"f{len(patterns)}"] = name
+                patterns.append(compile_trigger(name, mode))
+
+        # escaped contains and wildcard triggers are checked with a single pass
+        self.matcher = None
+        if patterns:
+            self.matcher = re.compile(
+                "|".join(
+                    f"(?P<{group}>{pattern})"
+                    for group, pattern in zip(self.names, patterns)
+                ),
+                re.IGNORECASE | re.DOTALL,
+            )
+
+    def match(self, text: str) -> Optional[dict]:
+        value = self.exact.get(text.lower())
+        if value is not None:
+            return value
+        if self.matcher is not None:
+            match = self.matcher.search(text)
+            if match:
+                return self.filters[self.names[match.lastgroup]]
+        for pattern, name in self.regexes:
+            if pattern.search(text):
+                return self.filters[name]
+        return None
+
+
+filters_index: Dict[int, ChatFilters] = {
+    int(chat_id): ChatFilters(chat_filters)
+    for chat_id, chat_filters in db.get_collection("core.filters").items()
+    if chat_filters
+}
+
 
 def get_filters_chat(chat_id):
-    return db.get("core.filters", f"{chat_id}", {})
+    chat_filters = filters_index.get(chat_id)
+    return dict(chat_filters.filters) if chat_filters else {}
 
 
-def set_filters_chat(chat_id, filters_):
-    return db.set("core.filters", f"{chat_id}", filters_)
+async def set_filters_chat(chat_id, filters_):
+    if filters_:
+        filters_index[chat_id] = ChatFilters(filters_)
+    else:
+        filters_index.pop(chat_id, None)
+    return await adb.aset("core.filters", f"{chat_id}", filters_)
 
 
 async def contains_filter(_, __, m):
-    return m.text and m.text.lower() in get_filters_chat(m.chat.id).keys()
+    chat_filters = filters_index.get(m.chat.id)
+    if chat_filters is None or not m.text:
+        return False
+    m.filter_value = chat_filters.match(m.text)
+    return m.filter_value is not None
 
 
 contains = filters.create(contains_filter)
 
 
-# noinspection PyTypeChecker
-@Client.on_message(contains)
-async def filters_main_handler(client: Client, message: Message):
-    value = get_filters_chat(message.chat.id)[message.text.lower()]
-    try:
-        await client.get_messages(int(value["CHAT_ID"]), int(value["MESSAGE_ID"]))
-    except errors.RPCError as exc:
-        raise ContinuePropagation from exc
-
-    if value.get("MEDIA_GROUP"):
-        messages_grouped = await client.get_media_group(
-            int(value["CHAT_ID"]), int(value["MESSAGE_ID"])
-        )
-        media_grouped_list = []
-        for _ in messages_grouped:
-            if _.photo:
-                if _.caption:
+def prepare_media_group(messages_grouped):
+    media_grouped_list = []
+    for _ in messages_grouped:
+        if _.photo:
+            if _.caption:
+                media_grouped_list.append(
+                    InputMediaPhoto(_.photo.file_id, _.caption.HTML)
+                )
+            else:
+                media_grouped_list.append(InputMediaPhoto(_.photo.file_id))
+        elif _.video:
+            if _.caption:
+                if _.video.thumbs:
                     media_grouped_list.append(
-                        InputMediaPhoto(_.photo.file_id, _.caption.HTML)
-                    )
-                else:
-                    media_grouped_list.append(InputMediaPhoto(_.photo.file_id))
-            elif _.video:
-                if _.caption:
-                    if _.video.thumbs:
-                        media_grouped_list.append(
-                            InputMediaVideo(
-                                _.video.file_id,
-                                _.video.thumbs[0].file_id,
-                                _.caption.HTML,
-                            )
+                        InputMediaVideo(
+                            _.video.file_id,
+                            _.video.thumbs[0].file_id,
+                            _.caption.HTML,
                         )
-                    else:
-                        media_grouped_list.append(
-                            InputMediaVideo(_.video.file_id, _.caption.HTML)
-                        )
-                elif _.video.thumbs:
-                    media_grouped_list.append(
-                        InputMediaVideo(_.video.file_id, _.video.thumbs[0].file_id)
                     )
                 else:
-                    media_grouped_list.append(InputMediaVideo(_.video.file_id))
-            elif _.audio:
-                if _.caption:
                     media_grouped_list.append(
-                        InputMediaAudio(_.audio.file_id, _.caption.HTML)
+                        InputMediaVideo(_.video.file_id, _.caption.HTML)
                     )
-                else:
-                    media_grouped_list.append(InputMediaAudio(_.audio.file_id))
-            elif _.document:
-                if _.caption:
-                    if _.document.thumbs:
-                        media_grouped_list.append(
-                            InputMediaDocument(
-                                _.document.file_id,
-                                _.document.thumbs[0].file_id,
-                                _.caption.HTML,
-                            )
-                        )
-                    else:
-                        media_grouped_list.append(
-                            InputMediaDocument(_.document.file_id, _.caption.HTML)
-                        )
-                elif _.document.thumbs:
+            elif _.video.thumbs:
+                media_grouped_list.append(
+                    InputMediaVideo(_.video.file_id, _.video.thumbs[0].file_id)
+                )
+            else:
+                media_grouped_list.append(InputMediaVideo(_.video.file_id))
+        elif _.audio:
+            if _.caption:
+                media_grouped_list.append(
+                    InputMediaAudio(_.audio.file_id, _.caption.HTML)
+                )
+            else:
+                media_grouped_list.append(InputMediaAudio(_.audio.file_id))
+        elif _.document:
+            if _.caption:
+                if _.document.thumbs:
                     media_grouped_list.append(
                         InputMediaDocument(
-                            _.document.file_id, _.document.thumbs[0].file_id
+                            _.document.file_id,
+                            _.document.thumbs[0].file_id,
+                            _.caption.HTML,
                         )
                     )
                 else:
-                    media_grouped_list.append(InputMediaDocument(_.document.file_id))
-        await client.send_media_group(
-            message.chat.id, media_grouped_list, reply_to_message_id=message.id
-        )
-    else:
-        await client.copy_message(
-            message.chat.id,
-            int(value["CHAT_ID"]),
-            int(value["MESSAGE_ID"]),
-            reply_to_message_id=message.id,
-        )
+                    media_grouped_list.append(
+                        InputMediaDocument(_.document.file_id, _.caption.HTML)
+                    )
+            elif _.document.thumbs:
+                media_grouped_list.append(
+                    InputMediaDocument(_.document.file_id, _.document.thumbs[0].file_id)
+                )
+            else:
+                media_grouped_list.append(InputMediaDocument(_.document.file_id))
+    return media_grouped_list
+
+
+# noinspection PyTypeChecker
+@Client.on_message(contains)
+async def filters_main_handler(client: Client, message: Message):
+    value = message.filter_value
+    try:
+        if value.get("MEDIA_GROUP"):
+            await send_cached_media_group(
+                client,
+                message.chat.id,
+                int(value["CHAT_ID"]),
+                int(value["MESSAGE_ID"]),
+                prepare_media_group,
+                reply_to_message_id=message.id,
+            )
+        else:
+            await client.copy_message(
+                message.chat.id,
+                int(value["CHAT_ID"]),
+                int(value["MESSAGE_ID"]),
+                reply_to_message_id=message.id,
+            )
+    except errors.RPCError as exc:
+        raise ContinuePropagation from exc
     raise ContinuePropagation
 
 
 @Client.on_message(filters.command(["filter"], prefix) & filters.me)
 async def filter_handler(client: Client, message: Message):
     try:
-        if len(message.text.split()) < 2:
+        args = message.text.split(maxsplit=2)
+        mode = FILTER_MODES.get(args[1], "exact") if len(args) > 1 else "exact"
+        if len(args) < (2 if mode == "exact" else 3):
             return await message.edit(
-                f"<b>Usage</b>: <code>{prefix}filter [name] (Reply required)</code>"
+                f"<b>Usage</b>: <code>{prefix}filter [-c|-r|-w] [name] (Reply required)</code>"
             )
-        name = message.text.split(maxsplit=1)[1].lower()
+        if mode == "exact":
+            name = message.text.split(maxsplit=1)[1].lower()
+        elif mode == "regex":
+            name = args[2]
+            try:
+                re.compile(name)
+            except re.error as e:
+                return await message.edit(f"<b>Invalid regex:</b> <code>{e}</code>")
+        else:
+            name = args[2].lower()
         chat_filters = get_filters_chat(message.chat.id)
         if name in chat_filters.keys():
             return await message.edit(
@@ -144,13 +239,13 @@ async def filter_handler(client: Client, message: Message):
             return await message.edit("<b>Reply to message</b> please.")
 
         try:
-            chat = await client.get_chat(db.get("core.notes", "chat_id", 0))
+            chat = await client.get_chat(await adb.aget("core.notes", "chat_id", 0))
         except (errors.RPCError, ValueError, KeyError):
             # group is not accessible or isn't created
             chat = await client.create_supergroup(
                 "Moon_Userbot_Notes_Filters", "Don't touch this group, please"
             )
-            db.set("core.notes", "chat_id", chat.id)
+            await adb.aset("core.notes", "chat_id", chat.id)
 
         chat_id = chat.id
 
@@ -174,6 +269,7 @@ async def filter_handler(client: Client, message: Message):
                 "MESSAGE_ID": str(message_id[1].id),
                 "MEDIA_GROUP": True,
                 "CHAT_ID": str(chat_id),
+                "MODE": mode,
             }
         else:
             try:
@@ -184,11 +280,12 @@ async def filter_handler(client: Client, message: Message):
                 "MEDIA_GROUP": False,
                 "MESSAGE_ID": str(message_id.id),
                 "CHAT_ID": str(chat_id),
+                "MODE": mode,
             }
 
         chat_filters.update({name: filter_})
 
-        set_filters_chat(message.chat.id, chat_filters)
+        await set_filters_chat(message.chat.id, chat_filters)
         return await message.edit(
             f"<b>Filter</b> <code>{name}</code> has been added.",
         )
@@ -200,7 +297,8 @@ async def filter_handler(client: Client, message: Message):
 async def filters_handler(_, message: Message):
     try:
         text = ""
-        for index, a in enumerate(get_filters_chat(message.chat.id).items(), start=1):
+        chat_filters = get_filters_chat(message.chat.id)
+        for index, a in enumerate(chat_filters.items(), start=1):
             key, _ = a
             key = key.replace("<", "").replace(">", "")
             text += f"{index}. <code>{key}</code>\n"
@@ -220,14 +318,20 @@ async def filter_del_handler(_, message: Message):
             return await message.edit(
                 f"<b>Usage</b>: <code>{prefix}fdel [name]</code>",
             )
-        name = message.text.split(maxsplit=1)[1].lower()
+        name = message.text.split(maxsplit=1)[1]
         chat_filters = get_filters_chat(message.chat.id)
+        if name not in chat_filters.keys():
+            # regex triggers keep their case
+            name = name.lower()
         if name not in chat_filters.keys():
             return await message.edit(
                 f"<b>Filter</b> <code>{name}</code> doesn't exists.",
             )
+        forget_media_group(
+            int(chat_filters[name]["CHAT_ID"]), int(chat_filters[name]["MESSAGE_ID"])
+        )
         del chat_filters[name]
-        set_filters_chat(message.chat.id, chat_filters)
+        await set_filters_chat(message.chat.id, chat_filters)
         return await message.edit(
             f"<b>Filter</b> <code>{name}</code> has been deleted.",
         )
@@ -242,8 +346,11 @@ async def filter_search_handler(_, message: Message):
             return await message.edit(
                 f"<b>Usage</b>: <code>{prefix}fsearch [name]</code>",
             )
-        name = message.text.split(maxsplit=1)[1].lower()
+        name = message.text.split(maxsplit=1)[1]
         chat_filters = get_filters_chat(message.chat.id)
+        if name not in chat_filters.keys():
+            # regex triggers keep their case
+            name = name.lower()
         if name not in chat_filters.keys():
             return await message.edit(
                 f"<b>Filter</b> <code>{name}</code> doesn't exists.",
@@ -257,7 +364,9 @@ async def filter_search_handler(_, message: Message):
 
 
 modules_help["filters"] = {
-    "filter [name]": "Create filter (Reply required)",
+    "filter [-c|-r|-w] [name]": "Create filter (Reply required). By default the whole message "
+    "must match the name, -c matches it anywhere in the message, -r treats it as a regex "
+    "and -w as a wildcard (* and ?)",
     "filters": "List of all triggers",
     "fdel [name]": "Delete filter by name",
     "fsearch [name]": "Info filter by name",
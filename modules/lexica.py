@@ -16,15 +16,14 @@
 
 import os
 import re
-import time
 from bs4 import BeautifulSoup
-import requests
 
 from pyrogram import Client, filters
 from pyrogram.types import Message
 
+from utils import http
 from utils.misc import modules_help, prefix
-from utils.scripts import format_exc, format_module_help, progress
+from utils.scripts import ProgressReporter, format_exc, format_module_help
 from utils.lexicapi import ImageGeneration, UpscaleImages, ImageModels
 
 
@@ -100,7 +99,7 @@ async def lgen(client: Client, message: Message):
             return await message.edit_text("NSFW is not allowed")
         img_url = img[0]
         with open("generated_image.png", "wb") as f:
-            f.write(requests.get(img_url, timeout=5).content)
+            f.write((await http.get(img_url, timeout=5)).content)
 
         await message.delete()
         await client.send_document(
@@ -124,12 +123,12 @@ async def linsta(client: Client, message: Message):
     url = f"https://social-dl.vercel.app/api/download?url={link}&platform=Instagram"
     await message.edit_text("<code>Processing...</code>")
     try:
-        response = requests.post(url)
+        response = await http.post(url)
         if response.status_code == 200:
             if response.json().get("code") == 2:
                 if response.json().get("message") == "success":
                     download_url = response.json().get("content")[0].get("url")
-                    soup = BeautifulSoup(requests.get(link).text, "html.parser")
+                    soup = BeautifulSoup((await http.get(link)).text, "html.parser")
                     title = soup.find("meta", property="og:title")
                     if title:
                         title_text = title["content"]
@@ -147,7 +146,7 @@ async def linsta(client: Client, message: Message):
                     elif ".gif" in download_url:
                         ext = ".gif"
                     with open(f"video_insta{ext}", "wb") as f:
-                        f.write(requests.get(download_url).content)
+                        f.write((await http.get(download_url)).content)
                     await message.edit_text(
                         "Video downloaded successfully... Uploading"
                     )
@@ -155,12 +154,9 @@ async def linsta(client: Client, message: Message):
                         message.chat.id,
                         f"video_insta{ext}",
                         caption=f"<b>Title: </b><code>{title_text}</code>",
-                        progress=progress,
-                        progress_args=(
-                            message,
-                            time.time(),
-                            "Video downloaded successfully... Uploading",
-                        ),
+                        progress=ProgressReporter(
+                            message, "Video downloaded successfully... Uploading"
+                        ).update,
                     )
                     if os.path.exists(f"video_insta{ext}"):
                         os.remove(f"video_insta{ext}")
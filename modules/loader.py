@@ -2,9 +2,9 @@ import os
 import shutil
 import subprocess
 import sys
-import requests
 from pyrogram import Client, filters
 from pyrogram.types import Message
+from utils import http
 from utils.misc import modules_help, prefix
 from utils.scripts import restart
 from utils.db import db
@@ -65,7 +65,7 @@ async def loadmod(_, message: Message):
         else:
             module_name = url.split("/")[-1].split(".")[0]
 
-        resp = requests.get(url)
+        resp = await http.get(url)
         if not resp.ok:
             await message.edit(f"<b>Module <code>{module_name}</code> is not found</b>")
             return
@@ -161,7 +161,7 @@ async def load_all_mods(_, message: Message):
     await message.edit("<b>Loading modules...</b>")
     for module_name in modules_list:
         url = f"https://raw.githubusercontent.com/The-MoonTg-project/custom_modules/main/{module_name}.py"
-        resp = requests.get(url)
+        resp = await http.get(url)
         if not resp.ok:
             continue
         with open(
@@ -224,7 +224,7 @@ async def updateallmods(_, message: Message):
         with open("modules/full.txt", "r") as f:
             modules_dict = {line.split("/")[-1].split()[0]: line.strip() for line in f}
         if module_name in modules_dict:
-            resp = requests.get(
+            resp = await http.get(
                 f"https://raw.githubusercontent.com/The-MoonTg-project/custom_modules/main/{modules_dict[module_name]}.py"
             )
             if not resp.ok:
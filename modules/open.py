@@ -16,7 +16,6 @@
 
 import datetime
 import os
-import time
 
 import aiofiles
 from pyrogram import Client, filters
@@ -24,7 +23,7 @@ from pyrogram.errors import MessageTooLong
 from pyrogram.types import Message
 
 from utils.misc import modules_help, prefix
-from utils.scripts import edit_or_reply, format_exc, progress
+from utils.scripts import ProgressReporter, edit_or_reply, format_exc
 from utils.rentry import new
 
 
@@ -74,9 +73,8 @@ async def openfile(client: Client, message: Message):
 
     try:
         ms = await edit_or_reply(message, "<b>Downloading...</b>")
-        ct = time.time()
         file_path = await message.reply_to_message.download(
-            progress=progress, progress_args=(ms, ct, "Downloading...")
+            progress=ProgressReporter(ms, "Downloading...").update
         )
         await ms.edit_text("<code>Trying to open file...</code>")
         file_info = os.stat(file_path)
@@ -15,11 +15,17 @@
 #  along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 import asyncio
-from pyrogram import Client, filters
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from pyrogram import Client, enums, filters, raw
 from pyrogram.types import Message
 
+from utils import metrics
+from utils.db import adb, db
 from utils.misc import modules_help, prefix
-from utils.scripts import with_reply
+from utils.ratelimit import limiter
+from utils.scripts import format_exc
 
 
 @Client.on_message(filters.command("del", prefix) & filters.me)
@@ -28,27 +34,230 @@ async def del_msg(_, message: Message):
     await message.reply_to_message.delete()
 
 
+DB_MODULE = "core.purge"
+CHUNK_SIZE = 100
+# delete requests in flight at once, the limiter decides how fast
+PIPELINE = 3
+CHECKPOINT_INTERVAL = 5
+REPORT_TIMEOUT = 5
+
+
+class PurgeJob:
+    """
+    Delete messages from first_id to last_id, newest first
+
+    Picks the cheapest way to find message ids:
+
+    - "range": every id in the range, for admins of supergroups and channels,
+      where ids are per chat and history doesn't have to be fetched
+    - "search": own messages found with messages.Search, in supergroups
+      where we can't delete messages of others
+    - "history": ids from raw history pages, in private chats and basic
+      groups, where ids are shared by all chats of the account
+    """
+
+    def __init__(
+        self,
+        client: Client,
+        chat_id: int,
+        first_id: int,
+        last_id: int,
+        strategy: str = None,
+    ):
+        self.client = client
+        self.chat_id = chat_id
+        self.first_id = first_id
+        self.last_id = last_id
+        self.strategy = strategy
+        # messages above cursor are deleted
+        self.cursor = last_id
+        self.deleted = 0
+        self.elapsed = 0.0
+
+    @property
+    def _key(self) -> str:
+        return f"job{self.chat_id}"
+
+    async def checkpoint(self):
+        await adb.aset(
+            DB_MODULE,
+            self._key,
+            {
+                "first_id": self.first_id,
+                "last_id": self.last_id,
+                "strategy": self.strategy,
+                "cursor": self.cursor,
+                "deleted": self.deleted,
+                "elapsed": self.elapsed,
+            },
+        )
+
+    @classmethod
+    def load(cls, client: Client, chat_id: int) -> Optional["PurgeJob"]:
+        state = db.get(DB_MODULE, f"job{chat_id}")
+        if not state:
+            return None
+        job = cls(
+            client, chat_id, state["first_id"], state["last_id"], state["strategy"]
+        )
+        job.cursor = state["cursor"]
+        job.deleted = state["deleted"]
+        job.elapsed = state["elapsed"]
+        return job
+
+    async def choose_strategy(self) -> str:
+        chat = await self.client.get_chat(self.chat_id)
+        if chat.type not in (enums.ChatType.SUPERGROUP, enums.ChatType.CHANNEL):
+            return "history"
+        member = await self.client.get_chat_member(self.chat_id, "me")
+        if member.status == enums.ChatMemberStatus.OWNER or (
+            member.privileges and member.privileges.can_delete_messages
+        ):
+            return "range"
+        return "search"
+
+    # id sources, all yield chunks of ids below the cursor, newest first
+
+    async def _range_chunks(self):
+        for top in range(self.cursor, self.first_id - 1, -CHUNK_SIZE):
+            yield list(range(top, max(top - CHUNK_SIZE, self.first_id - 1), -1))
+
+    async def _paged_chunks(self, request: Callable[[int], Any]):
+        last_id = self.cursor
+        offset_id = last_id + 1
+        while True:
+            result = await self.client.invoke(request(offset_id))
+            ids = [
+                msg.id
+                for msg in result.messages
+                if not isinstance(msg, raw.types.MessageEmpty)
+                and self.first_id <= msg.id <= last_id
+            ]
+            if not ids:
+                return
+            ids.sort(reverse=True)
+            yield ids
+            offset_id = ids[-1]
+
+    async def _history_chunks(self):
+        peer = await self.client.resolve_peer(self.chat_id)
+        async for ids in self._paged_chunks(
+            lambda offset_id: raw.functions.messages.GetHistory(
+                peer=peer,
+                offset_id=offset_id,
+                offset_date=0,
+                add_offset=0,
+                limit=CHUNK_SIZE,
+                max_id=0,
+                min_id=self.first_id - 1,
+                hash=0,
+            )
+        ):
+            yield ids
+
+    async def _search_chunks(self):
+        peer = await self.client.resolve_peer(self.chat_id)
+        async for ids in self._paged_chunks(
+            lambda offset_id: raw.functions.messages.Search(
+                peer=peer,
+                q="",
+                filter=raw.types.InputMessagesFilterEmpty(),
+                min_date=0,
+                max_date=0,
+                offset_id=offset_id,
+                add_offset=0,
+                limit=CHUNK_SIZE,
+                max_id=0,
+                min_id=self.first_id - 1,
+                hash=0,
+                from_id=raw.types.InputPeerSelf(),
+            )
+        ):
+            yield ids
+
+    async def _delete(self, ids: List[int]):
+        count = await limiter.call(
+            self.chat_id, "delete", self.client.delete_messages, self.chat_id, ids
+        )
+        self.deleted += count
+
+    async def run(self):
+        if self.strategy is None:
+            self.strategy = await self.choose_strategy()
+        chunks = getattr(self, f"_{self.strategy}_chunks")()
+        started = time.monotonic() - self.elapsed
+        last_checkpoint = time.monotonic()
+        # task -> newest id of its chunk
+        pending: Dict[asyncio.Future, int] = {}
+        # lowest id handed out so far, everything above it is at least in flight
+        produced = self.cursor + 1
+
+        async def wait(return_when):
+            nonlocal last_checkpoint
+            done, _ = await asyncio.wait(pending, return_when=return_when)
+            for task in done:
+                del pending[task]
+                task.result()
+            self.cursor = max(pending.values(), default=produced - 1)
+            self.elapsed = time.monotonic() - started
+            if time.monotonic() - last_checkpoint >= CHECKPOINT_INTERVAL:
+                last_checkpoint = time.monotonic()
+                await self.checkpoint()
+
+        try:
+            async for ids in chunks:
+                while len(pending) >= PIPELINE:
+                    await wait(asyncio.FIRST_COMPLETED)
+                produced = ids[-1]
+                pending[asyncio.ensure_future(self._delete(ids))] = ids[0]
+            if pending:
+                await wait(asyncio.ALL_COMPLETED)
+        except BaseException:
+            for task in pending:
+                task.cancel()
+            self.elapsed = time.monotonic() - started
+            await self.checkpoint()
+            raise
+        self.cursor = self.first_id - 1
+        self.elapsed = time.monotonic() - started
+        await adb.aremove(DB_MODULE, self._key)
+        metrics.inc("purge_deleted", self.deleted)
+
+    def report(self) -> str:
+        rate = self.deleted / self.elapsed if self.elapsed else 0
+        return (
+            f"<b>Purged {self.deleted} messages in {self.elapsed:.1f}s</b> "
+            f"(<code>{rate:.0f}</code>/s, {self.strategy})"
+        )
+
+
 @Client.on_message(filters.command("purge", prefix) & filters.me)
-@with_reply
 async def purge(client: Client, message: Message):
-    chunk = []
-    async for msg in client.get_chat_history(
-        chat_id=message.chat.id,
-        limit=message.id - message.reply_to_message.id + 1,
-    ):
-        if msg.id < message.reply_to_message.id:
-            break
-        chunk.append(msg.id)
-        if len(chunk) >= 100:
-            await client.delete_messages(message.chat.id, chunk)
-            chunk.clear()
-            await asyncio.sleep(1)
+    if message.command[1:2] == ["resume"]:
+        job = PurgeJob.load(client, message.chat.id)
+        if job is None:
+            return await message.edit("<b>No interrupted purge in this chat</b>")
+        await message.delete()
+    elif message.reply_to_message:
+        job = PurgeJob(client, message.chat.id, message.reply_to_message.id, message.id)
+    else:
+        return await message.edit("<b>Reply to message is required</b>")
+
+    try:
+        await job.run()
+    except Exception as e:
+        return await client.send_message(
+            message.chat.id,
+            f"{format_exc(e)}\n<i>Continue with</i> <code>{prefix}purge resume</code>",
+        )
 
-    if len(chunk) > 0:
-        await client.delete_messages(message.chat.id, chunk)
+    report = await client.send_message(message.chat.id, job.report())
+    await asyncio.sleep(REPORT_TIMEOUT)
+    await report.delete()
 
 
 modules_help["purge"] = {
     "purge [reply]": "Purge (delete all messages) chat from replied message to last",
+    "purge resume": "Continue purge interrupted by an error or restart",
     "del [reply]": "Delete replied message",
 }
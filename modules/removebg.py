@@ -1,64 +1,95 @@
 import io
-import os
 from datetime import datetime
 from functools import wraps
 from io import BytesIO
+from typing import BinaryIO, Optional
 
-import requests
-from PIL import Image
 from pyrogram import Client, enums, filters
 from pyrogram.types import Message
 
+from utils import http, media, workers
 from utils.config import rmbg_key
+from utils.imaging import convert_image_async
 from utils.misc import modules_help, prefix
 from utils.scripts import edit_or_reply, format_exc
 
 
-async def convert_to_image(message, client) -> [None, str]:
+async def convert_to_image(message, client) -> Optional[BinaryIO]:
     """Convert Most Media Formats To Raw Image"""
     if not message:
         return None
     if not message.reply_to_message:
         return None
-    final_path = None
+    reply = message.reply_to_message
     if not (
-        message.reply_to_message.video
-        or message.reply_to_message.photo
-        or message.reply_to_message.sticker
-        or message.reply_to_message.media
-        or message.reply_to_message.animation
-        or message.reply_to_message.audio
+        reply.video
+        or reply.photo
+        or reply.sticker
+        or reply.media
+        or reply.animation
+        or reply.audio
     ):
         return None
-    if message.reply_to_message.photo:
-        final_path = await message.reply_to_message.download()
-    elif message.reply_to_message.sticker:
-        if message.reply_to_message.sticker.mime_type == "image/webp":
-            final_path = "webp_to_png_s_proton.png"
-            path_s = await message.reply_to_message.download()
-            im = Image.open(path_s)
-            im.save(final_path, "PNG")
-        else:
-            path_s = await client.download_media(message.reply_to_message)
-            final_path = "lottie_proton.png"
-            cmd = (
-                f"lottie_convert.py --frame 0 -if lottie -of png {path_s} {final_path}"
-            )
-            await exec(cmd)
-    elif message.reply_to_message.audio:
-        thumb = message.reply_to_message.audio.thumbs[0].file_id
-        final_path = await client.download_media(thumb)
-    elif message.reply_to_message.video or message.reply_to_message.animation:
-        final_path = "fetched_thumb.png"
-        vid_path = await client.download_media(message.reply_to_message)
-        await exec(f"ffmpeg -i {vid_path} -filter:v scale=500:500 -an {final_path}")
-    return final_path
-
-
-def remove_background(photo_data):
-    response = requests.post(
+    if reply.photo:
+        return await media.download(reply)
+    if reply.sticker:
+        with await media.download(reply) as buffer:
+            if reply.sticker.mime_type == "image/webp":
+                final = await convert_image_async(buffer, "PNG")
+            else:
+                async with media.scratch_path(
+                    buffer, ".tgs"
+                ) as path_s, media.scratch_path(suffix=".png") as final_path:
+                    await workers.run_process(
+                        "lottie_convert.py",
+                        "--frame",
+                        "0",
+                        "-if",
+                        "lottie",
+                        "-of",
+                        "png",
+                        path_s,
+                        final_path,
+                    )
+                    with open(final_path, "rb") as f:
+                        final = BytesIO(f.read())
+    elif reply.audio:
+        if not reply.audio.thumbs:
+            return None
+        return await media.download(
+            reply.audio.thumbs[0].file_id, client=client, name="thumb.jpg"
+        )
+    elif reply.video or reply.animation:
+        with await media.download(reply) as buffer:
+            async with media.scratch_path(buffer, ".mp4") as vid_path:
+                final = BytesIO(
+                    await workers.run_process(
+                        "ffmpeg",
+                        "-i",
+                        vid_path,
+                        "-frames:v",
+                        "1",
+                        "-filter:v",
+                        "scale=500:500",
+                        "-an",
+                        "-f",
+                        "image2pipe",
+                        "-vcodec",
+                        "png",
+                        "pipe:1",
+                    )
+                )
+    else:
+        return None
+    final.name = "image.png"
+    final.seek(0)
+    return final
+
+
+async def remove_background(photo_data):
+    response = await http.post(
         "https://api.remove.bg/v1.0/removebg",
-        files={"image_file": open(photo_data, "rb")},
+        files={"image_file": photo_data},
         data={"size": "auto"},
         headers={"X-Api-Key": rmbg_key},
     )
@@ -95,19 +126,13 @@ async def rmbg(client: Client, message: Message):
         return
     start = datetime.now()
     await pablo.edit("sending to Remove.bg")
-    input_file_name = cool
-    files = {
-        "image_file": (input_file_name, open(input_file_name, "rb")),
-    }
-    r = requests.post(
-        "https://api.remove.bg/v1.0/removebg",
-        headers={"X-Api-Key": rmbg_key},
-        files=files,
-        allow_redirects=True,
-        stream=True,
-    )
-    if os.path.exists(cool):
-        os.remove(cool)
+    with cool:
+        r = await http.post(
+            "https://api.remove.bg/v1.0/removebg",
+            headers={"X-Api-Key": rmbg_key},
+            files={"image_file": cool},
+            allow_redirects=True,
+        )
     output_file_name = r
     contentType = output_file_name.headers.get("content-type")
     if "image" in contentType:
@@ -121,8 +146,6 @@ async def rmbg(client: Client, message: Message):
         await pablo.edit(
             f"<code>Removed image's Background in {ms} seconds.</code>"
         )
-        if os.path.exists("BG_rem.png"):
-            os.remove("BG_rem.png")
     else:
         await pablo.edit(
             "Remove.bg API returned Errors."
@@ -134,16 +157,17 @@ async def rmbg(client: Client, message: Message):
 async def rembg(client: Client, message: Message):
     await message.edit("<code>Processing...</code>")
     chat_id = message.chat.id
+    photo_data = None
     try:
         try:
-            photo_data = await message.download()
+            photo_data = await media.download(message)
         except ValueError:
             try:
-                photo_data = await message.reply_to_message.download()
+                photo_data = await media.download(message.reply_to_message)
             except ValueError:
                 await message.edit("<b>File not found</b>")
                 return
-        background_removed_data = remove_background(photo_data)
+        background_removed_data = await remove_background(photo_data)
 
         if background_removed_data:
             await message.delete()
@@ -158,8 +182,8 @@ async def rembg(client: Client, message: Message):
     except Exception as e:
         await message.reply_text(f"An error occurred: {format_exc(e)}")
     finally:
-        if os.path.exists(photo_data):
-            os.remove(photo_data)
+        if photo_data is not None:
+            photo_data.close()
 
 
 modules_help["removebg"] = {
@@ -14,15 +14,22 @@
 #  You should have received a copy of the GNU General Public License
 #  along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
+import asyncio
 import base64
-from io import BytesIO
+import json
+from typing import Awaitable, Callable
 
-import requests
 from pyrogram import Client, filters, errors, types
 from pyrogram.types import Message
 
+from utils import http, metrics
+from utils.mediacache import media_cache
+from utils.imaging import resize_image_async
 from utils.misc import modules_help, prefix
-from utils.scripts import with_reply, format_exc, resize_image
+from utils.scripts import with_reply, format_exc
+
+# messages rendered at once, each may download its media and avatar
+RENDER_CONCURRENCY = 5
 
 
 @Client.on_message(filters.command(["q", "quote"], prefix) & filters.me)
@@ -54,6 +61,7 @@ async def quote_cmd(client: Client, message: Message):
             break
         if no_reply:
             msg.reply_to_message = None
+            msg.reply_to_message_id = None
 
         messages.append(msg)
 
@@ -61,6 +69,7 @@ async def quote_cmd(client: Client, message: Message):
             break
 
     messages.reverse()
+    await fetch_replies(client, message.chat.id, messages)
 
     if send_for_me:
         await message.delete()
@@ -70,21 +79,21 @@ async def quote_cmd(client: Client, message: Message):
 
     url = "https://quotes.fl1yd.su/generate"
     params = {
-        "messages": [
-            await render_message(client, msg) for msg in messages if not msg.empty
-        ],
+        "messages": await render_messages(client, messages),
         "quote_color": "#162330",
         "text_color": "#fff",
     }
 
-    response = requests.post(url, json=params)
+    response = await http.post(
+        url, data=dumps(params), headers={"Content-Type": "application/json"}
+    )
     if not response.ok:
         return await message.edit(
             f"<b>Quotes API error!</b>\n" f"<code>{response.text}</code>"
         )
 
-    resized = resize_image(
-        BytesIO(response.content), img_type="PNG" if is_png else "WEBP"
+    resized = await resize_image_async(
+        response.content, img_type="PNG" if is_png else "WEBP"
     )
     await message.edit("<b>Sending...</b>")
 
@@ -135,14 +144,16 @@ async def fake_quote_cmd(client: Client, message: types.Message):
         "text_color": "#fff",
     }
 
-    response = requests.post(url, json=params)
+    response = await http.post(
+        url, data=dumps(params), headers={"Content-Type": "application/json"}
+    )
     if not response.ok:
         return await message.edit(
             f"<b>Quotes API error!</b>\n<code>{response.text}</code>"
         )
 
-    resized = resize_image(
-        BytesIO(response.content), img_type="PNG" if is_png else "WEBP"
+    resized = await resize_image_async(
+        response.content, img_type="PNG" if is_png else "WEBP"
     )
     await message.edit("<b>Sending...</b>")
 
@@ -156,18 +167,96 @@ async def fake_quote_cmd(client: Client, message: types.Message):
         await message.delete()
 
 
-files_cache = {}
+def _encode_media(value):
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return base64.b64encode(value).decode()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def dumps(params: dict) -> str:
+    """JSON body of an API request, media bytes are base64-encoded only here"""
+    return json.dumps(params, default=_encode_media)
+
+
+async def fetch_replies(app: Client, chat_id: int, messages: list):
+    """Attach replied messages, which chat history doesn't include, in one request"""
+    ids = {
+        msg.reply_to_message_id
+        for msg in messages
+        if msg.reply_to_message_id and not msg.reply_to_message
+    }
+    if not ids:
+        return
+    replies = await app.get_messages(chat_id, list(ids), replies=0)
+    found = {
+        reply.id: reply
+        for reply in replies
+        if not reply.empty and not reply.forum_topic_created
+    }
+    for msg in messages:
+        if not msg.reply_to_message:
+            msg.reply_to_message = found.get(msg.reply_to_message_id)
 
 
-async def render_message(app: Client, message: types.Message) -> dict:
-    async def get_file(file_id) -> str:
-        if file_id in files_cache:
-            return files_cache[file_id]
+async def render_messages(app: Client, messages: list) -> list:
+    """Render messages concurrently, fetching every avatar and file once"""
+    semaphore = asyncio.Semaphore(RENDER_CONCURRENCY)
+    lookups = {}
 
-        content = await app.download_media(file_id, in_memory=True)
-        data = base64.b64encode(bytes(content.getbuffer())).decode()
-        files_cache[file_id] = data
-        return data
+    async def render(msg: types.Message) -> dict:
+        async with semaphore:
+            return await render_message(app, msg, lookups)
+
+    return list(
+        await asyncio.gather(*(render(msg) for msg in messages if not msg.empty))
+    )
+
+
+async def render_message(
+    app: Client, message: types.Message, lookups: dict = None
+) -> dict:
+    """
+    :param lookups: downloads shared between messages rendered together
+    """
+    if lookups is None:
+        lookups = {}
+
+    def once(key, fetch: Callable[[], Awaitable]) -> asyncio.Future:
+        if key not in lookups:
+            lookups[key] = asyncio.ensure_future(fetch())
+        return lookups[key]
+
+    async def get_file(file_id, unique_id) -> bytes:
+        downloaded = False
+
+        async def download():
+            nonlocal downloaded
+            downloaded = True
+            content = await app.download_media(file_id, in_memory=True)
+            return bytes(content.getbuffer())
+
+        async def fetch():
+            data = await media_cache.get_or_create(unique_id, "", download)
+            metrics.inc("squotes_cache_misses" if downloaded else "squotes_cache_hits")
+            return data
+
+        return await once(unique_id, fetch)
+
+    async def get_public_avatar(username: str):
+        # may be user blocked us, we will try to get avatar via t.me
+        t_me_page = (await http.get(f"https://t.me/{username}")).text
+        sub = '<meta property="og:image" content='
+        index = t_me_page.find(sub)
+        if index != -1:
+            link = t_me_page[index + 35 :].split('"')
+            if (
+                len(link) > 0
+                and link[0]
+                and link[0] != "https://telegram.org/img/t_logo.png"
+            ):
+                # found valid link
+                return (await http.get(link[0])).content
+        return ""
 
     # text
     if message.photo:
@@ -181,9 +270,9 @@ async def render_message(app: Client, message: types.Message) -> dict:
 
     # media
     if message.photo:
-        media = await get_file(message.photo.file_id)
+        media = await get_file(message.photo.file_id, message.photo.file_unique_id)
     elif message.sticker:
-        media = await get_file(message.sticker.file_id)
+        media = await get_file(message.sticker.file_id, message.sticker.file_unique_id)
     else:
         media = ""
 
@@ -238,26 +327,14 @@ async def render_message(app: Client, message: types.Message) -> dict:
                 )
 
         if from_user.photo:
-            author["avatar"] = await get_file(from_user.photo.big_file_id)
+            author["avatar"] = await get_file(
+                from_user.photo.big_file_id, from_user.photo.big_photo_unique_id
+            )
         elif not from_user.photo and from_user.username:
-            # may be user blocked us, we will try to get avatar via t.me
-            t_me_page = requests.get(f"https://t.me/{from_user.username}").text
-            sub = '<meta property="og:image" content='
-            index = t_me_page.find(sub)
-            if index != -1:
-                link = t_me_page[index + 35 :].split('"')
-                if (
-                    len(link) > 0
-                    and link[0]
-                    and link[0] != "https://telegram.org/img/t_logo.png"
-                ):
-                    # found valid link
-                    avatar = requests.get(link[0]).content
-                    author["avatar"] = base64.b64encode(avatar).decode()
-                else:
-                    author["avatar"] = ""
-            else:
-                author["avatar"] = ""
+            author["avatar"] = await once(
+                ("t.me", from_user.username),
+                lambda: get_public_avatar(from_user.username),
+            )
         else:
             author["avatar"] = ""
     elif message.from_user and message.from_user.id == 0:
@@ -270,7 +347,10 @@ async def render_message(app: Client, message: types.Message) -> dict:
         author["rank"] = "channel" if message.sender_chat.type == "channel" else ""
 
         if message.sender_chat.photo:
-            author["avatar"] = await get_file(message.sender_chat.photo.big_file_id)
+            author["avatar"] = await get_file(
+                message.sender_chat.photo.big_file_id,
+                message.sender_chat.photo.big_photo_unique_id,
+            )
         else:
             author["avatar"] = ""
     author["via_bot"] = message.via_bot.username if message.via_bot else ""
@@ -0,0 +1,116 @@
+#  Moon-Userbot - telegram userbot
+#  Copyright (C) 2020-present Moon Userbot Organization
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from pyrogram import Client, filters
+from pyrogram.types import Message
+
+from utils import metrics
+from utils.misc import modules_help, prefix
+
+
+def ms(seconds: float) -> str:
+    return f"{seconds * 1000:.1f}"
+
+
+def cache_stats():
+    """Lines for caches that count <name>_cache_hits/misses, and those counters"""
+    lines = []
+    used = set()
+    caches = {
+        name.split("_cache_")[0]
+        for name in metrics.counters
+        if name.endswith(("_cache_hits", "_cache_misses"))
+    }
+    for cache in sorted(caches):
+        names = [
+            f"{cache}_cache_hits",
+            f"{cache}_cache_disk_hits",
+            f"{cache}_cache_misses",
+        ]
+        hits, disk_hits, misses = (metrics.counters.get(item, 0) for item in names)
+        used.update(names)
+        total = hits + disk_hits + misses
+        rate = (hits + disk_hits) / total * 100 if total else 0
+        line = f"<code>{cache}: {hits + disk_hits}"
+        if disk_hits:
+            line += f" ({disk_hits} from disk)"
+        line += f" | {misses} | {rate:.0f}%"
+        size = metrics.gauges.get(f"{cache}_cache_memory_bytes")
+        if size is not None:
+            line += f" | {size / 1024 / 1024:.1f} MiB in memory"
+        lines.append(line + "</code>")
+    return lines, used
+
+
+@Client.on_message(filters.command("stats", prefix) & filters.me)
+async def stats(_, message: Message):
+    if len(message.command) > 1 and message.command[1] == "reset":
+        metrics.reset()
+        return await message.edit("<b>Statistics cleared</b>")
+
+    try:
+        limit = int(message.command[1]) if len(message.command) > 1 else 15
+    except ValueError:
+        return await message.edit(
+            f"<b>Usage: </b><code>{prefix}stats [count|reset]</code>"
+        )
+
+    checked = [item for item in metrics.handler_stats.values() if item.checks]
+    checked.sort(key=lambda item: item.wall.sum + item.filter.sum, reverse=True)
+
+    text = "<b>Handlers by total time</b> (calls, p50/p95/p99 ms, filter avg ms, errors, continue %)\n\n"
+    for item in checked[:limit]:
+        continue_rate = item.continues / item.calls * 100 if item.calls else 0
+        text += (
+            f"<code>{item.name}</code> [{item.group}]\n"
+            f"<code>  {item.calls} | {ms(item.wall.quantile(0.5))}/"
+            f"{ms(item.wall.quantile(0.95))}/{ms(item.wall.quantile(0.99))} | "
+            f"{ms(item.filter.sum / item.filter.count)} | {item.errors} | "
+            f"{continue_rate:.0f}%</code>\n"
+        )
+    if not checked:
+        text += "<i>No updates handled yet</i>\n"
+
+    if metrics.timings:
+        text += "\n<b>Latencies</b> (count, p50/p95/p99 ms)\n" + "\n".join(
+            f"<code>{name}: {item.count} | {ms(item.quantile(0.5))}/"
+            f"{ms(item.quantile(0.95))}/{ms(item.quantile(0.99))}</code>"
+            for name, item in sorted(metrics.timings.items())
+        )
+        text += "\n"
+
+    caches, cache_counters = cache_stats()
+    if caches:
+        text += "\n<b>Caches</b> (hits, misses, hit rate)\n" + "\n".join(caches)
+        text += "\n"
+
+    counters = {
+        name: value
+        for name, value in metrics.counters.items()
+        if name not in cache_counters
+    }
+    if counters:
+        text += "\n<b>Counters</b>\n" + "\n".join(
+            f"<code>{name}: {value}</code>" for name, value in sorted(counters.items())
+        )
+
+    await message.edit(text[:4096])
+
+
+modules_help["stats"] = {
+    "stats [count]": "Show handlers that spent most time on updates, 15 by default",
+    "stats reset": "Clear collected statistics",
+}
@@ -14,21 +14,33 @@
 #  You should have received a copy of the GNU General Public License
 #  along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
-import os
 from io import BytesIO
 
 from pyrogram import Client, filters, types, enums
 
+from utils import media
+from utils.imaging import resize_image_async
 from utils.misc import modules_help, prefix
 from utils.scripts import (
     with_reply,
     interact_with,
     interact_with_to_delete,
     format_exc,
-    resize_image,
 )
 
 
+async def resize_sticker(message: types.Message) -> BytesIO:
+    """Media of message as a 512px PNG, resized once per file"""
+
+    async def resize() -> bytes:
+        with await media.download(message) as buffer:
+            return (await resize_image_async(buffer)).getvalue()
+
+    resized = BytesIO(await media.cached(message, "png512", resize))
+    resized.name = "sticker.png"
+    return resized
+
+
 @Client.on_message(filters.command("kang", prefix) & filters.me)
 @with_reply
 async def kang(client: Client, message: types.Message):
@@ -74,17 +86,13 @@ async def kang(client: Client, message: types.Message):
         return
 
     try:
-        path = await message.reply_to_message.download()
+        resized = await resize_sticker(message.reply_to_message)
     except ValueError:
         await message.edit(
             "<b>Replied message doesn't contain any downloadable media</b>",
         )
         return
 
-    resized = resize_image(path)
-    if os.path.exists(path):
-        os.remove(path)
-
     await interact_with(
         await client.send_document(
             "@stickers", resized, parse_mode=enums.ParseMode.MARKDOWN
@@ -117,18 +125,12 @@ async def stick2png(client: Client, message: types.Message):
     try:
         await message.edit("<b>Downloading...</b>")
 
-        path = await message.reply_to_message.download()
-        with open(path, "rb") as f:
-            content = f.read()
-        if os.path.exists(path):
-            os.remove(path)
-
-        file_io = BytesIO(content)
-        file_io.name = "sticker.png"
-
-        await client.send_document(
-            message.chat.id, file_io, parse_mode=enums.ParseMode.MARKDOWN
-        )
+        with await media.download(
+            message.reply_to_message, name="sticker.png"
+        ) as buffer:
+            await client.send_document(
+                message.chat.id, buffer, parse_mode=enums.ParseMode.MARKDOWN
+            )
     except Exception as e:
         await message.edit(format_exc(e))
     else:
@@ -141,11 +143,8 @@ async def resize_cmd(client: Client, message: types.Message):
     try:
         await message.edit("<b>Downloading...</b>")
 
-        path = await message.reply_to_message.download()
-        resized = resize_image(path)
+        resized = await resize_sticker(message.reply_to_message)
         resized.name = "image.png"
-        if os.path.exists(path):
-            os.remove(path)
 
         await client.send_document(
             message.chat.id, resized, parse_mode=enums.ParseMode.MARKDOWN
@@ -20,6 +20,7 @@ from PIL import Image
 from pyrogram import Client, filters
 from pyrogram.types import Message
 
+from utils import media
 from utils.misc import prefix, modules_help
 
 
@@ -29,12 +30,13 @@ async def setthumb(_, message: Message):
     if message.reply_to_message:
         if not os.path.exists(THUMB_PATH):
             os.makedirs(THUMB_PATH)
-        new_thumb = await message.reply_to_message.download()
-        with Image.open(new_thumb) as img:
-            if img.format in ["PNG", "JPG", "JPEG"]:
-                new_path = os.path.join(THUMB_PATH, "thumb.jpg")
-                os.rename(new_thumb, new_path)
-                await message.edit_text("Thumbnail set successfully!")
+        with await media.download(message.reply_to_message) as new_thumb:
+            with Image.open(new_thumb) as img:
+                if img.format in ["PNG", "JPG", "JPEG"]:
+                    new_path = os.path.join(THUMB_PATH, "thumb.jpg")
+                    with open(new_path, "wb") as f, new_thumb.view() as view:
+                        f.write(view)
+                    await message.edit_text("Thumbnail set successfully!")
     else:
         await message.edit_text("Kindly reply to a PHOTO Entity!")
         return
@@ -15,13 +15,12 @@
 #  along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 import os
-import time
 
 from pyrogram import Client, filters
 from pyrogram.types import Message
 
 from utils.misc import modules_help, prefix
-from utils.scripts import format_exc, progress
+from utils.scripts import ProgressReporter, format_exc
 
 
 @Client.on_message(filters.command("upl", prefix) & filters.me)
@@ -48,8 +47,7 @@ async def upl(client: Client, message: Message):
         await client.send_document(
             message.chat.id,
             link,
-            progress=progress,
-            progress_args=(message, time.time(), "<b>Uploading Now...</b>", link),
+            progress=ProgressReporter(message, "<b>Uploading Now...</b>", link).update,
         )
         await message.delete()
     except Exception as e:
@@ -61,8 +59,7 @@ async def dlf(client: Client, message: Message):
     if message.reply_to_message:
         await client.download_media(
             message.reply_to_message,
-            progress=progress,
-            progress_args=(message, time.time(), "<b>Uploading Now...</b>"),
+            progress=ProgressReporter(message, "<b>Uploading Now...</b>").update,
         )
         await message.edit("<b>Downloaded Successfully!</b>")
     else:
@@ -78,8 +75,7 @@ async def mupl(client: Client, message: Message):
             await client.send_document(
                 message.chat.id,
                 link,
-                progress=progress,
-                progress_args=(message, time.time(), "<b>Uploading Now...</b>"),
+                progress=ProgressReporter(message, "<b>Uploading Now...</b>").update,
             )
             await message.delete()
         return await message.edit("<b>Error: </b><code>LOGS</code> file doesn't exist.")
@@ -111,8 +107,7 @@ async def uplr(client: Client, message: Message):
         await client.send_document(
             message.chat.id,
             link,
-            progress=progress,
-            progress_args=(message, time.time(), "<b>Uploading Now...</b>", link),
+            progress=ProgressReporter(message, "<b>Uploading Now...</b>", link).update,
         )
         await message.delete()
     except Exception as e:
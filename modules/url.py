@@ -1,35 +1,26 @@
-import asyncio
-import math
 import mimetypes
 
 import os
 import time
-from datetime import datetime
 from io import BytesIO
-from urllib.parse import unquote
 
-import requests
-import urllib3
 from pyrogram import Client, enums, filters
 from pyrogram.types import Message
-from pySmartDL import SmartDL
 
+from utils import downloader, http
 from utils.config import apiflash_key
 from utils.misc import modules_help, prefix
-from utils.scripts import format_exc, humanbytes, progress
+from utils.scripts import ProgressReporter, format_exc
 
 
-def generate_screenshot(url):
+async def generate_screenshot(url):
     api_url = f"https://api.apiflash.com/v1/urltoimage?access_key={apiflash_key}&url={url}&format=png"
-    response = requests.get(api_url)
+    response = await http.get(api_url)
     if response.status_code == 200:
         return BytesIO(response.content)
     return None
 
 
-http = urllib3.PoolManager()
-
-
 @Client.on_message(filters.command("short", prefix) & filters.me)
 async def short(_, message: Message):
     if len(message.command) > 1:
@@ -39,135 +30,107 @@ async def short(_, message: Message):
     else:
         await message.edit(f"<b>Usage: </b><code>{prefix}short [url to short]</code>")
         return
-    r = http.request("GET", "https://clck.ru/--?url=" + link)
+    r = await http.get("https://clck.ru/--?url=" + link)
     await message.edit(
-        r.data.decode().replace("https://", "<b>Shortened Url:</b>"),
+        r.text.replace("https://", "<b>Shortened Url:</b>"),
         disable_web_page_preview=True,
     )
 
 
 @Client.on_message(filters.command("urldl", prefix) & filters.me)
 async def urldl(client: Client, message: Message):
-    if len(message.command) > 1:
+    if len(message.command) > 1 and not message.reply_to_message:
         message_id = None
-        link = message.text.split(maxsplit=1)[1]
+        link = message.command[1]
+        checksum = message.command[2] if len(message.command) > 2 else None
     elif message.reply_to_message:
         message_id = message.reply_to_message.id
         link = message.reply_to_message.text
+        checksum = message.command[1] if len(message.command) > 1 else None
     else:
         await message.edit(
-            f"<b>Usage: </b><code>{prefix}urldl [url to download]</code>"
+            f"<b>Usage: </b><code>{prefix}urldl [url to download] [checksum]</code>"
         )
         return
 
     await message.edit("<b>Trying to download...</b>")
 
-    ext = "." + link.split(".")[-1]
-    c_time = time.time()
-
-    resp = requests.head(link, allow_redirects=True, timeout=5)
-    if resp.status_code != 200:
+    try:
+        remote = await downloader.probe(link)
+    except http.REQUEST_ERRORS:
         return await message.edit("<b>Failed to fetch request header information</b>")
 
-    content_type = resp.headers.get("Content-Type").split(";")[0]
-    extension = mimetypes.guess_extension(content_type)
-
+    file_name = remote.name
+    extension = mimetypes.guess_extension(remote.content_type or "")
     # Check if the file is an executable binary
-    is_executable = content_type in [
-        "application/octet-stream",
-        "application/x-msdownload",
-    ]
-
-    # Get the file extension from the URL
-    url_extension = os.path.splitext(link)[1].lower()
-
+    if remote.content_type in ["application/octet-stream", "application/x-msdownload"]:
+        extension = os.path.splitext(link)[1].lower()
+    if extension and not file_name.endswith(extension):
+        file_name = downloader.safe_filename(file_name + extension)
+
+    caption = f"<b>File Name:</b> <code>{file_name}</code>\n"
+    size_limit = (4000 if client.me.is_premium else 2000) * 1024 * 1024
+    start = time.perf_counter()
     try:
-        os.makedirs("downloads")
-        if is_executable:
-            file_name = "downloads/" + link.split("/")[-1]
-            if not file_name.endswith(url_extension):
-                file_name += url_extension
-        elif extension:
-            file_name = "downloads/" + link.split("/")[-1]
-            if not file_name.endswith(extension):
-                file_name += extension
-        else:
-            file_name = "downloads/" + link.split("/")[-1]
-    except FileNotFoundError:
-        if is_executable:
-            file_name = "downloads/" + link.split("/")[-1]
-            if not file_name.endswith(url_extension):
-                file_name += url_extension
-        elif extension:
-            file_name = "downloads/" + link.split("/")[-1]
-            if not file_name.endswith(extension):
-                file_name += extension
-        else:
-            file_name = "downloads/" + link.split("/")[-1]
-    except FileExistsError:
-        if is_executable:
-            file_name = "downloads/" + link.split("/")[-1]
-            if not file_name.endswith(url_extension):
-                file_name += url_extension
-        elif extension:
-            file_name = "downloads/" + link.split("/")[-1]
-            if not file_name.endswith(extension):
-                file_name += extension
+        if remote.ranges and remote.size and remote.size <= size_limit:
+            # upload parts as soon as they are downloaded, nothing hits the disk
+            stream = downloader.StreamingDownload(remote, checksum=checksum)
+            reporter = ProgressReporter(
+                message, "<b>Downloading and uploading...</b>", file_name
+            )
+            try:
+                await stream.start()
+                sent = await client.send_document(
+                    message.chat.id,
+                    stream,
+                    file_name=file_name,
+                    progress=stream.progress(reporter.update),
+                    caption=caption,
+                    reply_to_message_id=message_id,
+                )
+                if sent is None:
+                    raise stream.error or RuntimeError("Upload was stopped")
+                try:
+                    stream.verify()
+                except downloader.ChecksumError:
+                    await sent.delete()
+                    raise
+            finally:
+                await stream.aclose()
         else:
-            file_name = "downloads/" + link.split("/")[-1]
-
-    downloader = SmartDL(link, file_name, progress_bar=False, timeout=10)
-    start_t = datetime.now()
-    try:
-        downloader.start(blocking=False)
+            os.makedirs("downloads", exist_ok=True)
+            path = os.path.join("downloads", file_name)
+            root = os.path.realpath("downloads")
+            if os.path.dirname(os.path.realpath(path)) != root:
+                raise ValueError(f"Unsafe file name: {file_name}")
+            try:
+                await downloader.download(
+                    remote.url,
+                    path,
+                    progress=ProgressReporter(
+                        message, "<b>Downloading...</b>", file_name
+                    ).update,
+                    checksum=checksum,
+                    remote=remote,
+                )
+                await message.edit(
+                    f"<b>Downloaded to <code>{path}</code> in "
+                    f"{round(time.perf_counter() - start)} seconds</b>"
+                )
+                await client.send_document(
+                    message.chat.id,
+                    path,
+                    progress=ProgressReporter(message, "<b>Uploading...</b>").update,
+                    caption=caption,
+                    reply_to_message_id=message_id,
+                )
+            finally:
+                if os.path.exists(path):
+                    os.remove(path)
     except Exception as e:
-        return await message.edit_text(format_exc(e))
-    while not downloader.isFinished():
-        total_length = downloader.filesize or None
-        downloaded = downloader.get_dl_size(human=True)
-        u_m = ""
-        now = time.time()
-        diff = now - c_time
-        percentage = downloader.get_progress() * 100
-        speed = downloader.get_speed(human=True)
-        progress_str = (
-            "".join(["▰" for _ in range(math.floor(percentage / 5))])
-            + "".join(["▱" for _ in range(20 - math.floor(percentage / 5))])
-            + f"\n<b>Progress:</b> {round(percentage, 2)}%"
-        )
-        eta = downloader.get_eta(human=True)
-        try:
-            m = "<b>Trying to download...</b>\n"
-            m += f"<b>File Name:</b> <code>{unquote(link.split('/')[-1])}</code>\n"
-            m += f"<b>Speed:</b> {speed}\n"
-            m += f"{progress_str}\n"
-            m += f"{downloaded} of {humanbytes(total_length)}\n"
-            m += f"<b>ETA:</b> {eta}"
-            if round(diff % 10.00) == 0 and m != u_m:
-                await message.edit_text(disable_web_page_preview=True, text=m)
-                u_m = m
-                await asyncio.sleep(5)
-        except Exception as e:
-            await message.edit_text(format_exc(e))
-    if os.path.exists(file_name):
-        end_t = datetime.now()
-        sec = (end_t - start_t).seconds
-        await message.edit_text(
-            f"<b>Downloaded to <code>{file_name}</code> in {sec} seconds</b>"
-        )
-        ms_ = await message.edit("<b>Starting Upload...</b>")
-        await client.send_document(
-            message.chat.id,
-            file_name,
-            progress=progress,
-            progress_args=(ms_, c_time, "`Uploading...`"),
-            caption=f"<b>File Name:</b> <code>{unquote(link.split('/')[-1])}</code>\n",
-            reply_to_message_id=message_id,
-        )
-        await message.delete()
-        os.remove(file_name)
-    else:
-        await message.edit("<b>Failed to download</b>")
+        return await message.edit(format_exc(e))
+
+    await message.delete()
 
 
 @Client.on_message(filters.command("upload", prefix) & filters.me)
@@ -179,16 +142,15 @@ async def upload_cmd(_, message: Message):
     max_file_age = 180
 
     ms_ = await message.edit("`Downloading...`", parse_mode=enums.ParseMode.MARKDOWN)
-    c_time = time.time()
 
     try:
         file_name = await message.download(
-            progress=progress, progress_args=(ms_, c_time, "`Downloading...`")
+            progress=ProgressReporter(ms_, "`Downloading...`").update
         )
     except ValueError:
         try:
             file_name = await message.reply_to_message.download(
-                progress=progress, progress_args=(ms_, c_time, "`Downloading...`")
+                progress=ProgressReporter(ms_, "`Downloading...`").update
             )
         except ValueError:
             await message.edit("<b>File to upload not found</b>")
@@ -202,7 +164,7 @@ async def upload_cmd(_, message: Message):
 
     await message.edit("<b>Uploading...</b>")
     with open(file_name, "rb") as f:
-        response = requests.post(
+        response = await http.post(
             "https://x0.at",
             files={"file": f},
         )
@@ -247,7 +209,7 @@ async def webshot(client: Client, message: Message):
     await message.edit("<b>Generating screenshot...</b>")
 
     try:
-        screenshot_data = generate_screenshot(url)
+        screenshot_data = await generate_screenshot(url)
         if screenshot_data:
             await message.delete()
             await client.send_photo(
@@ -263,7 +225,7 @@ async def webshot(client: Client, message: Message):
 
 modules_help["url"] = {
     "short [url]*": "short url",
-    "urldl [url]*": "download url content",
+    "urldl [url]* [checksum]": "download url content, checksum like sha256:hex is verified",
     "upload [file|reply]*": "upload file to internet",
     "webshot [link]*": "Screenshot of web page",
     "ws [reply to link]*": "Screenshot of web page",
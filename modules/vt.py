@@ -6,16 +6,14 @@
 #
 # All rights reserved.
 
-import os
-import time
 
-import requests
 from pyrogram import Client, enums, filters
 from pyrogram.types import Message
 
+from utils import http, media
 from utils.config import vt_key as vak
 from utils.misc import modules_help, prefix
-from utils.scripts import edit_or_reply, format_exc, progress
+from utils.scripts import ProgressReporter, edit_or_reply, format_exc
 
 
 @Client.on_message(filters.command("vt", prefix) & filters.me)
@@ -41,16 +39,17 @@ async def scan_my_file(_, message: Message):
             f"**File Too Large, Use `{prefix}vtl` instead**",
             parse_mode=enums.ParseMode.MARKDOWN,
         )
-    c_time = time.time()
-    downloaded_file_name = await message.reply_to_message.download(
-        progress=progress,
-        progress_args=(ms_, c_time, "`Downloading This File!`"),
+    downloaded_file = await media.download(
+        message.reply_to_message,
+        progress=ProgressReporter(ms_, "`Downloading This File!`").update,
     )
 
     url = "https://www.virustotal.com/vtapi/v2/file/scan"
     params = {"apikey": vak}
-    files = {"file": (downloaded_file_name, open(downloaded_file_name, "rb"))}
-    response = requests.post(url, files=files, params=params, timeout=10)
+    with downloaded_file:
+        response = await http.post(
+            url, files={"file": downloaded_file}, params=params, timeout=10
+        )
     try:
         r_json = response.json()
         md5 = r_json["md5"]
@@ -59,8 +58,6 @@ async def scan_my_file(_, message: Message):
     await ms_.edit(
         f'<b><u>Scanned {message.reply_to_message.document.file_name}</b></u>. <b>You Can Visit :</b> <a href="https://www.virustotal.com/gui/file/{md5}">Here</a> <b>In 5-10 Min To See File Report</b>'
     )
-    if os.path.exists(downloaded_file_name):
-        os.remove(downloaded_file_name)
 
 
 @Client.on_message(filters.command("vtl", prefix) & filters.me)
@@ -86,28 +83,30 @@ async def scan_my_large_file(_, message: Message):
             "**File Too Large, exceeded Max capacity of 650MB**",
             parse_mode=enums.ParseMode.MARKDOWN,
         )
-    c_time = time.time()
-    downloaded_file_name = await message.reply_to_message.download(
-        progress=progress,
-        progress_args=(ms_, c_time, "`Downloading This File!`"),
+    downloaded_file = await media.download(
+        message.reply_to_message,
+        progress=ProgressReporter(ms_, "`Downloading This File!`").update,
     )
 
     url1 = "https://www.virustotal.com/api/v3/files/upload_url"
 
     headers = {"accept": "application/json", "x-apikey": vak}
 
-    rponse = requests.get(url1, headers=headers, timeout=10)
+    rponse = await http.get(url1, headers=headers, timeout=10)
     try:
         r_json = rponse.json()
         upl_data = r_json["data"]
     except Exception as e:
+        downloaded_file.close()
         return await ms_.edit(format_exc(e))
 
     url = upl_data
 
-    files = {"file": (downloaded_file_name, open(downloaded_file_name, "rb"))}
     headers = {"accept": "application/json", "x-apikey": vak}
-    response = requests.post(url, files=files, headers=headers, timeout=10)
+    with downloaded_file:
+        response = await http.post(
+            url, files={"file": downloaded_file}, headers=headers, timeout=10
+        )
 
     r_json = response.json()
     analysis_url = r_json["data"]["links"]["self"]
@@ -116,7 +115,7 @@ async def scan_my_large_file(_, message: Message):
 
     headers = {"accept": "application/json", "x-apikey": vak}
 
-    response_result = requests.get(url, headers=headers, timeout=10)
+    response_result = await http.get(url, headers=headers, timeout=10)
 
     try:
         r_json = response_result.json()
@@ -126,8 +125,6 @@ async def scan_my_large_file(_, message: Message):
     await ms_.edit(
         f'<b><u>Scanned {message.reply_to_message.document.file_name}</b></u>. <b>You Can Visit :</b> <a href="https://www.virustotal.com/gui/file/{md5}">Here</a> <b>In 5-10 Min To See File Report</b>'
     )
-    if os.path.exists(downloaded_file_name):
-        os.remove(downloaded_file_name)
 
 
 modules_help["virustotal"] = {
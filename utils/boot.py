@@ -0,0 +1,82 @@
+#  Moon-Userbot - telegram userbot
+#  Copyright (C) 2020-present Moon Userbot Organization
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# Startup timeline. Imported by main.py before anything else, so this module
+# must not import config or database itself.
+
+import logging
+import time
+from contextlib import contextmanager
+
+__all__ = ["phase", "mark", "finish", "format_timeline"]
+
+# boots kept in "core.boot" history
+HISTORY_SIZE = 20
+
+_origin = time.perf_counter()
+_started = time.time()
+
+# [name, offset from start, duration] in seconds
+phases = []
+
+
+def mark(name: str, start: float, duration: float):
+    """Add phase measured elsewhere, start is a time.perf_counter() value"""
+    phases.append([name, round(start - _origin, 4), round(duration, 4)])
+
+
+@contextmanager
+def phase(name: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        mark(name, start, time.perf_counter() - start)
+
+
+def finish(reason: str = "start") -> dict:
+    """Save timeline of this boot to the database and write it to the log"""
+    from utils.db import db
+
+    timeline = {
+        "date": int(_started),
+        "reason": reason,
+        "total": round(time.perf_counter() - _origin, 4),
+        "phases": phases,
+    }
+    db.set("core.boot", "last", timeline)
+
+    history = db.get("core.boot", "history", [])
+    history.append({key: timeline[key] for key in ("date", "reason", "total")})
+    db.set("core.boot", "history", history[-HISTORY_SIZE:])
+
+    for name, offset, duration in phases:
+        logging.info("Boot: %-40s +%.3fs %.3fs", name, offset, duration)
+    logging.info("Boot finished in %.3fs (%s)", timeline["total"], reason)
+
+    return timeline
+
+
+def format_timeline(timeline: dict, limit: int = None) -> str:
+    """Timeline as HTML lines, longest phases first when limited"""
+    lines = timeline["phases"]
+    if limit is not None and len(lines) > limit:
+        lines = sorted(lines, key=lambda item: item[2], reverse=True)[:limit]
+        lines.sort(key=lambda item: item[1])
+    return "\n".join(
+        f"<code>+{offset:7.3f}s {duration:7.3f}s</code> {name}"
+        for name, offset, duration in lines
+    )
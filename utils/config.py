@@ -17,6 +17,14 @@ second_session = os.getenv("SECOND_SESSION", env.str("SECOND_SESSION", ""))
 db_type = os.getenv("DATABASE_TYPE", env.str("DATABASE_TYPE"))
 db_url = os.getenv("DATABASE_URL", env.str("DATABASE_URL", ""))
 db_name = os.getenv("DATABASE_NAME", env.str("DATABASE_NAME"))
+db_writeback = env.bool("DATABASE_WRITEBACK", False)
+db_flush_interval = env.float("DATABASE_FLUSH_INTERVAL", 1.0)
+db_max_pending = env.int("DATABASE_MAX_PENDING", 256)
+
+lazy_modules = env.bool("LAZY_MODULES", True)
+
+# MiB, 0 keeps cached media in memory only
+media_cache_size = env.int("MEDIA_CACHE_SIZE", 256)
 
 apiflash_key = os.getenv("APIFLASH_KEY", env.str("APIFLASH_KEY"))
 rmbg_key = os.getenv("RMBG_KEY", env.str("RMBG_KEY", ""))
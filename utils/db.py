@@ -16,17 +16,55 @@
 
 import re
 import json
+import atexit
+import logging
+import asyncio
+import functools
 import threading
 import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
 from dns import resolver
 import pymongo
-from utils import config
+from utils import config, metrics
 
 resolver.default_resolver = resolver.Resolver(configure=False)
 resolver.default_resolver.nameservers = ["1.1.1.1"]
 
 
+# value passed to observers when a variable is removed
+REMOVED = object()
+
+Observer = Callable[[str, Any], None]
+
+
 class Database:
+    def __init__(self):
+        self._observers: Dict[str, List[Observer]] = {}
+
+    def subscribe(self, module: str, observer: Observer):
+        """
+        Call observer(variable, value) after every set and remove in module
+
+        value is REMOVED for removed variables. Observers run in the thread
+        that made the change, often the AsyncDatabase one, so they must be
+        quick and thread-safe.
+        """
+        self._observers.setdefault(module, []).append(observer)
+
+    def unsubscribe(self, module: str, observer: Observer):
+        observers = self._observers.get(module, [])
+        if observer in observers:
+            observers.remove(observer)
+
+    def _notify(self, module: str, variable: str, value):
+        for observer in self._observers.get(module, ()):
+            try:
+                observer(variable, value)
+            except Exception:
+                logging.exception("Database observer of %s failed", module)
+
     def get(self, module: str, variable: str, default=None):
         """Get value from database"""
         raise NotImplementedError
@@ -43,15 +81,76 @@ class Database:
         """Get database for selected module"""
         raise NotImplementedError
 
+    def history_append(self, namespace: str, conversation_id, item):
+        """Append item to the end of conversation history"""
+        raise NotImplementedError
+
+    def history_tail(self, namespace: str, conversation_id, count: int = None) -> list:
+        """Get last `count` items of conversation history, oldest first"""
+        raise NotImplementedError
+
+    def history_trim(
+        self,
+        namespace: str,
+        conversation_id,
+        max_items: int = None,
+        max_bytes: int = None,
+    ):
+        """Drop oldest items until conversation history fits into the budget"""
+        raise NotImplementedError
+
+    def history_clear(self, namespace: str, conversation_id):
+        """Remove conversation history"""
+        raise NotImplementedError
+
+    def _import_history(
+        self, namespace: str, conversation_id, items: list, module: str, variable: str
+    ):
+        """Replace conversation history with items and remove variable of module"""
+        raise NotImplementedError
+
+    def flush(self):
+        """Write pending changes to the storage"""
+
     def close(self):
         """Close the database"""
         raise NotImplementedError
 
+    def _migrate_chat_history(self, user_id):
+        # chat history used to be stored as a single JSON list
+        # which was rewritten on every turn
+        if user_id in self._migrated_histories:
+            return
+        module = f"core.cohere.user_{user_id}"
+        chat_history = self.get(module, "chat_history")
+        if chat_history is not None:
+            self._import_history(
+                "cohere", user_id, chat_history, module, "chat_history"
+            )
+        self._migrated_histories.add(user_id)
+
+    def add_chat_history(self, user_id, message, max_bytes: int = None):
+        self._migrate_chat_history(user_id)
+        self.history_append("cohere", user_id, message)
+        if max_bytes is not None:
+            self.history_trim("cohere", user_id, max_bytes=max_bytes)
+
+    def get_chat_history(self, user_id, default=None, count: int = None):
+        self._migrate_chat_history(user_id)
+        chat_history = self.history_tail("cohere", user_id, count)
+        if not chat_history and default is not None:
+            return default
+        return chat_history
+
 
 class MongoDatabase(Database):
     def __init__(self, url, name):
+        super().__init__()
         self._client = pymongo.MongoClient(url)
         self._database = self._client[name]
+        self._history = self._database["core.history"]
+        self._history_indexed = False
+        self._migrated_histories = set()
 
     def set(self, module: str, variable: str, value):
         if not isinstance(module, str) or not isinstance(variable, str):
@@ -59,6 +158,7 @@ class MongoDatabase(Database):
         self._database[module].replace_one(
             {"var": variable}, {"var": variable, "val": value}, upsert=True
         )
+        self._notify(module, variable, value)
 
     def get(self, module: str, variable: str, default=None):
         if not isinstance(module, str) or not isinstance(variable, str):
@@ -75,20 +175,84 @@ class MongoDatabase(Database):
         if not isinstance(module, str) or not isinstance(variable, str):
             raise ValueError("Module and variable must be strings")
         self._database[module].delete_one({"var": variable})
+        self._notify(module, variable, REMOVED)
+
+    def _history_query(self, namespace: str, conversation_id) -> dict:
+        if not self._history_indexed:
+            self._history.create_index(
+                [
+                    ("ns", pymongo.ASCENDING),
+                    ("conv", pymongo.ASCENDING),
+                    ("seq", pymongo.ASCENDING),
+                ],
+                unique=True,
+            )
+            self._history_indexed = True
+        return {"ns": namespace, "conv": str(conversation_id)}
+
+    def history_append(self, namespace: str, conversation_id, item):
+        query = self._history_query(namespace, conversation_id)
+        last = self._history.find_one(query, {"seq": 1}, sort=[("seq", -1)])
+        self._history.insert_one(
+            {
+                **query,
+                "seq": 1 if last is None else last["seq"] + 1,
+                "val": item,
+                "size": len(json.dumps(item)),
+            }
+        )
+
+    def history_tail(self, namespace: str, conversation_id, count: int = None) -> list:
+        query = self._history_query(namespace, conversation_id)
+        cursor = self._history.find(query, {"val": 1}).sort("seq", -1)
+        if count is not None:
+            cursor = cursor.limit(count)
+        return [doc["val"] for doc in cursor][::-1]
+
+    def history_trim(
+        self,
+        namespace: str,
+        conversation_id,
+        max_items: int = None,
+        max_bytes: int = None,
+    ):
+        query = self._history_query(namespace, conversation_id)
+        # walk newest to oldest reading only seq and size, then drop the rest
+        cutoff = None
+        total_items = total_bytes = 0
+        for doc in self._history.find(query, {"seq": 1, "size": 1}).sort("seq", -1):
+            total_items += 1
+            total_bytes += doc["size"]
+            if (max_items is not None and total_items > max_items) or (
+                max_bytes is not None and total_bytes > max_bytes
+            ):
+                cutoff = doc["seq"]
+                break
+        if cutoff is not None:
+            self._history.delete_many({**query, "seq": {"$lte": cutoff}})
+
+    def history_clear(self, namespace: str, conversation_id):
+        self._history.delete_many(self._history_query(namespace, conversation_id))
+
+    def _import_history(
+        self, namespace: str, conversation_id, items: list, module: str, variable: str
+    ):
+        # no transactions without a replica set; rows left by an interrupted
+        # import are cleared first, so importing again doesn't duplicate them
+        query = self._history_query(namespace, conversation_id)
+        self._history.delete_many(query)
+        if items:
+            self._history.insert_many(
+                [
+                    {**query, "seq": seq, "val": item, "size": len(json.dumps(item))}
+                    for seq, item in enumerate(items, 1)
+                ]
+            )
+        self.remove(module, variable)
 
     def close(self):
         self._client.close()
 
-    def add_chat_history(self, user_id, message):
-        chat_history = self.get_chat_history(user_id, default=[])
-        chat_history.append(message)
-        self.set(f"core.cohere.user_{user_id}", "chat_history", chat_history)
-
-    def get_chat_history(self, user_id, default=None):
-        if default is None:
-            default = []
-        return self.get(f"core.cohere.user_{user_id}", "chat_history", default=[])
-
     def addaiuser(self, user_id):
         chatai_users = self.get("core.chatbot", "chatai_users", default=[])
         if user_id not in chatai_users:
@@ -106,49 +270,125 @@ class MongoDatabase(Database):
 
 
 class SqliteDatabase(Database):
-    def __init__(self, file):
+    def __init__(
+        self,
+        file,
+        writeback: bool = False,
+        flush_interval: float = 1.0,
+        max_pending: int = 256,
+    ):
+        super().__init__()
         self._conn = sqlite3.connect(file, check_same_thread=False)
         self._conn.row_factory = sqlite3.Row
         self._cursor = self._conn.cursor()
-        self._lock = threading.Lock()
+        self._lock = threading.RLock()
+
+        # write-back mode: reads are served from per-module dicts and writes
+        # are committed in one transaction by a timer or when too many queue up
+        self._writeback = writeback
+        self._flush_interval = flush_interval
+        self._max_pending = max_pending
+        self._cache: Dict[str, Dict[str, Tuple[str, str]]] = {}
+        self._pending: Dict[Tuple[str, str], Optional[Tuple[str, str]]] = {}
+        self._timer: Optional[threading.Timer] = None
+        if writeback:
+            atexit.register(self.flush)
+
+        self._migrated_histories = set()
+        with self._lock:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS 'core.history' (
+                ns TEXT NOT NULL,
+                conv TEXT NOT NULL,
+                seq INTEGER NOT NULL,
+                val TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                PRIMARY KEY (ns, conv, seq)
+                )
+                """)
+            self._conn.commit()
 
     @staticmethod
-    def _parse_row(row: sqlite3.Row):
-        if row["type"] == "bool":
-            return row["val"] == "1"
-        if row["type"] == "int":
-            return int(row["val"])
-        if row["type"] == "str":
-            return row["val"]
-        return json.loads(row["val"])
-
-    def _execute(self, module: str, *args, **kwargs) -> sqlite3.Cursor:
+    def _check_module(module: str):
         pattern = r"^(core|custom)"
         if not re.match(pattern, module):
             raise ValueError(f"Invalid module name format: {module}")
 
-        self._lock.acquire()
-        try:
-            cursor = self._conn.cursor()
-            return cursor.execute(*args, **kwargs)
-        except sqlite3.OperationalError as e:
-            if str(e).startswith("no such table"):
-                sql = f"""
-                CREATE TABLE IF NOT EXISTS '{module}' (
-                var TEXT UNIQUE NOT NULL,
-                val TEXT NOT NULL,
-                type TEXT NOT NULL
-                )
-                """
+    @staticmethod
+    def _create_table(cursor: sqlite3.Cursor, module: str):
+        sql = f"""
+        CREATE TABLE IF NOT EXISTS '{module}' (
+        var TEXT UNIQUE NOT NULL,
+        val TEXT NOT NULL,
+        type TEXT NOT NULL
+        )
+        """
+        cursor.execute(sql)
+
+    @staticmethod
+    def _encode(value) -> Tuple[str, str]:
+        if isinstance(value, bool):
+            return ("1" if value else "0"), "bool"
+        if isinstance(value, str):
+            return value, "str"
+        if isinstance(value, int):
+            return str(value), "int"
+        return json.dumps(value), "json"
+
+    @staticmethod
+    def _decode(val: str, typ: str):
+        if typ == "bool":
+            return val == "1"
+        if typ == "int":
+            return int(val)
+        if typ == "str":
+            return val
+        return json.loads(val)
+
+    @classmethod
+    def _parse_row(cls, row: sqlite3.Row):
+        return cls._decode(row["val"], row["type"])
+
+    def _execute(self, module: str, *args, **kwargs) -> sqlite3.Cursor:
+        self._check_module(module)
+
+        with self._lock:
+            try:
                 cursor = self._conn.cursor()
-                cursor.execute(sql)
-                self._conn.commit()
                 return cursor.execute(*args, **kwargs)
-            raise e from None
-        finally:
-            self._lock.release()
+            except sqlite3.OperationalError as e:
+                if str(e).startswith("no such table"):
+                    cursor = self._conn.cursor()
+                    self._create_table(cursor, module)
+                    self._conn.commit()
+                    return cursor.execute(*args, **kwargs)
+                raise e from None
+
+    def _cached_module(self, module: str) -> Dict[str, Tuple[str, str]]:
+        # must be called with self._lock held
+        rows = self._cache.get(module)
+        if rows is None:
+            cur = self._execute(module, f"SELECT * FROM '{module}'")
+            rows = {row["var"]: (row["val"], row["type"]) for row in cur}
+            self._cache[module] = rows
+        return rows
+
+    def _schedule_flush(self):
+        # must be called with self._lock held
+        if len(self._pending) >= self._max_pending:
+            self.flush()
+        elif self._timer is None:
+            self._timer = threading.Timer(self._flush_interval, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
 
     def get(self, module: str, variable: str, default=None):
+        if self._writeback:
+            self._check_module(module)
+            with self._lock:
+                row = self._cached_module(module).get(variable)
+            return default if row is None else self._decode(*row)
+
         sql = f"SELECT * FROM '{module}' WHERE var=?"
         cur = self._execute(module, sql, (variable,))
 
@@ -158,39 +398,51 @@ class SqliteDatabase(Database):
         return self._parse_row(row)
 
     def set(self, module: str, variable: str, value) -> bool:
+        val, typ = self._encode(value)
+
+        if self._writeback:
+            self._check_module(module)
+            with self._lock:
+                self._cached_module(module)[variable] = (val, typ)
+                self._pending[(module, variable)] = (val, typ)
+                self._schedule_flush()
+            self._notify(module, variable, value)
+            return True
+
         sql = f"""
         INSERT INTO '{module}' VALUES ( ?, ?, ? )
         ON CONFLICT (var) DO
         UPDATE SET val=?, type=? WHERE var=?
         """
 
-        if isinstance(value, bool):
-            val = "1" if value else "0"
-            typ = "bool"
-        elif isinstance(value, str):
-            val = value
-            typ = "str"
-        elif isinstance(value, int):
-            val = str(value)
-            typ = "int"
-        else:
-            val = json.dumps(value)
-            typ = "json"
-
         self._execute(module, sql, (variable, val, typ, val, typ, variable))
         self._conn.commit()
+        self._notify(module, variable, value)
 
         return True
 
     def remove(self, module: str, variable: str):
+        if self._writeback:
+            self._check_module(module)
+            with self._lock:
+                self._cached_module(module).pop(variable, None)
+                self._pending[(module, variable)] = None
+                self._schedule_flush()
+            self._notify(module, variable, REMOVED)
+            return
+
         sql = f"DELETE FROM '{module}' WHERE var=?"
         self._execute(module, sql, (variable,))
         self._conn.commit()
+        self._notify(module, variable, REMOVED)
 
     def get_collection(self, module: str) -> dict:
-        pattern = r"^(core|custom)"
-        if not re.match(pattern, module):
-            raise ValueError(f"Invalid module name format: {module}")
+        self._check_module(module)
+
+        if self._writeback:
+            with self._lock:
+                rows = dict(self._cached_module(module))
+            return {var: self._decode(*row) for var, row in rows.items()}
 
         sql = f"SELECT * FROM '{module}'"
         cur = self._execute(module, sql)
@@ -201,20 +453,149 @@ class SqliteDatabase(Database):
 
         return collection
 
+    def flush(self):
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self._pending:
+                return
+
+            pending, self._pending = self._pending, {}
+            cursor = self._conn.cursor()
+            created = set()
+            try:
+                for (module, variable), row in pending.items():
+                    if module not in created:
+                        self._create_table(cursor, module)
+                        created.add(module)
+                    if row is None:
+                        cursor.execute(
+                            f"DELETE FROM '{module}' WHERE var=?", (variable,)
+                        )
+                    else:
+                        cursor.execute(
+                            f"""
+                            INSERT INTO '{module}' VALUES ( ?, ?, ? )
+                            ON CONFLICT (var) DO
+                            UPDATE SET val=?, type=? WHERE var=?
+                            """,
+                            (variable, *row, *row, variable),
+                        )
+                self._conn.commit()
+            except sqlite3.Error:
+                self._conn.rollback()
+                # keep the failed batch, newer writes take precedence
+                pending.update(self._pending)
+                self._pending = pending
+                raise
+
+    def history_append(self, namespace: str, conversation_id, item):
+        val = json.dumps(item)
+        with self._lock:
+            self._conn.execute(
+                """
+                INSERT INTO 'core.history'
+                SELECT ?, ?, COALESCE(MAX(seq), 0) + 1, ?, ?
+                FROM 'core.history' WHERE ns=? AND conv=?
+                """,
+                (
+                    namespace,
+                    str(conversation_id),
+                    val,
+                    len(val),
+                    namespace,
+                    str(conversation_id),
+                ),
+            )
+            self._conn.commit()
+
+    def history_tail(self, namespace: str, conversation_id, count: int = None) -> list:
+        with self._lock:
+            rows = self._conn.execute(
+                """
+                SELECT val FROM 'core.history' WHERE ns=? AND conv=?
+                ORDER BY seq DESC LIMIT ?
+                """,
+                (namespace, str(conversation_id), -1 if count is None else count),
+            ).fetchall()
+        return [json.loads(row["val"]) for row in reversed(rows)]
+
+    def history_trim(
+        self,
+        namespace: str,
+        conversation_id,
+        max_items: int = None,
+        max_bytes: int = None,
+    ):
+        with self._lock:
+            self._conn.execute(
+                """
+                DELETE FROM 'core.history' WHERE ns=? AND conv=? AND seq IN (
+                    SELECT seq FROM (
+                        SELECT seq,
+                        ROW_NUMBER() OVER (ORDER BY seq DESC) AS items,
+                        SUM(size) OVER (ORDER BY seq DESC) AS bytes
+                        FROM 'core.history' WHERE ns=? AND conv=?
+                    ) WHERE items > ? OR bytes > ?
+                )
+                """,
+                (
+                    namespace,
+                    str(conversation_id),
+                    namespace,
+                    str(conversation_id),
+                    max_items,
+                    max_bytes,
+                ),
+            )
+            self._conn.commit()
+
+    def history_clear(self, namespace: str, conversation_id):
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM 'core.history' WHERE ns=? AND conv=?",
+                (namespace, str(conversation_id)),
+            )
+            self._conn.commit()
+
+    def _import_history(
+        self, namespace: str, conversation_id, items: list, module: str, variable: str
+    ):
+        self._check_module(module)
+        conv = str(conversation_id)
+        rows = [json.dumps(item) for item in items]
+        with self._lock:
+            # one transaction, an interrupted import leaves the old value
+            cursor = self._conn.cursor()
+            try:
+                cursor.execute(
+                    "DELETE FROM 'core.history' WHERE ns=? AND conv=?",
+                    (namespace, conv),
+                )
+                cursor.executemany(
+                    "INSERT INTO 'core.history' VALUES (?, ?, ?, ?, ?)",
+                    [
+                        (namespace, conv, seq, val, len(val))
+                        for seq, val in enumerate(rows, 1)
+                    ],
+                )
+                self._create_table(cursor, module)
+                cursor.execute(f"DELETE FROM '{module}' WHERE var=?", (variable,))
+                self._conn.commit()
+            except sqlite3.Error:
+                self._conn.rollback()
+                raise
+            if self._writeback:
+                self._cached_module(module).pop(variable, None)
+                self._pending.pop((module, variable), None)
+        self._notify(module, variable, REMOVED)
+
     def close(self):
+        self.flush()
         self._conn.commit()
         self._conn.close()
 
-    def add_chat_history(self, user_id, message):
-        chat_history = self.get_chat_history(user_id, default=[])
-        chat_history.append(message)
-        self.set(f"core.cohere.user_{user_id}", "chat_history", chat_history)
-
-    def get_chat_history(self, user_id, default=None):
-        if default is None:
-            default = []
-        return self.get(f"core.cohere.user_{user_id}", "chat_history", default=[])
-
     def addaiuser(self, user_id):
         chatai_users = self.get("core.chatbot", "chatai_users", default=[])
         if user_id not in chatai_users:
@@ -231,7 +612,57 @@ class SqliteDatabase(Database):
         return self.get("core.chatbot", "chatai_users", default=[])
 
 
+class AsyncDatabase:
+    """Awaitable interface to a Database.
+
+    Calls are run one by one in a dedicated I/O thread, so a slow query
+    doesn't block the event loop and writes are applied in the order they
+    were issued.
+    """
+
+    def __init__(self, database: Database):
+        self._db = database
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db")
+
+    async def _run(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        try:
+            return await loop.run_in_executor(
+                self._executor, functools.partial(func, *args, **kwargs)
+            )
+        finally:
+            metrics.observe("db_op", time.perf_counter() - start)
+
+    async def aget(self, module: str, variable: str, default=None):
+        """Get value from database"""
+        return await self._run(self._db.get, module, variable, default)
+
+    async def aset(self, module: str, variable: str, value):
+        """Set key in database"""
+        return await self._run(self._db.set, module, variable, value)
+
+    async def aremove(self, module: str, variable: str):
+        """Remove key from database"""
+        return await self._run(self._db.remove, module, variable)
+
+    async def aget_collection(self, module: str) -> dict:
+        """Get database for selected module"""
+        return await self._run(self._db.get_collection, module)
+
+    def close(self):
+        """Wait for queued calls to finish"""
+        self._executor.shutdown(wait=True)
+
+
 if config.db_type in ["mongo", "mongodb"]:
     db = MongoDatabase(config.db_url, config.db_name)
 else:
-    db = SqliteDatabase(config.db_name)
+    db = SqliteDatabase(
+        config.db_name,
+        writeback=config.db_writeback,
+        flush_interval=config.db_flush_interval,
+        max_pending=config.db_max_pending,
+    )
+
+adb = AsyncDatabase(db)
@@ -0,0 +1,438 @@
+#  Moon-Userbot - telegram userbot
+#  Copyright (C) 2020-present Moon Userbot Organization
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import asyncio
+import hashlib
+import io
+import logging
+import os
+import re
+from collections import deque
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+from urllib.parse import unquote, urlparse
+
+import aiohttp
+from pyrogram import StopTransmission
+
+from utils import http
+
+__all__ = [
+    "ChecksumError",
+    "RemoteFile",
+    "probe",
+    "safe_filename",
+    "download",
+    "verify_file",
+    "StreamingDownload",
+]
+
+CONNECTIONS = 4
+# ranges fetched by one connection at a time
+SEGMENT_SIZE = 4 * 1024 * 1024
+STREAM_SEGMENT_SIZE = 1024 * 1024
+# how far a stream may download ahead of the upload
+STREAM_WINDOW = 16 * 1024 * 1024
+# pyrogram reads uploaded files in parts of this size
+UPLOAD_PART_SIZE = 512 * 1024
+CHUNK_SIZE = 256 * 1024
+# dropped connections resumed in a row before giving up
+RETRIES = 5
+
+TIMEOUT = aiohttp.ClientTimeout(total=None, sock_connect=15, sock_read=30)
+HASH_LENGTHS = {32: "md5", 40: "sha1", 64: "sha256", 128: "sha512"}
+CONTENT_RANGE = re.compile(r"bytes \d+-\d+/(\d+)")
+
+Progress = Callable[[int, Optional[int]], Awaitable]
+
+
+class ChecksumError(ValueError):
+    pass
+
+
+class RemoteFile:
+    """What probe() learned about a remote file"""
+
+    __slots__ = ("url", "size", "ranges", "name", "content_type")
+
+    def __init__(
+        self, url: str, size: Optional[int], ranges: bool, name: str, content_type
+    ):
+        self.url = url
+        self.size = size
+        self.ranges = ranges
+        self.name = name
+        self.content_type = content_type
+
+
+def safe_filename(name: Optional[str], default: str = "file") -> str:
+    """Reduce a name from a server or url to a plain file name"""
+    name = os.path.basename((name or "").replace("\\", "/"))
+    name = name.replace("\0", "").strip().lstrip(".")
+    return name or default
+
+
+async def probe(url: str, headers: dict = None) -> RemoteFile:
+    """Get size, name and range support of url with a one-byte range request"""
+    async with http.get_session().get(
+        url, headers={**(headers or {}), "Range": "bytes=0-0"}, timeout=TIMEOUT
+    ) as response:
+        response.raise_for_status()
+        match = CONTENT_RANGE.match(response.headers.get("Content-Range", ""))
+        if response.status == 206 and match:
+            size, ranges = int(match.group(1)), True
+        else:
+            # range ignored, body is the whole file and isn't read here
+            size, ranges = response.content_length, False
+
+        disposition = response.content_disposition
+        name = disposition.filename if disposition else None
+        return RemoteFile(
+            str(response.url),
+            size,
+            ranges,
+            safe_filename(name or unquote(urlparse(str(response.url)).path)),
+            response.content_type,
+        )
+
+
+def _hasher(checksum: str) -> Tuple["hashlib._Hash", str]:
+    """Hash object and expected digest for "algorithm:hex" or bare hex checksum"""
+    algorithm, _, digest = checksum.rpartition(":")
+    digest = digest.strip().lower()
+    algorithm = algorithm.strip().lower() or HASH_LENGTHS.get(len(digest))
+    if not algorithm:
+        raise ValueError(f"Can't tell hash algorithm of checksum {checksum!r}")
+    return hashlib.new(algorithm), digest
+
+
+def _hash_file(path: str, checksum: str):
+    digest, expected = _hasher(checksum)
+    with open(path, "rb") as f:
+        while chunk := f.read(1024 * 1024):
+            digest.update(chunk)
+    if digest.hexdigest() != expected:
+        raise ChecksumError(
+            f"{digest.name} of {os.path.basename(path)} is "
+            f"{digest.hexdigest()}, expected {expected}"
+        )
+
+
+async def verify_file(path: str, checksum: str):
+    """Raise ChecksumError if file doesn't match checksum"""
+    await asyncio.to_thread(_hash_file, path, checksum)
+
+
+async def _fetch_range(
+    url: str,
+    start: int,
+    end: int,
+    write: Callable[[int, bytes], Awaitable],
+    headers: dict = None,
+):
+    """Download bytes start..end inclusive, resuming where a connection dropped"""
+    position = start
+    attempt = 0
+    while position <= end:
+        resumed_from = position
+        try:
+            async with http.get_session().get(
+                url,
+                headers={**(headers or {}), "Range": f"bytes={position}-{end}"},
+                timeout=TIMEOUT,
+            ) as response:
+                response.raise_for_status()
+                if response.status != 206:
+                    raise ValueError(f"Server ignored range request for {url}")
+                async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                    chunk = chunk[: end + 1 - position]
+                    await write(position, chunk)
+                    position += len(chunk)
+                    if position > end:
+                        break
+        except http.REQUEST_ERRORS as e:
+            if position > resumed_from:
+                attempt = 0
+            attempt += 1
+            if attempt > RETRIES:
+                raise
+            logging.info(
+                "Download of %s dropped at %s (%s), resuming", url, position, e
+            )
+            await asyncio.sleep(min(2**attempt, 30))
+        else:
+            if position == resumed_from and position <= end:
+                raise ValueError(f"Server sent empty range of {url} at {position}")
+
+
+async def _run_all(coros):
+    """Run coroutines together, cancelling the rest when one fails"""
+    tasks = [asyncio.ensure_future(coro) for coro in coros]
+    try:
+        await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+
+async def download(
+    url: str,
+    path: str,
+    *,
+    connections: int = CONNECTIONS,
+    progress: Progress = None,
+    checksum: str = None,
+    remote: RemoteFile = None,
+    headers: dict = None,
+) -> str:
+    """
+    Download url to path over several connections using range requests
+
+    Falls back to a single connection when the server doesn't support
+    ranges or the file is small.
+
+    :param progress: coroutine function called with (downloaded, total) bytes
+    :param checksum: "algorithm:hex" or bare hex digest to verify the file with
+    :param remote: result of probe(), if url was already probed
+    :return: path to the downloaded file
+    """
+    remote = remote or await probe(url, headers=headers)
+    size = remote.size
+
+    if not remote.ranges or not size or size <= SEGMENT_SIZE or connections < 2:
+        await http.download(remote.url, path, progress=progress, headers=headers)
+    else:
+        segments = deque(
+            (start, min(start + SEGMENT_SIZE, size) - 1)
+            for start in range(0, size, SEGMENT_SIZE)
+        )
+        done = 0
+        fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+
+        async def write(position: int, chunk: bytes):
+            nonlocal done
+            await asyncio.to_thread(os.pwrite, fd, chunk, position)
+            done += len(chunk)
+            if progress is not None:
+                await progress(done, size)
+
+        async def worker():
+            while segments:
+                start, end = segments.popleft()
+                await _fetch_range(remote.url, start, end, write, headers)
+
+        try:
+            os.ftruncate(fd, size)
+            await _run_all(worker() for _ in range(min(connections, len(segments))))
+        finally:
+            os.close(fd)
+
+    if checksum:
+        await verify_file(path, checksum)
+    return path
+
+
+class StreamingDownload(io.RawIOBase):
+    """
+    Remote file that pyrogram can upload while it is being downloaded
+
+    Segments are downloaded in parallel, at most ``window`` bytes ahead of
+    the upload, and dropped from memory once uploaded, so neither the disk
+    nor memory has to hold the whole file. Pyrogram reads files
+    synchronously, so ``progress()`` must be passed as upload progress: it
+    holds the upload until the next part is downloaded.
+
+        stream = StreamingDownload(await probe(url))
+        try:
+            await stream.start()
+            await client.send_document(chat_id, stream, progress=stream.progress())
+            stream.verify()
+        finally:
+            await stream.aclose()
+    """
+
+    def __init__(
+        self,
+        remote: RemoteFile,
+        *,
+        connections: int = CONNECTIONS,
+        window: int = STREAM_WINDOW,
+        checksum: str = None,
+        headers: dict = None,
+    ):
+        if not remote.ranges or not remote.size:
+            raise ValueError("Streaming needs a server with range requests")
+        super().__init__()
+        self.remote = remote
+        self.name = remote.name
+        self.size = remote.size
+        self.connections = connections
+        self.window = max(window, STREAM_SEGMENT_SIZE * connections)
+        self.headers = headers
+        self.error: Optional[BaseException] = None
+        self._checksum = checksum
+        self._hash, self._expected = _hasher(checksum) if checksum else (None, None)
+        self._hashed = 0
+        # downloaded segments by index, dropped once read
+        self._segments: Dict[int, bytearray] = {}
+        self._next_segment = 0
+        self._position = 0
+        self._dropped = 0
+        self._changed = asyncio.Event()
+        self._tasks = []
+
+    def _notify(self):
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    def _available(self, offset: int) -> bool:
+        """Whether everything from the current position up to offset is downloaded"""
+        first = self._position // STREAM_SEGMENT_SIZE
+        last = (offset - 1) // STREAM_SEGMENT_SIZE
+        return all(
+            index in self._segments or index * STREAM_SEGMENT_SIZE < self._dropped
+            for index in range(first, last + 1)
+        )
+
+    async def _worker(self):
+        try:
+            while self._next_segment * STREAM_SEGMENT_SIZE < self.size:
+                index = self._next_segment
+                self._next_segment += 1
+                start = index * STREAM_SEGMENT_SIZE
+                end = min(start + STREAM_SEGMENT_SIZE, self.size) - 1
+
+                while start >= self._position + self.window:
+                    await self._changed.wait()
+
+                buffer = bytearray(end - start + 1)
+
+                async def write(position: int, chunk: bytes):
+                    buffer[position - start : position - start + len(chunk)] = chunk
+
+                await _fetch_range(self.remote.url, start, end, write, self.headers)
+                self._segments[index] = buffer
+                self._notify()
+        except Exception as e:
+            self.error = e
+            self._notify()
+
+    async def start(self):
+        """Start downloading and wait for the first part"""
+        self._tasks = [
+            asyncio.ensure_future(self._worker())
+            for _ in range(min(self.connections, -(-self.size // STREAM_SEGMENT_SIZE)))
+        ]
+        await self.wait(min(UPLOAD_PART_SIZE, self.size))
+
+    async def wait(self, offset: int):
+        """Wait until the file is downloaded up to offset"""
+        offset = min(offset, self.size)
+        while True:
+            changed = self._changed
+            if self.error is not None:
+                raise self.error
+            if self._available(offset):
+                return
+            await changed.wait()
+
+    def progress(self, callback: Progress = None) -> Progress:
+        """Upload progress callback that keeps the upload behind the download"""
+
+        async def on_progress(current: int, total: int, *args):
+            try:
+                await self.wait(current + UPLOAD_PART_SIZE)
+            except Exception:
+                # pyrogram swallows other errors and returns an empty file
+                raise StopTransmission
+            if callback is not None:
+                await callback(current, total, *args)
+
+        return on_progress
+
+    def verify(self):
+        """Raise ChecksumError if the uploaded data doesn't match the checksum"""
+        if self._hash is None:
+            return
+        if self._hashed != self.size:
+            raise ChecksumError(f"{self.name} wasn't read sequentially to the end")
+        if self._hash.hexdigest() != self._expected:
+            raise ChecksumError(
+                f"{self._hash.name} of {self.name} is {self._hash.hexdigest()}, "
+                f"expected {self._expected}"
+            )
+
+    async def aclose(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._segments.clear()
+        self.close()
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += self.size
+        if offset < self._dropped:
+            raise io.UnsupportedOperation("Can't seek back to data already uploaded")
+        self._position = offset
+        return offset
+
+    def read(self, size: int = -1) -> bytes:
+        end = self.size if size is None or size < 0 else self._position + size
+        end = min(end, self.size)
+        if end <= self._position:
+            return b""
+        if not self._available(end):
+            raise RuntimeError("Read ahead of download, await wait() first")
+
+        data = bytearray()
+        position = self._position
+        while position < end:
+            index, skip = divmod(position, STREAM_SEGMENT_SIZE)
+            piece = self._segments[index][skip : skip + end - position]
+            data += piece
+            position += len(piece)
+        if self._hash is not None and self._hashed == self._position:
+            self._hash.update(data)
+            self._hashed = end
+        self._position = end
+
+        for index in [
+            i for i in self._segments if (i + 1) * STREAM_SEGMENT_SIZE <= end
+        ]:
+            del self._segments[index]
+        self._dropped = max(
+            self._dropped, end // STREAM_SEGMENT_SIZE * STREAM_SEGMENT_SIZE
+        )
+        self._notify()
+        return bytes(data)
+
+    def readinto(self, buffer) -> int:
+        data = self.read(len(buffer))
+        buffer[: len(data)] = data
+        return len(data)
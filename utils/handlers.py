@@ -16,11 +16,15 @@
 
 import re
 from datetime import datetime, timedelta
-from typing import Dict, Union
+from typing import Callable, Dict, List, Optional, Set, Tuple, Union
 
 from pyrogram import Client
 from pyrogram.errors import (
     ChatAdminRequired,
+    FileReferenceExpired,
+    FileReferenceInvalid,
+    MediaEmpty,
+    MessageIdInvalid,
     PeerIdInvalid,
     RPCError,
     UserAdminInvalid,
@@ -44,10 +48,96 @@ from pyrogram.utils import (
     get_channel_id,
 )
 
-from utils.db import db
+from utils.db import adb, db
 from utils.misc import prefix
+from utils.moderation import BulkJob, run_with_status, running_jobs
 from utils.scripts import format_exc, text
 
+ATS_KEY = re.compile(
+    r"^(c|antich|antiraid|linked|welcome_enabled|welcome_text)(-?\d+)$"
+)
+
+
+class ChatState:
+    """Admin tool settings of a single chat, as checked on every message"""
+
+    def __init__(self):
+        self.tmuted: Set[int] = set()
+        self.antich: bool = False
+        self.antiraid: bool = False
+        self.linked: int = 0
+        self.welcome_enabled: bool = False
+        self.welcome_text: Optional[str] = None
+
+    def apply(self, key: str, value):
+        if key == "c":
+            self.tmuted = set(value or [])
+        else:
+            setattr(self, key, value)
+
+
+chat_states: Dict[int, ChatState] = {}
+
+
+def get_chat_state(chat_id: int) -> ChatState:
+    state = chat_states.get(chat_id)
+    if state is None:
+        state = chat_states[chat_id] = ChatState()
+    return state
+
+
+async def update_chat_state(chat_id: int, key: str, value):
+    """Save admin tool setting of a chat and apply it to the chat state"""
+    await adb.aset("core.ats", f"{key}{chat_id}", value)
+    get_chat_state(chat_id).apply(key, value)
+
+
+def load_chat_states():
+    chat_states.clear()
+    for var, value in db.get_collection("core.ats").items():
+        match = ATS_KEY.match(var)
+        if match:
+            get_chat_state(int(match[2])).apply(match[1], value)
+
+
+load_chat_states()
+
+
+# InputMedia lists of stored notes and filters, keyed by (chat_id, message_id)
+media_group_cache: Dict[Tuple[int, int], List] = {}
+
+
+def forget_media_group(chat_id: int, message_id: int):
+    media_group_cache.pop((chat_id, message_id), None)
+
+
+async def send_cached_media_group(
+    client: Client,
+    chat_id: int,
+    from_chat_id: int,
+    message_id: int,
+    prepare: Callable[[List[Message]], List],
+    **kwargs,
+):
+    """Send stored media group, resolving it only if it isn't cached yet"""
+    key = (from_chat_id, message_id)
+    media = media_group_cache.get(key)
+    if media is not None:
+        try:
+            return await client.send_media_group(chat_id, media, **kwargs)
+        except (
+            FileReferenceExpired,
+            FileReferenceInvalid,
+            MediaEmpty,
+            MessageIdInvalid,
+        ):
+            forget_media_group(*key)
+
+    media = prepare(await client.get_media_group(from_chat_id, message_id))
+    result = await client.send_media_group(chat_id, media, **kwargs)
+    media_group_cache[key] = media
+    return result
+
 
 async def check_username_or_id(data: Union[str, int]) -> str:
     data = str(data)
@@ -341,32 +431,24 @@ class KickHandler:
 
 
 class KickDeletedAccountsHandler:
-    def __init__(self, client: Client, message: Message):
+    def __init__(self, client: Client, message: Message, dry_run: bool = False):
         self.client = client
         self.message = message
         self.chat_id = message.chat.id
-        self.kicked_count = 0
+        self.dry_run = dry_run
 
     async def kick_deleted_accounts(self):
-        await self.message.edit("<b>Kicking deleted accounts...</b>")
-        try:
-            async for member in self.client.get_chat_members(self.chat_id):
-                if member.user.is_deleted:
-                    await self.kick_member(member.user.id)
-                    self.kicked_count += 1
-        except Exception as e:
-            return await self.message.edit(format_exc(e))
-        await self.message.edit(
-            f"<b>Successfully kicked {self.kicked_count} deleted account(s)</b>",
+        if self.chat_id in running_jobs:
+            return await self.message.edit(
+                "<b>Another bulk job is running in this chat</b>"
+            )
+        job = BulkJob(
+            self.client, self.chat_id, "kick", "deleted", dry_run=self.dry_run
         )
-
-    async def kick_member(self, user_id):
         try:
-            await self.client.ban_chat_member(
-                self.chat_id, user_id, datetime.now() + timedelta(seconds=31)
-            )
+            await run_with_status(job, self.message)
         except Exception as e:
-            await self.message.edit(f"Failed to kick user {user_id}: {format_exc(e)}")
+            await self.message.edit(format_exc(e))
 
 
 class TimeMuteHandler:
@@ -375,7 +457,7 @@ class TimeMuteHandler:
         self.message = message
         self.cause = text(message)
         self.chat_id = message.chat.id
-        self.tmuted_users = db.get("core.ats", f"c{self.chat_id}", [])
+        self.tmuted_users = get_chat_state(self.chat_id).tmuted
 
     async def handle_tmute(self):
         if self.message.reply_to_message:
@@ -391,8 +473,8 @@ class TimeMuteHandler:
             if user_for_tmute in self.tmuted_users:
                 await self.message.edit(f"<b>{name}</b> <code>already in tmute</code>")
             else:
-                self.tmuted_users.append(user_for_tmute)
-                db.set("core.ats", f"c{self.chat_id}", self.tmuted_users)
+                self.tmuted_users.add(user_for_tmute)
+                await adb.aset("core.ats", f"c{self.chat_id}", list(self.tmuted_users))
                 await self.message.edit(
                     f"<b>{name}</b> <code>in tmute</code>"
                     + f"\n{'<b>Cause:</b> <i>' + self.cause.split(maxsplit=1)[1] + '</i>' if len(self.cause.split()) > 1 else ''}",
@@ -409,8 +491,10 @@ class TimeMuteHandler:
                         else user_to_tmute.title
                     )
                     if user_to_tmute.id not in self.tmuted_users:
-                        self.tmuted_users.append(user_to_tmute.id)
-                        db.set("core.ats", f"c{self.chat_id}", self.tmuted_users)
+                        self.tmuted_users.add(user_to_tmute.id)
+                        await adb.aset(
+                            "core.ats", f"c{self.chat_id}", list(self.tmuted_users)
+                        )
                         await self.message.edit(
                             f"<b>{name}</b> <code>in tmute</code>"
                             + f"\n{'<b>Cause:</b> <i>' + self.cause.split(maxsplit=2)[2] + '</i>' if len(self.cause.split()) > 2 else ''}",
@@ -438,7 +522,7 @@ class TimeUnmuteHandler:
         self.message = message
         self.cause = text(message)
         self.chat_id = message.chat.id
-        self.tmuted_users = db.get("core.ats", f"c{self.chat_id}", [])
+        self.tmuted_users = get_chat_state(self.chat_id).tmuted
 
     async def handle_tunmute(self):
         if self.message.reply_to_message:
@@ -455,7 +539,7 @@ class TimeUnmuteHandler:
                 await self.message.edit(f"<b>{name}</b> <code>not in tmute</code>")
             else:
                 self.tmuted_users.remove(user_for_tunmute)
-                db.set("core.ats", f"c{self.chat_id}", self.tmuted_users)
+                await adb.aset("core.ats", f"c{self.chat_id}", list(self.tmuted_users))
                 await self.message.edit(
                     f"<b>{name}</b> <code>tunmuted</code>"
                     + f"\n{'<b>Cause:</b> <i>' + self.cause.split(maxsplit=1)[1] + '</i>' if len(self.cause.split()) > 1 else ''}",
@@ -477,7 +561,9 @@ class TimeUnmuteHandler:
                         )
                     else:
                         self.tmuted_users.remove(user_to_tunmute.id)
-                        db.set("core.ats", f"c{self.chat_id}", self.tmuted_users)
+                        await adb.aset(
+                            "core.ats", f"c{self.chat_id}", list(self.tmuted_users)
+                        )
                         await self.message.edit(
                             f"<b>{name}</b> <code>tunmuted</code>"
                             + f"\n{'<b>Cause:</b> <i>' + self.cause.split(maxsplit=2)[2] + '</i>' if len(self.cause.split()) > 2 else ''}",
@@ -500,7 +586,7 @@ class TimeMuteUsersHandler:
         self.client = client
         self.message = message
         self.chat_id = message.chat.id
-        self.tmuted_users = db.get("core.ats", f"c{self.chat_id}", [])
+        self.tmuted_users = list(get_chat_state(self.chat_id).tmuted)
 
     async def list_tmuted_users(self):
         if self.message.chat.type not in ["private", "channel"]:
@@ -949,25 +1035,25 @@ class AntiChannelsHandler:
             )
 
     async def toggle_anti_channels_status(self):
-        current_status = db.get("core.ats", f"antich{self.chat_id}", False)
+        current_status = get_chat_state(self.chat_id).antich
         new_status = not current_status
-        db.set("core.ats", f"antich{self.chat_id}", new_status)
+        await update_chat_state(self.chat_id, "antich", new_status)
         if new_status:
             await self.message.edit("<b>Blocking channels in this chat enabled.</b>")
         else:
             await self.message.edit("<b>Blocking channels in this chat disabled.</b>")
 
     async def enable_anti_channels(self):
-        db.set("core.ats", f"antich{self.chat_id}", True)
+        await update_chat_state(self.chat_id, "antich", True)
         group = await self.client.get_chat(self.chat_id)
         if group.linked_chat:
-            db.set("core.ats", f"linked{self.chat_id}", group.linked_chat.id)
+            await update_chat_state(self.chat_id, "linked", group.linked_chat.id)
         else:
-            db.set("core.ats", f"linked{self.chat_id}", 0)
+            await update_chat_state(self.chat_id, "linked", 0)
         await self.message.edit("<b>Blocking channels in this chat enabled.</b>")
 
     async def disable_anti_channels(self):
-        db.set("core.ats", f"antich{self.chat_id}", False)
+        await update_chat_state(self.chat_id, "antich", False)
         await self.message.edit("<b>Blocking channels in this chat disabled.</b>")
 
 
@@ -1072,31 +1158,31 @@ class AntiRaidHandler:
             await self.toggle_antiraid()
 
     async def enable_antiraid(self):
-        db.set("core.ats", f"antiraid{self.chat_id}", True)
+        await update_chat_state(self.chat_id, "antiraid", True)
         group = await self.client.get_chat(self.chat_id)
         if group.linked_chat:
-            db.set("core.ats", f"linked{self.chat_id}", group.linked_chat.id)
+            await update_chat_state(self.chat_id, "linked", group.linked_chat.id)
         else:
-            db.set("core.ats", f"linked{self.chat_id}", 0)
+            await update_chat_state(self.chat_id, "linked", 0)
         await self.message.edit(
             "<b>Anti-raid mode enabled!\n"
             f"Disable with: </b><code>{self.prefix}antiraid off</code>"
         )
 
     async def disable_antiraid(self):
-        db.set("core.ats", f"antiraid{self.chat_id}", False)
+        await update_chat_state(self.chat_id, "antiraid", False)
         await self.message.edit("<b>Anti-raid mode disabled</b>")
 
     async def toggle_antiraid(self):
-        current_status = db.get("core.ats", f"antiraid{self.chat_id}", False)
+        current_status = get_chat_state(self.chat_id).antiraid
         new_status = not current_status
-        db.set("core.ats", f"antiraid{self.chat_id}", new_status)
+        await update_chat_state(self.chat_id, "antiraid", new_status)
         if new_status:
             group = await self.client.get_chat(self.chat_id)
             if group.linked_chat:
-                db.set("core.ats", f"linked{self.chat_id}", group.linked_chat.id)
+                await update_chat_state(self.chat_id, "linked", group.linked_chat.id)
             else:
-                db.set("core.ats", f"linked{self.chat_id}", 0)
+                await update_chat_state(self.chat_id, "linked", 0)
             await self.message.edit(
                 "<b>Anti-raid mode enabled!\n"
                 f"Disable with: </b><code>{self.prefix}antiraid off</code>"
@@ -1117,7 +1203,7 @@ class NoteSendHandler:
             await self.message.edit("<b>Loading...</b>")
 
             note_name = self.message.text.split(maxsplit=1)[1]
-            find_note = db.get("core.notes", f"note{note_name}", False)
+            find_note = await adb.aget("core.notes", f"note{note_name}", False)
             if find_note:
                 try:
                     await self.send_note(find_note)
@@ -1143,18 +1229,23 @@ class NoteSendHandler:
             await self.copy_message(find_note)
 
     async def send_media_group(self, find_note):
-        messages_grouped = await self.client.get_media_group(
-            int(find_note["CHAT_ID"]), int(find_note["MESSAGE_ID"])
-        )
-        media_grouped_list = self.prepare_media_group(messages_grouped)
         if self.message.reply_to_message:
-            await self.client.send_media_group(
+            await send_cached_media_group(
+                self.client,
                 self.message.chat.id,
-                media_grouped_list,
+                int(find_note["CHAT_ID"]),
+                int(find_note["MESSAGE_ID"]),
+                self.prepare_media_group,
                 reply_to_message_id=self.message.reply_to_message.id,
             )
         else:
-            await self.client.send_media_group(self.message.chat.id, media_grouped_list)
+            await send_cached_media_group(
+                self.client,
+                self.message.chat.id,
+                int(find_note["CHAT_ID"]),
+                int(find_note["MESSAGE_ID"]),
+                self.prepare_media_group,
+            )
 
     async def copy_message(self, find_note):
         if self.message.reply_to_message:
@@ -0,0 +1,231 @@
+#  Moon-Userbot - telegram userbot
+#  Copyright (C) 2020-present Moon Userbot Organization
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import asyncio
+import json
+import os
+import time
+from typing import Awaitable, Callable, Optional
+
+import aiofiles
+import aiohttp
+
+from utils import metrics
+
+__all__ = [
+    "REQUEST_ERRORS",
+    "Response",
+    "get_session",
+    "request",
+    "get",
+    "post",
+    "head",
+    "download",
+    "close",
+]
+
+# no total limit, large bodies may take long, a stalled read fails instead
+DEFAULT_TIMEOUT = aiohttp.ClientTimeout(total=None, sock_connect=15, sock_read=60)
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+# what may be raised by a request, like requests.RequestException
+REQUEST_ERRORS = (aiohttp.ClientError, asyncio.TimeoutError)
+
+_session: Optional[aiohttp.ClientSession] = None
+
+
+class Response:
+    """Fully read HTTP response with a `requests`-like interface"""
+
+    def __init__(self, response: aiohttp.ClientResponse, content: bytes):
+        self.status_code = response.status
+        self.reason = response.reason
+        self.headers = response.headers
+        self.cookies = response.cookies
+        self.url = str(response.url)
+        self.encoding = response.charset or "utf-8"
+        self.content = content
+        self._response = response
+
+    @property
+    def ok(self) -> bool:
+        return self.status_code < 400
+
+    @property
+    def text(self) -> str:
+        return self.content.decode(self.encoding, "replace")
+
+    def json(self):
+        return json.loads(self.content)
+
+    def raise_for_status(self):
+        if not self.ok:
+            raise aiohttp.ClientResponseError(
+                self._response.request_info,
+                self._response.history,
+                status=self.status_code,
+                message=self.reason or "",
+                headers=self.headers,
+            )
+
+
+def get_session() -> aiohttp.ClientSession:
+    """Shared session, created on first use inside the running event loop"""
+    global _session
+    if _session is None or _session.closed:
+        _session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(
+                limit=100, limit_per_host=8, ttl_dns_cache=300
+            ),
+            timeout=DEFAULT_TIMEOUT,
+        )
+    return _session
+
+
+def _form_data(data: Optional[dict], files: dict) -> aiohttp.FormData:
+    # accepts `files` in the same shapes as requests does
+    form = aiohttp.FormData()
+    for name, value in (data or {}).items():
+        form.add_field(name, str(value))
+    for name, value in files.items():
+        content_type = None
+        if isinstance(value, tuple):
+            filename, fileobj, *rest = value
+            if rest:
+                content_type = rest[0]
+        else:
+            fileobj = value
+            filename = os.path.basename(getattr(value, "name", name))
+        if hasattr(fileobj, "seek"):
+            fileobj.seek(0)
+        form.add_field(name, fileobj, filename=filename, content_type=content_type)
+    return form
+
+
+def _client_timeout(timeout) -> Optional[aiohttp.ClientTimeout]:
+    if isinstance(timeout, (int, float)):
+        # like in requests, a number limits connecting and each read, not the whole transfer
+        return aiohttp.ClientTimeout(
+            total=None, sock_connect=timeout, sock_read=timeout
+        )
+    return timeout
+
+
+def _retry_after(response: aiohttp.ClientResponse) -> Optional[float]:
+    try:
+        return float(response.headers["Retry-After"])
+    except (KeyError, ValueError):
+        return None
+
+
+async def request(
+    method: str,
+    url: str,
+    *,
+    retries: int = None,
+    backoff: float = 0.5,
+    timeout=None,
+    files: dict = None,
+    verify: bool = True,
+    **kwargs,
+) -> Response:
+    """
+    Send HTTP request through the shared session and read the whole body
+
+    :param retries: attempts after the first one on connection errors,
+        timeouts and 429/5xx answers (by default 2 for GET/HEAD, 0 otherwise)
+    :param backoff: delay before the first retry, doubled on each next one
+    :param timeout: seconds or `aiohttp.ClientTimeout`
+    :param files: multipart files in `requests` format
+    """
+    method = method.upper()
+    if retries is None:
+        retries = 2 if method in IDEMPOTENT_METHODS else 0
+    timeout = _client_timeout(timeout)
+    if timeout is not None:
+        kwargs["timeout"] = timeout
+    if not verify:
+        kwargs["ssl"] = False
+    data = kwargs.pop("data", None)
+
+    for attempt in range(retries + 1):
+        body = _form_data(data, files) if files else data
+        start = time.perf_counter()
+        try:
+            async with get_session().request(
+                method, url, data=body, **kwargs
+            ) as response:
+                if response.status not in RETRY_STATUSES or attempt == retries:
+                    content = await response.read()
+                    metrics.observe("http_request", time.perf_counter() - start)
+                    return Response(response, content)
+                delay = _retry_after(response) or backoff * 2**attempt
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+            if attempt == retries:
+                raise
+            delay = backoff * 2**attempt
+        await asyncio.sleep(delay)
+
+
+async def get(url: str, **kwargs) -> Response:
+    return await request("GET", url, **kwargs)
+
+
+async def post(url: str, **kwargs) -> Response:
+    return await request("POST", url, **kwargs)
+
+
+async def head(url: str, **kwargs) -> Response:
+    return await request("HEAD", url, **kwargs)
+
+
+async def download(
+    url: str,
+    path: str,
+    *,
+    chunk_size: int = 64 * 1024,
+    progress: Callable[[int, Optional[int]], Awaitable] = None,
+    timeout=None,
+    **kwargs,
+) -> str:
+    """
+    Stream response body to a file without keeping it in memory
+
+    :param progress: coroutine function called with (downloaded, total) bytes
+    :return: path to the downloaded file
+    """
+    timeout = _client_timeout(timeout)
+    if timeout is not None:
+        kwargs["timeout"] = timeout
+    async with get_session().get(url, **kwargs) as response:
+        response.raise_for_status()
+        total = response.content_length
+        current = 0
+        async with aiofiles.open(path, "wb") as f:
+            async for chunk in response.content.iter_chunked(chunk_size):
+                await f.write(chunk)
+                current += len(chunk)
+                if progress is not None:
+                    await progress(current, total)
+    return path
+
+
+async def close():
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
@@ -0,0 +1,151 @@
+#  Moon-Userbot - telegram userbot
+#  Copyright (C) 2020-present Moon Userbot Organization
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# Image transforms. The *_async variants run them in the worker pool, which
+# imports this module, so it must not import pyrogram, config or database.
+
+import asyncio
+import os
+from io import BytesIO
+from typing import BinaryIO, Union
+
+from PIL import Image
+
+from utils import workers
+
+__all__ = [
+    "resize_image",
+    "resize_new_image",
+    "resize_image_async",
+    "resize_new_image_async",
+    "convert_image_async",
+]
+
+ImageInput = Union[str, bytes, BinaryIO]
+
+
+def resize_image(
+    input_img, output=None, img_type="PNG", size: int = 512, size2: int = None
+):
+    if output is None:
+        output = BytesIO()
+        output.name = f"sticker.{img_type.lower()}"
+
+    with Image.open(input_img) as img:
+        # We used to use thumbnail(size) here, but it returns with a *max* dimension of 512,512
+        # rather than making one side exactly 512, so we have to calculate dimensions manually :(
+        if size2 is not None:
+            size = (size, size2)
+        elif img.width == img.height:
+            size = (size, size)
+        elif img.width < img.height:
+            size = (max(size * img.width // img.height, 1), size)
+        else:
+            size = (size, max(size * img.height // img.width, 1))
+
+        img.resize(size).save(output, img_type)
+
+    return output
+
+
+def resize_new_image(image_path, output_path, desired_width=None, desired_height=None):
+    """
+    Resize an image to the desired dimensions while maintaining the aspect ratio.
+
+    Args:
+        image_path (str): Path to the input image file.
+        output_path (str): Path to save the resized image.
+        desired_width (int, optional): Desired width in pixels. If not provided, the aspect ratio will be maintained.
+        desired_height (int, optional): Desired height in pixels. If not provided, the aspect ratio will be maintained.
+    """
+    image = Image.open(image_path)
+
+    width, height = image.size
+
+    aspect_ratio = width / height
+
+    if desired_width and desired_height:
+        new_width, new_height = desired_width, desired_height
+    elif desired_height:
+        new_width, new_height = int(desired_height * aspect_ratio), desired_height
+    else:
+        new_width, new_height = 150, 150
+
+    resized_image = image.resize((new_width, new_height), Image.Resampling.LANCZOS)
+
+    resized_image.save(output_path)
+    if os.path.exists(image_path):
+        os.remove(image_path)
+
+
+def _resize_bytes(data: bytes, img_type: str, size: int, size2: int) -> bytes:
+    return resize_image(
+        BytesIO(data), img_type=img_type, size=size, size2=size2
+    ).getvalue()
+
+
+def _convert_bytes(data: bytes, img_type: str) -> bytes:
+    output = BytesIO()
+    with Image.open(BytesIO(data)) as img:
+        img.save(output, img_type)
+    return output.getvalue()
+
+
+async def _read(input_img: ImageInput) -> bytes:
+    if isinstance(input_img, (bytes, bytearray)):
+        return bytes(input_img)
+    if isinstance(input_img, str):
+        return await asyncio.to_thread(_read_file, input_img)
+    input_img.seek(0)
+    data = input_img.read()
+    input_img.seek(0)
+    return data
+
+
+def _read_file(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+async def resize_image_async(
+    input_img: ImageInput, img_type="PNG", size: int = 512, size2: int = None
+) -> BytesIO:
+    """resize_image() in a worker process"""
+    output = BytesIO(
+        await workers.run(_resize_bytes, await _read(input_img), img_type, size, size2)
+    )
+    output.name = f"sticker.{img_type.lower()}"
+    return output
+
+
+async def resize_new_image_async(
+    image_path, output_path, desired_width=None, desired_height=None
+):
+    """resize_new_image() in a worker process"""
+    await workers.run(
+        resize_new_image, image_path, output_path, desired_width, desired_height
+    )
+
+
+async def convert_image_async(
+    input_img: ImageInput, img_type="PNG", name: str = None
+) -> BytesIO:
+    """Convert image to another format in a worker process"""
+    output = BytesIO(
+        await workers.run(_convert_bytes, await _read(input_img), img_type)
+    )
+    output.name = name or f"image.{img_type.lower()}"
+    return output
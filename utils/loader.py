@@ -0,0 +1,297 @@
+#  Moon-Userbot - telegram userbot
+#  Copyright (C) 2020-present Moon Userbot Organization
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import asyncio
+import logging
+import os
+import re
+import time
+from pathlib import Path
+from types import ModuleType
+from typing import Dict, Optional, Tuple
+
+from pyrogram import Client, ContinuePropagation, filters
+from pyrogram.filters import AndFilter, OrFilter
+from pyrogram.handlers import MessageHandler
+from pyrogram.types import Message
+
+from utils import boot, config
+from utils.db import db
+from utils.misc import modules_help, prefix, requirements_list
+from utils.scripts import (
+    import_module,
+    load_module,
+    module_handlers,
+    parse_meta_comments,
+    register_module,
+)
+
+__all__ = ["deferred_modules", "import_times", "load_modules", "preload_modules"]
+
+# one entry per module file, keyed by its path:
+# {"mtime", "size", "prefix", "meta", "help", "stubs"}
+# where "stubs" is None for modules that must be imported at startup
+MANIFEST = "core.modules"
+
+HELP_KEY = re.compile(r"""modules_help\[\s*["'](\w+)["']\s*\]\s*=""")
+
+# how many modules are imported at the same time on startup
+IMPORT_CONCURRENCY = 4
+
+# seconds spent importing each module, by module path
+import_times: Dict[str, float] = {}
+
+
+def _module_path(path: Path) -> str:
+    return ".".join(path.with_suffix("").parts)
+
+
+def _is_core(path: Path) -> bool:
+    return "custom_modules" not in path.parent.parts
+
+
+def _command_filters(flt) -> Optional[list]:
+    """Command filters one of which must pass for flt to pass, None if flt doesn't need a command"""
+    if hasattr(flt, "commands") and hasattr(flt, "prefixes"):
+        return [flt]
+    if isinstance(flt, AndFilter):
+        base = _command_filters(flt.base)
+        return base if base is not None else _command_filters(flt.other)
+    if isinstance(flt, OrFilter):
+        base = _command_filters(flt.base)
+        other = _command_filters(flt.other)
+        if base is None or other is None:
+            return None
+        return base + other
+    return None
+
+
+def _stubs(module: ModuleType) -> Optional[list]:
+    """Commands that can wake up module, None if it has to stay loaded"""
+    stubs = []
+    for handler, group in module_handlers(module):
+        if type(handler) is not MessageHandler:
+            return None
+        command_filters = _command_filters(handler.filters)
+        if command_filters is None:
+            return None
+        stubs.extend(
+            {
+                "group": group,
+                "commands": sorted(flt.commands),
+                "prefixes": sorted(flt.prefixes),
+                "case_sensitive": flt.case_sensitive,
+            }
+            for flt in command_filters
+        )
+    return stubs or None
+
+
+def _manifest_entry(path: Path, stat: os.stat_result, code: str, module) -> dict:
+    help_keys = set(HELP_KEY.findall(code))
+    return {
+        "mtime": stat.st_mtime_ns,
+        "size": stat.st_size,
+        "prefix": prefix,
+        "meta": module.__meta__,
+        "help": {key: modules_help[key] for key in help_keys if key in modules_help},
+        "stubs": _stubs(module),
+    }
+
+
+class LazyModule:
+    """Module registered by command stubs and imported on first use"""
+
+    def __init__(self, path: Path, entry: dict):
+        self.path = path
+        self.name = path.stem
+        self.core = _is_core(path)
+        self.meta = entry["meta"]
+        self.module: Optional[ModuleType] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stubs = []
+
+        for stub in entry["stubs"]:
+            command = filters.command(
+                stub["commands"],
+                prefixes=stub["prefixes"],
+                case_sensitive=stub["case_sensitive"],
+            )
+            handler = MessageHandler(self._wake_up(stub["group"]), command)
+            self._stubs.append((handler, stub["group"]))
+
+    def register(self, client: Client):
+        for handler, group in self._stubs:
+            client.add_handler(handler, group)
+
+    async def load(self, client: Client) -> ModuleType:
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._load(client))
+        return await asyncio.shield(self._task)
+
+    async def _load(self, client: Client) -> ModuleType:
+        start = time.perf_counter()
+        try:
+            module = await load_module(
+                self.name, client, core=self.core, meta=self.meta
+            )
+        except Exception:
+            logging.warning("Can't import module %s", self.name, exc_info=True)
+            db.remove(MANIFEST, str(self.path))
+            raise
+        finally:
+            # stubs are removed after real handlers are added, so no message slips between
+            for handler, group in self._stubs:
+                client.remove_handler(handler, group)
+        import_times[_module_path(self.path)] = time.perf_counter() - start
+        deferred_modules.pop(_module_path(self.path), None)
+        self.module = module
+        return module
+
+    def _registered(self, client: Client) -> bool:
+        groups = client.dispatcher.groups
+        return all(
+            handler in groups.get(group, [])
+            for handler, group in module_handlers(self.module)
+        )
+
+    def _wake_up(self, group: int):
+        async def callback(client: Client, message: Message):
+            if self.module is not None and self._registered(client):
+                # real handlers follow in this group
+                raise ContinuePropagation
+
+            try:
+                module = await self.load(client)
+            except Exception:
+                raise ContinuePropagation
+
+            # real handlers are added only after current updates are dispatched,
+            # so hand this message over to them here
+            for handler, handler_group in module_handlers(module):
+                if handler_group != group or type(handler) is not MessageHandler:
+                    continue
+                if not await handler.check(client, message):
+                    continue
+                try:
+                    await handler.callback(client, message)
+                except ContinuePropagation:
+                    continue
+                return
+            raise ContinuePropagation
+
+        return callback
+
+
+# lazy modules that weren't imported yet, by module path
+deferred_modules: Dict[str, LazyModule] = {}
+
+
+async def load_modules(client: Client) -> Tuple[int, int]:
+    """
+    Load all modules from modules/ directory
+
+    Modules whose handlers only react to commands are registered by stubs
+    from the manifest, everything else is imported in worker threads.
+
+    :return: numbers of loaded and failed modules
+    """
+    manifest = db.get_collection(MANIFEST)
+    paths = sorted(Path("modules").rglob("*.py"))
+    semaphore = asyncio.Semaphore(IMPORT_CONCURRENCY)
+    failed = 0
+    pending = {}
+
+    for path in paths:
+        stat = path.stat()
+        entry = manifest.get(str(path))
+        if (
+            config.lazy_modules
+            and entry
+            and entry["stubs"]
+            and entry["mtime"] == stat.st_mtime_ns
+            and entry["size"] == stat.st_size
+            and entry["prefix"] == prefix
+        ):
+            lazy = LazyModule(path, entry)
+            lazy.register(client)
+            deferred_modules[_module_path(path)] = lazy
+            modules_help.update(entry["help"])
+            requirements_list.extend(entry["meta"].get("requires", "").split())
+        else:
+            pending[path] = (stat, path.read_text(encoding="utf-8"))
+
+    async def _import(path: Path, code: str):
+        name = _module_path(path)
+        meta = parse_meta_comments(code)
+        packages = meta.get("requires", "").split()
+        requirements_list.extend(packages)
+        async with semaphore:
+            start = time.perf_counter()
+            module = await import_module(name, packages, core=_is_core(path))
+            import_times[name] = time.perf_counter() - start
+            boot.mark(f"import {name}", start, import_times[name])
+        return module, meta
+
+    results = await asyncio.gather(
+        *(_import(path, code) for path, (_, code) in pending.items()),
+        return_exceptions=True,
+    )
+
+    # handlers are added in a stable order no matter which import finished first
+    for (path, (stat, code)), result in zip(pending.items(), results):
+        if isinstance(result, BaseException):
+            logging.warning("Can't import module %s", path.stem, exc_info=result)
+            failed += 1
+            continue
+
+        module, meta = result
+        register_module(module, client, meta)
+        entry = _manifest_entry(path, stat, code, module)
+        if manifest.get(str(path)) != entry:
+            db.set(MANIFEST, str(path), entry)
+
+    for key in manifest.keys() - {str(path) for path in paths}:
+        db.remove(MANIFEST, key)
+
+    slowest = sorted(import_times.items(), key=lambda item: item[1], reverse=True)
+    for path, seconds in slowest:
+        logging.debug("Imported %s in %.3fs", path, seconds)
+    if slowest:
+        logging.info(
+            "Slowest imports: %s",
+            ", ".join(f"{path} {seconds:.2f}s" for path, seconds in slowest[:5]),
+        )
+    if deferred_modules:
+        logging.info("Deferred import of %s modules", len(deferred_modules))
+
+    return len(paths) - failed, failed
+
+
+async def preload_modules(client: Client):
+    """Import deferred modules one by one while the bot is already running"""
+    for lazy in list(deferred_modules.values()):
+        try:
+            await lazy.load(client)
+        except Exception:
+            # already logged, the module stays unavailable until restart
+            pass
+
+    if import_times:
+        logging.info(
+            "All modules imported, %.2fs spent on imports",
+            sum(import_times.values()),
+        )
@@ -0,0 +1,216 @@
+#  Moon-Userbot - telegram userbot
+#  Copyright (C) 2020-present Moon Userbot Organization
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# Media pipeline: download into memory, process, upload from the same buffer.
+# Only files above MEMORY_LIMIT spill to a scratch file, on tmpfs when it fits.
+
+import asyncio
+import mimetypes
+import mmap
+import os
+import tempfile
+from contextlib import asynccontextmanager
+from io import BytesIO
+from typing import Awaitable, Callable, Optional, Union
+
+from pyrogram.types import Message
+
+from utils.mediacache import media_cache
+
+__all__ = [
+    "MEMORY_LIMIT",
+    "MediaBuffer",
+    "media_of",
+    "download",
+    "cached",
+    "scratch_path",
+]
+
+MEMORY_LIMIT = 32 * 1024 * 1024
+# larger files are always downloaded again
+CACHE_LIMIT = 8 * 1024 * 1024
+# larger files spill to the regular temp dir, tmpfs is backed by RAM too
+TMPFS_LIMIT = 256 * 1024 * 1024
+TMPFS_DIR = "/dev/shm" if os.access("/dev/shm", os.W_OK) else None
+
+# when mime type doesn't tell the extension
+EXTENSIONS = {
+    "photo": ".jpg",
+    "voice": ".ogg",
+    "video_note": ".mp4",
+    "video": ".mp4",
+    "animation": ".mp4",
+}
+
+
+def scratch_dir(size: Optional[int] = None) -> str:
+    if TMPFS_DIR and size is not None and size <= TMPFS_LIMIT:
+        return TMPFS_DIR
+    return tempfile.gettempdir()
+
+
+class MediaBuffer(tempfile.SpooledTemporaryFile):
+    """
+    File-like buffer of a media file, in memory until it outgrows max_size
+
+    Can be passed to Pillow and to pyrogram uploads as is, its name tells
+    pyrogram the file name and mime type.
+    """
+
+    def __init__(
+        self, name: str = "file", max_size: int = MEMORY_LIMIT, size: int = None
+    ):
+        super().__init__(max_size=max_size, dir=scratch_dir(size))
+        self._name = name
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    @name.setter
+    def name(self, value: str):
+        self._name = value
+
+    @property
+    def in_memory(self) -> bool:
+        return not self._rolled
+
+    def view(self) -> memoryview:
+        """Contents without copying them, valid until the buffer is written to"""
+        if not self._rolled:
+            return self._file.getbuffer()
+        self._file.flush()
+        if not os.fstat(self.fileno()).st_size:
+            return memoryview(b"")
+        return memoryview(mmap.mmap(self.fileno(), 0, access=mmap.ACCESS_READ))
+
+
+def media_of(message: Message):
+    """Media object of message, like Photo or Document, None if there is none"""
+    if message is None or not message.media:
+        return None
+    return getattr(message, message.media.value, None)
+
+
+def _file_name(message: Message, media) -> str:
+    name = getattr(media, "file_name", None)
+    if name:
+        return name
+    kind = message.media.value
+    if kind == "sticker":
+        extension = (
+            ".tgs" if media.is_animated else ".webm" if media.is_video else ".webp"
+        )
+    else:
+        mime_type = getattr(media, "mime_type", None)
+        extension = (
+            mime_type and mimetypes.guess_extension(mime_type)
+        ) or EXTENSIONS.get(kind, "")
+    return f"{kind}{extension}"
+
+
+async def download(
+    message: Union[Message, str],
+    *,
+    client=None,
+    name: str = None,
+    unique_id: str = None,
+    progress: Callable[[int, int], Awaitable] = None,
+    max_size: int = MEMORY_LIMIT,
+) -> MediaBuffer:
+    """
+    Download media of message, or a file_id with client, into a MediaBuffer
+
+    Files up to CACHE_LIMIT come from the media cache when they were seen
+    before.
+
+    :param unique_id: file_unique_id of file_id, to cache it
+    :param progress: coroutine function called with (downloaded, total) bytes
+    :raises ValueError: if message has no downloadable media
+    """
+    if isinstance(message, str):
+        total = 0
+        name = name or "file"
+    else:
+        media = media_of(message)
+        if media is None or not hasattr(media, "file_id"):
+            raise ValueError("This message doesn't contain any downloadable media")
+        client = client or message._client
+        total = getattr(media, "file_size", 0) or 0
+        name = name or _file_name(message, media)
+        unique_id = unique_id or media.file_unique_id
+
+    async def stream(buffer):
+        current = 0
+        async for chunk in client.stream_media(message):
+            buffer.write(chunk)
+            current += len(chunk)
+            if progress is not None:
+                await progress(current, total or current)
+
+    async def stream_bytes() -> bytes:
+        buffer = BytesIO()
+        await stream(buffer)
+        return buffer.getvalue()
+
+    buffer = MediaBuffer(name, max_size=max_size, size=total)
+    try:
+        if unique_id and total <= CACHE_LIMIT:
+            buffer.write(await media_cache.get_or_create(unique_id, "", stream_bytes))
+        else:
+            await stream(buffer)
+        buffer.seek(0)
+    except BaseException:
+        buffer.close()
+        raise
+    return buffer
+
+
+async def cached(
+    message: Message, variant: str, create: Callable[[], Awaitable[bytes]]
+) -> bytes:
+    """
+    What create() derives from media of message, cached per file
+
+    :param variant: name of the derived artifact, like "png512"
+    """
+    unique_id = getattr(media_of(message), "file_unique_id", None)
+    if unique_id is None:
+        return await create()
+    return await media_cache.get_or_create(unique_id, variant, create)
+
+
+@asynccontextmanager
+async def scratch_path(buffer: MediaBuffer = None, suffix: str = ""):
+    """
+    Path of a scratch file for tools that only work with files, removed on exit
+
+    :param buffer: contents to write to the file first
+    """
+    size = buffer.seek(0, os.SEEK_END) if buffer is not None else None
+    fd, path = tempfile.mkstemp(suffix=suffix, prefix="moon-", dir=scratch_dir(size))
+    try:
+        with os.fdopen(fd, "wb") as f:
+            if buffer is not None:
+                buffer.seek(0)
+                with buffer.view() as view:
+                    await asyncio.to_thread(f.write, view)
+        yield path
+    finally:
+        if buffer is not None:
+            buffer.seek(0)
+        if os.path.exists(path):
+            os.remove(path)
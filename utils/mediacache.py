@@ -0,0 +1,268 @@
+#  Moon-Userbot - telegram userbot
+#  Copyright (C) 2020-present Moon Userbot Organization
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# Cache of Telegram media keyed by file_unique_id, which stays the same for
+# a file no matter who sees it and how, unlike file_id. Besides the original
+# file, entries can hold what was derived from it, like a resized sticker or
+# recognized text, under a "variant" name.
+
+import asyncio
+import logging
+import os
+import re
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from utils import config, metrics
+
+__all__ = ["MediaCache", "media_cache"]
+
+CACHE_DIR = os.path.join("cache", "media")
+MEMORY_BUDGET = 32 * 1024 * 1024
+# larger entries are kept on disk only
+MEMORY_ENTRY_LIMIT = 4 * 1024 * 1024
+TTL = 7 * 24 * 60 * 60
+
+Key = Tuple[str, str]
+
+
+class MediaCache:
+    """
+    Two-level LRU cache: recent entries in memory, the rest on disk
+
+    Both levels are limited by total size in bytes and entries expire after
+    their TTL. On disk, a file's mtime is its expiry time and atime is the
+    last access, both set explicitly, so noatime mounts don't matter.
+    """
+
+    def __init__(
+        self,
+        directory: str = CACHE_DIR,
+        memory_budget: int = MEMORY_BUDGET,
+        disk_budget: int = 0,
+        ttl: int = TTL,
+    ):
+        self.directory = directory
+        self.memory_budget = memory_budget
+        self.disk_budget = disk_budget
+        self.ttl = ttl
+        # key -> (data, expires)
+        self._memory: "OrderedDict[Key, Tuple[bytes, float]]" = OrderedDict()
+        self.memory_size = 0
+        self.disk_size: Optional[int] = None
+        self._loading: Dict[Key, asyncio.Future] = {}
+        self._pruning: Optional[asyncio.Task] = None
+
+    def _path(self, key: Key) -> str:
+        unique_id, variant = key
+        variant = re.sub(r"[^\w.-]", "_", variant) or "raw"
+        return os.path.join(self.directory, f"{unique_id}.{variant}")
+
+    # memory level
+
+    def _remember(self, key: Key, data: bytes, expires: float):
+        if len(data) > MEMORY_ENTRY_LIMIT or not self.memory_budget:
+            return
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self.memory_size -= len(old[0])
+        self._memory[key] = (data, expires)
+        self.memory_size += len(data)
+        while self.memory_size > self.memory_budget:
+            _, (evicted, _) = self._memory.popitem(last=False)
+            self.memory_size -= len(evicted)
+        metrics.gauges["media_cache_memory_bytes"] = self.memory_size
+
+    def _recall(self, key: Key) -> Optional[bytes]:
+        entry = self._memory.get(key)
+        if entry is None:
+            return None
+        data, expires = entry
+        if expires < time.time():
+            del self._memory[key]
+            self.memory_size -= len(data)
+            return None
+        self._memory.move_to_end(key)
+        return data
+
+    # disk level
+
+    def _read(self, path: str) -> Optional[Tuple[bytes, float]]:
+        try:
+            expires = os.stat(path).st_mtime
+            if expires < time.time():
+                os.remove(path)
+                return None
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path, (time.time(), expires))
+        except FileNotFoundError:
+            return None
+        return data, expires
+
+    def _write(self, path: str, data: bytes, expires: float):
+        os.makedirs(self.directory, exist_ok=True)
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.utime(tmp, (time.time(), expires))
+        os.replace(tmp, path)
+
+    def _scan(self) -> list:
+        """Cache files as [atime, size, path], least recently used first"""
+        files = []
+        now = time.time()
+        try:
+            entries = list(os.scandir(self.directory))
+        except FileNotFoundError:
+            return files
+        for entry in entries:
+            try:
+                stat = entry.stat()
+                if stat.st_mtime < now or entry.name.endswith(".tmp"):
+                    os.remove(entry.path)
+                    continue
+            except FileNotFoundError:
+                continue
+            files.append([stat.st_atime, stat.st_size, entry.path])
+        files.sort()
+        return files
+
+    def _prune(self) -> int:
+        """Remove expired and least recently used files over budget, return size"""
+        files = self._scan()
+        size = sum(item[1] for item in files)
+        # leave some room, so not every write prunes
+        target = self.disk_budget * 0.9
+        for _, file_size, path in files:
+            if size <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            size -= file_size
+        return size
+
+    async def _prune_disk(self):
+        try:
+            self.disk_size = await asyncio.to_thread(self._prune)
+            metrics.gauges["media_cache_disk_bytes"] = self.disk_size
+        except OSError:
+            logging.exception("Failed to prune media cache")
+
+    def _schedule_prune(self):
+        if self._pruning is None or self._pruning.done():
+            self._pruning = asyncio.ensure_future(self._prune_disk())
+
+    # public interface
+
+    async def get(self, unique_id: str, variant: str = "") -> Optional[bytes]:
+        key = (unique_id, variant)
+        data = self._recall(key)
+        if data is not None:
+            metrics.inc("media_cache_hits")
+            return data
+        if self.disk_budget:
+            entry = await asyncio.to_thread(self._read, self._path(key))
+            if entry is not None:
+                metrics.inc("media_cache_disk_hits")
+                self._remember(key, *entry)
+                return entry[0]
+        metrics.inc("media_cache_misses")
+        return None
+
+    async def put(
+        self, unique_id: str, data: bytes, variant: str = "", ttl: int = None
+    ):
+        key = (unique_id, variant)
+        expires = time.time() + (ttl or self.ttl)
+        data = bytes(data)
+        self._remember(key, data, expires)
+        if not self.disk_budget or len(data) > self.disk_budget // 4:
+            return
+        try:
+            await asyncio.to_thread(self._write, self._path(key), data, expires)
+        except OSError:
+            logging.exception("Failed to write media cache entry")
+            return
+        if self.disk_size is None:
+            self._schedule_prune()
+        else:
+            self.disk_size += len(data)
+            if self.disk_size > self.disk_budget:
+                self._schedule_prune()
+
+    async def get_or_create(
+        self,
+        unique_id: str,
+        variant: str,
+        create: Callable[[], Awaitable[bytes]],
+        ttl: int = None,
+    ) -> bytes:
+        """
+        Cached entry, or result of create() stored in the cache
+
+        Concurrent calls for the same entry wait for one create() call.
+        """
+        key = (unique_id, variant)
+        while (loading := self._loading.get(key)) is not None:
+            try:
+                return await asyncio.shield(loading)
+            except asyncio.CancelledError:
+                # the caller of create() was cancelled, not us, try ourselves
+                if not loading.cancelled():
+                    raise
+
+        # registered before the first await, so concurrent calls wait for it
+        future = asyncio.get_running_loop().create_future()
+        self._loading[key] = future
+        try:
+            data = await self.get(unique_id, variant)
+            if data is None:
+                data = await create()
+                await self.put(unique_id, data, variant, ttl)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # waiters get the exception, don't report it as never retrieved
+            future.exception()
+            raise
+        else:
+            future.set_result(data)
+        finally:
+            del self._loading[key]
+        return data
+
+    async def download(self, client, file_id: str, unique_id: str) -> bytes:
+        """Original file, downloaded with client only if it isn't cached"""
+
+        async def download():
+            content = await client.download_media(file_id, in_memory=True)
+            return bytes(content.getbuffer())
+
+        return await self.get_or_create(unique_id, "", download)
+
+    def clear(self):
+        self._memory.clear()
+        self.memory_size = 0
+        metrics.gauges["media_cache_memory_bytes"] = 0
+
+
+media_cache = MediaCache(disk_budget=config.media_cache_size * 1024 * 1024)
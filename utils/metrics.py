@@ -0,0 +1,369 @@
+#  Moon-Userbot - telegram userbot
+#  Copyright (C) 2020-present Moon Userbot Organization
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import asyncio
+import inspect
+import json
+import logging
+import os
+import tempfile
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from functools import wraps
+from hashlib import md5
+from typing import Dict, List, Tuple
+
+import psutil
+from pyrogram import Client, ContinuePropagation
+from pyrogram.handlers.handler import Handler
+
+__all__ = [
+    "Histogram",
+    "HandlerStats",
+    "handler_stats",
+    "counters",
+    "timings",
+    "gauges",
+    "inc",
+    "observe",
+    "reset",
+    "instrument",
+    "install",
+    "prometheus_text",
+    "read_snapshot",
+    "export_loop",
+]
+
+# upper bounds in seconds, the last bucket catches everything above
+BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+    float("inf"),
+)
+
+# Snapshot for the web app (app.py), which runs in another process. Kept in
+# shared memory when available, so publishing it never touches the disk.
+_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SNAPSHOT_PATH = os.path.join(
+    "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir(),
+    f"moon-userbot-{md5(_root.encode()).hexdigest()[:8]}.json",
+)
+EXPORT_INTERVAL = 5
+
+
+class Histogram:
+    """Fixed-bucket latency histogram, cheap enough for every update"""
+
+    __slots__ = ("counts", "count", "sum")
+
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(BUCKETS, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> float:
+        """Estimate quantile by linear interpolation inside its bucket"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, bucket_count in enumerate(self.counts):
+            if seen + bucket_count >= rank and bucket_count:
+                lower = BUCKETS[i - 1] if i else 0.0
+                upper = BUCKETS[i] if i < len(BUCKETS) - 1 else lower * 2
+                return lower + (upper - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+        return BUCKETS[-2]
+
+
+class HandlerStats:
+    __slots__ = (
+        "name",
+        "group",
+        "checks",
+        "calls",
+        "errors",
+        "continues",
+        "filter",
+        "wall",
+    )
+
+    def __init__(self, name: str, group: int):
+        self.name = name
+        self.group = group
+        self.reset()
+
+    def reset(self):
+        self.checks = 0
+        self.calls = 0
+        self.errors = 0
+        self.continues = 0
+        self.filter = Histogram()
+        self.wall = Histogram()
+
+
+# by "module.callback" name
+handler_stats: Dict[str, HandlerStats] = {}
+
+# free-form counters, e.g. cache hits, exported as moon_<name>_total
+counters: Dict[str, int] = defaultdict(int)
+
+# updates counter and time of the last updates_per_second sample, moved
+# along with counters by reset()
+_rate_base: Tuple[int, float] = (0, 0.0)
+
+# latencies of subsystems, e.g. "db_op", exported as moon_<name>_seconds
+timings: Dict[str, Histogram] = defaultdict(Histogram)
+
+# current values, exported as moon_<name>
+gauges: Dict[str, float] = {}
+
+
+def inc(name: str, value: int = 1):
+    counters[name] += value
+
+
+def observe(name: str, seconds: float):
+    timings[name].observe(seconds)
+
+
+def reset():
+    global _rate_base
+    for stats in handler_stats.values():
+        stats.reset()
+    counters.clear()
+    timings.clear()
+    _rate_base = (0, time.perf_counter())
+
+
+def instrument(handler: Handler, group: int, module_name: str) -> Handler:
+    """Wrap filter check and callback of handler to record their timings, in place"""
+    if getattr(handler, "stats", None) is not None:
+        return handler
+
+    name = f"{module_name}.{getattr(handler.callback, '__name__', 'handler')}"
+    stats = handler_stats.setdefault(name, HandlerStats(name, group))
+    check = handler.check
+    callback = handler.callback
+
+    async def timed_check(client, update):
+        start = time.perf_counter()
+        try:
+            return await check(client, update)
+        finally:
+            stats.checks += 1
+            stats.filter.observe(time.perf_counter() - start)
+
+    if inspect.iscoroutinefunction(callback):
+
+        @wraps(callback)
+        async def timed_callback(client, *args):
+            start = time.perf_counter()
+            try:
+                return await callback(client, *args)
+            except ContinuePropagation:
+                stats.continues += 1
+                raise
+            except Exception:
+                stats.errors += 1
+                raise
+            finally:
+                stats.calls += 1
+                stats.wall.observe(time.perf_counter() - start)
+
+    else:
+
+        @wraps(callback)
+        def timed_callback(client, *args):
+            start = time.perf_counter()
+            try:
+                return callback(client, *args)
+            except ContinuePropagation:
+                stats.continues += 1
+                raise
+            except Exception:
+                stats.errors += 1
+                raise
+            finally:
+                stats.calls += 1
+                stats.wall.observe(time.perf_counter() - start)
+
+    handler.check = timed_check
+    handler.callback = timed_callback
+    handler.stats = stats
+    return handler
+
+
+class TimedQueue(asyncio.Queue):
+    """Dispatcher queue that measures how long updates wait for a worker"""
+
+    def _put(self, item):
+        self._queue.append((time.perf_counter(), item))
+
+    def _get(self):
+        queued, item = self._queue.popleft()
+        if item is not None:
+            counters["updates"] += 1
+            timings["dispatcher_lag"].observe(time.perf_counter() - queued)
+        return item
+
+
+class _FloodWaitCounter(logging.Filter):
+    # pyrogram sleeps through short FloodWaits itself and only logs them
+    def filter(self, record: logging.LogRecord) -> bool:
+        if str(record.msg).startswith("[%s] Waiting for %s seconds"):
+            counters["floodwait_seconds"] += record.args[1]
+        return True
+
+
+def install(client: Client):
+    """Hook update queue and FloodWait accounting of client, call before start()"""
+    client.dispatcher.updates_queue = TimedQueue()
+    logging.getLogger("pyrogram.session.session").addFilter(_FloodWaitCounter())
+
+
+def _histogram_lines(metric: str, labels: str, histogram: Histogram) -> List[str]:
+    lines = []
+    cumulative = 0
+    for bucket, bucket_count in zip(BUCKETS, histogram.counts):
+        cumulative += bucket_count
+        le = "+Inf" if bucket == float("inf") else repr(bucket)
+        bucket_labels = f'{labels},le="{le}"' if labels else f'le="{le}"'
+        lines.append(f"{metric}_bucket{{{bucket_labels}}} {cumulative}")
+    suffix = f"{{{labels}}}" if labels else ""
+    lines.append(f"{metric}_sum{suffix} {histogram.sum}")
+    lines.append(f"{metric}_count{suffix} {histogram.count}")
+    return lines
+
+
+def prometheus_text() -> str:
+    """All metrics in Prometheus text exposition format"""
+    lines = [
+        "# HELP moon_handler_filter_seconds Time spent evaluating handler filters",
+        "# TYPE moon_handler_filter_seconds histogram",
+    ]
+    for stats in handler_stats.values():
+        labels = f'handler="{stats.name}",group="{stats.group}"'
+        lines += _histogram_lines("moon_handler_filter_seconds", labels, stats.filter)
+
+    lines += [
+        "# HELP moon_handler_seconds Handler callback wall time",
+        "# TYPE moon_handler_seconds histogram",
+    ]
+    for stats in handler_stats.values():
+        labels = f'handler="{stats.name}",group="{stats.group}"'
+        lines += _histogram_lines("moon_handler_seconds", labels, stats.wall)
+
+    for metric, attr, help_text in (
+        ("moon_handler_errors_total", "errors", "Exceptions raised by handler"),
+        (
+            "moon_handler_continue_total",
+            "continues",
+            "Updates passed on with ContinuePropagation",
+        ),
+    ):
+        lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} counter"]
+        for stats in handler_stats.values():
+            labels = f'handler="{stats.name}",group="{stats.group}"'
+            lines.append(f"{metric}{{{labels}}} {getattr(stats, attr)}")
+
+    for name, histogram in sorted(timings.items()):
+        metric = f"moon_{name}_seconds"
+        lines.append(f"# TYPE {metric} histogram")
+        lines += _histogram_lines(metric, "", histogram)
+
+    for name, value in sorted(counters.items()):
+        metric = f"moon_{name}_total"
+        lines += [f"# TYPE {metric} counter", f"{metric} {value}"]
+
+    for name, value in sorted(gauges.items()):
+        metric = f"moon_{name}"
+        lines += [f"# TYPE {metric} gauge", f"{metric} {value}"]
+
+    return "\n".join(lines) + "\n"
+
+
+def _write_snapshot(snapshot: dict):
+    tmp = f"{SNAPSHOT_PATH}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(snapshot, f)
+    os.replace(tmp, SNAPSHOT_PATH)
+
+
+def read_snapshot() -> dict:
+    """Last snapshot published by the bot, None if there is none"""
+    try:
+        with open(SNAPSHOT_PATH, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+async def export_loop(client: Client):
+    """Periodically publish health and metrics for the web app"""
+    global _rate_base
+    process = psutil.Process()
+    _rate_base = (counters["updates"], time.perf_counter())
+    while True:
+        await asyncio.sleep(EXPORT_INTERVAL)
+
+        now = time.perf_counter()
+        last_updates, last_time = _rate_base
+        gauges["updates_per_second"] = round(
+            (counters["updates"] - last_updates) / (now - last_time), 3
+        )
+        _rate_base = (counters["updates"], now)
+
+        session = client.session
+        gauges["connected"] = int(
+            bool(client.is_connected)
+            and session is not None
+            and session.is_started.is_set()
+        )
+        gauges["dispatcher_queue_size"] = client.dispatcher.updates_queue.qsize()
+        gauges["rss_bytes"] = process.memory_info().rss
+        gauges.setdefault("ready", 0)
+
+        # rendered on the loop, handlers may be added while it runs
+        snapshot = {
+            "time": time.time(),
+            "connected": bool(gauges["connected"]),
+            "ready": bool(gauges["ready"]),
+            "queue_size": gauges["dispatcher_queue_size"],
+            "queue_lag_p95": timings["dispatcher_lag"].quantile(0.95),
+            "metrics": prometheus_text(),
+        }
+        await asyncio.to_thread(_write_snapshot, snapshot)
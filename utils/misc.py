@@ -24,6 +24,7 @@ __all__ = [
     "python_version",
     "prefix",
     "gitrepo",
+    "commit_sha",
     "userbot_version",
 ]
 
@@ -48,8 +49,17 @@ except git.exc.InvalidGitRepositoryError:
     repo.heads.main.checkout(True)
     gitrepo = git.Repo(".")
 
-if len(gitrepo.tags) > 0:
-    commits_since_tag = list(gitrepo.iter_commits(f"{gitrepo.tags[-1].name}..HEAD"))
+# read from .git files directly, gitrepo.head.commit would spawn git
+commit_sha = git.SymbolicReference.dereference_recursive(gitrepo, "HEAD")
+
+# walking history is slow, so version is recalculated only when HEAD moves
+version_cache = db.get("core.main", "version")
+if version_cache and version_cache["commit"] == commit_sha:
+    userbot_version = version_cache["version"]
 else:
-    commits_since_tag = []
-userbot_version = f"2.0.{len(commits_since_tag)}"
+    if len(gitrepo.tags) > 0:
+        commits_since_tag = list(gitrepo.iter_commits(f"{gitrepo.tags[-1].name}..HEAD"))
+    else:
+        commits_since_tag = []
+    userbot_version = f"2.0.{len(commits_since_tag)}"
+    db.set("core.main", "version", {"commit": commit_sha, "version": userbot_version})
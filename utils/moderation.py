@@ -0,0 +1,381 @@
+#  Moon-Userbot - telegram userbot
+#  Copyright (C) 2020-present Moon Userbot Organization
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# Bulk moderation: kick or ban every chat member matching a selector.
+# Members are listed by one task and handled by a few workers behind the
+# rate limiter. Removing members shifts the listing, so members are listed
+# again until nothing matches. Progress is saved to the database, so a job
+# interrupted by a restart can be resumed: members that were already removed
+# aren't listed again, members that failed are remembered and skipped.
+
+import asyncio
+import logging
+import re
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from pyrogram import Client, enums
+from pyrogram.errors import ChatAdminRequired, FloodWait
+from pyrogram.types import ChatMember, Message
+
+from utils.db import adb
+from utils.misc import prefix
+from utils.ratelimit import limiter
+
+__all__ = [
+    "ACTIONS",
+    "SELECTORS",
+    "BulkJob",
+    "load_job",
+    "running_jobs",
+    "run_with_status",
+]
+
+DB_MODULE = "core.moderation"
+# members handled at once, the limiter decides how fast
+CONCURRENCY = 4
+PROGRESS_INTERVAL = 5
+CHECKPOINT_INTERVAL = 10
+# failed members remembered for resuming, more are just counted
+MAX_SKIPPED = 10000
+
+ACTIONS = {
+    "kick": "Kicking",
+    "ban": "Banning",
+}
+
+# errors after which no other member can be handled either, FloodWait is
+# only raised by the limiter when it's too long to wait out
+FATAL_ERRORS = (ChatAdminRequired, FloodWait)
+
+
+def _deleted(_) -> Callable[[ChatMember], bool]:
+    return lambda member: member.user.is_deleted
+
+
+def _no_avatar(_) -> Callable[[ChatMember], bool]:
+    # users who hide their photo from us look the same
+    return lambda member: not member.user.is_deleted and member.user.photo is None
+
+
+def _joined(args: List[str]) -> Callable[[ChatMember], bool]:
+    """Joined since args[0], and before args[1] if given, dates as YYYY-MM-DD"""
+    if not args:
+        raise ValueError("Join date is required")
+    since = datetime.strptime(args[0], "%Y-%m-%d")
+    until = datetime.strptime(args[1], "%Y-%m-%d") if len(args) > 1 else None
+    return lambda member: (
+        member.joined_date is not None
+        and member.joined_date >= since
+        and (until is None or member.joined_date < until)
+    )
+
+
+def _name(args: List[str]) -> Callable[[ChatMember], bool]:
+    if not args:
+        raise ValueError("Name pattern is required")
+    pattern = re.compile(" ".join(args), re.IGNORECASE)
+    return lambda member: bool(
+        pattern.search(
+            " ".join(filter(None, [member.user.first_name, member.user.last_name]))
+        )
+    )
+
+
+# name -> factory of a member predicate from command arguments
+SELECTORS: Dict[str, Callable[[List[str]], Callable[[ChatMember], bool]]] = {
+    "deleted": _deleted,
+    "noavatar": _no_avatar,
+    "joined": _joined,
+    "name": _name,
+}
+
+# jobs in progress by chat id
+running_jobs: Dict[int, "BulkJob"] = {}
+
+
+class BulkJob:
+    """
+    Kick or ban chat members matching a selector
+
+    :param selector: key of SELECTORS
+    :param args: arguments of the selector
+    :param dry_run: only count matching members
+    """
+
+    def __init__(
+        self,
+        client: Client,
+        chat_id: int,
+        action: str,
+        selector: str,
+        args: List[str] = None,
+        dry_run: bool = False,
+    ):
+        if action not in ACTIONS:
+            raise ValueError(f"Unknown action: {action}")
+        if selector not in SELECTORS:
+            raise ValueError(f"Unknown selector: {selector}")
+        self.client = client
+        self.chat_id = chat_id
+        self.action = action
+        self.selector = selector
+        self.args = list(args or [])
+        self.dry_run = dry_run
+        self.matches = SELECTORS[selector](self.args)
+
+        self.scanned = 0
+        self.matched = 0
+        self.done = 0
+        self.errors: Counter = Counter()
+        self.skipped: set = set()
+        # members queued in this run, not listed again by later passes
+        self.queued: set = set()
+        self.elapsed = 0.0
+        self.resumed = False
+        self.cancelled = False
+        self.fatal: Optional[Exception] = None
+
+    @property
+    def failed(self) -> int:
+        return sum(self.errors.values())
+
+    # checkpoints
+
+    @property
+    def _key(self) -> str:
+        return f"job{self.chat_id}"
+
+    def state(self) -> dict:
+        return {
+            "action": self.action,
+            "selector": self.selector,
+            "args": self.args,
+            "scanned": self.scanned,
+            "matched": self.matched,
+            "done": self.done,
+            "errors": dict(self.errors),
+            "skipped": list(self.skipped),
+            "elapsed": self.elapsed,
+        }
+
+    async def checkpoint(self):
+        if not self.dry_run:
+            await adb.aset(DB_MODULE, self._key, self.state())
+
+    async def forget(self):
+        await adb.aremove(DB_MODULE, self._key)
+
+    # work
+
+    async def _handle(self, user_id: int):
+        await limiter.call(
+            self.chat_id, "admin", self.client.ban_chat_member, self.chat_id, user_id
+        )
+        if self.action == "kick":
+            await limiter.call(
+                self.chat_id,
+                "admin",
+                self.client.unban_chat_member,
+                self.chat_id,
+                user_id,
+            )
+
+    async def _worker(self, queue: asyncio.Queue):
+        while True:
+            user_id = await queue.get()
+            try:
+                if self.fatal is None:
+                    await self._handle(user_id)
+                    self.done += 1
+            except FATAL_ERRORS as e:
+                self.fatal = e
+            except Exception as e:
+                self.errors[type(e).__name__] += 1
+                if len(self.skipped) < MAX_SKIPPED:
+                    self.skipped.add(user_id)
+            finally:
+                queue.task_done()
+
+    def _eligible(self, member: ChatMember) -> bool:
+        return (
+            member.status
+            not in (enums.ChatMemberStatus.OWNER, enums.ChatMemberStatus.ADMINISTRATOR)
+            and not member.user.is_self
+            and member.user.id not in self.skipped
+        )
+
+    async def _pass(self, queue: asyncio.Queue, seen: set, clock) -> int:
+        """List all members once and queue the matching ones, return how many"""
+        queued = 0
+        async for member in self.client.get_chat_members(self.chat_id):
+            if self.cancelled or self.fatal is not None:
+                break
+            if member.user.id not in seen:
+                seen.add(member.user.id)
+                self.scanned += 1
+            if (
+                member.user.id in self.queued
+                or not self._eligible(member)
+                or not self.matches(member)
+            ):
+                continue
+            self.matched += 1
+            queued += 1
+            if not self.dry_run:
+                self.queued.add(member.user.id)
+                await queue.put(member.user.id)
+            await clock()
+        return queued
+
+    async def run(self, progress: Callable[["BulkJob"], Awaitable] = None):
+        """Go through all members, return when done, failed or cancelled"""
+        if running_jobs.setdefault(self.chat_id, self) is not self:
+            raise RuntimeError("Another bulk job is running in this chat")
+        queue = asyncio.Queue(CONCURRENCY * 2)
+        workers = [
+            asyncio.ensure_future(self._worker(queue)) for _ in range(CONCURRENCY)
+        ]
+        started = time.monotonic() - self.elapsed
+        last_progress = last_checkpoint = time.monotonic()
+
+        async def clock():
+            nonlocal last_progress, last_checkpoint
+            now = time.monotonic()
+            self.elapsed = now - started
+            if progress is not None and now - last_progress >= PROGRESS_INTERVAL:
+                last_progress = now
+                await progress(self)
+            if now - last_checkpoint >= CHECKPOINT_INTERVAL:
+                last_checkpoint = now
+                await self.checkpoint()
+
+        seen = set()
+        finished = False
+        try:
+            # members are listed by offset, so every removal shifts the later
+            # pages and some members are skipped; list again until none match
+            while True:
+                queued = await self._pass(queue, seen, clock)
+                await queue.join()
+                if self.cancelled or self.fatal is not None:
+                    break
+                if not queued or self.dry_run:
+                    finished = True
+                    break
+        except FATAL_ERRORS as e:
+            self.fatal = e
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            self.elapsed = time.monotonic() - started
+            if running_jobs.get(self.chat_id) is self:
+                del running_jobs[self.chat_id]
+            try:
+                if finished and not self.dry_run:
+                    await self.forget()
+                else:
+                    await self.checkpoint()
+            except Exception:
+                logging.exception("Failed to save bulk moderation checkpoint")
+
+    # reports
+
+    @property
+    def query(self) -> str:
+        return " ".join([self.selector, *self.args])
+
+    def describe(self) -> str:
+        return f"{ACTIONS[self.action]} members matching <code>{self.query}</code>"
+
+    def status(self) -> str:
+        text = (
+            f"<b>{self.describe()}{'...' if self.chat_id in running_jobs else ''}</b>\n"
+            f"Scanned: <code>{self.scanned}</code>, "
+            f"matched: <code>{self.matched}</code>"
+        )
+        if not self.dry_run:
+            text += (
+                f", done: <code>{self.done}</code>, failed: <code>{self.failed}</code>"
+            )
+        return text
+
+    def summary(self) -> str:
+        if self.dry_run:
+            return (
+                f"<b>Dry run:</b> <code>{self.matched}</code> of "
+                f"<code>{self.scanned}</code> members match "
+                f"<code>{self.query}</code>"
+            )
+        if self.fatal is not None:
+            title = f"Stopped: {type(self.fatal).__name__}"
+        elif self.cancelled:
+            title = "Cancelled"
+        else:
+            title = "Done"
+        text = (
+            f"<b>{title}.</b> {self.describe()}\n"
+            f"Scanned: <code>{self.scanned}</code>\n"
+            f"Matched: <code>{self.matched}</code>\n"
+            f"{'Kicked' if self.action == 'kick' else 'Banned'}: <code>{self.done}</code>\n"
+            f"Failed: <code>{self.failed}</code>\n"
+            f"Time: <code>{self.elapsed:.0f}s</code>"
+        )
+        if self.errors:
+            text += "\n" + "\n".join(
+                f"<code>  {name}: {count}</code>"
+                for name, count in self.errors.most_common(5)
+            )
+        if self.cancelled or self.fatal is not None:
+            text += f"\n<i>Resume with</i> <code>{prefix}bulk resume</code>"
+        return text
+
+
+async def load_job(client: Client, chat_id: int) -> Optional[BulkJob]:
+    """Saved job of chat to resume, None if there is none"""
+    state = await adb.aget(DB_MODULE, f"job{chat_id}")
+    if not state:
+        return None
+    job = BulkJob(client, chat_id, state["action"], state["selector"], state["args"])
+    job.done = state["done"]
+    job.errors = Counter(state["errors"])
+    # members matched but not handled yet will be matched again
+    job.matched = job.done + job.failed
+    job.skipped = set(state["skipped"])
+    job.elapsed = state["elapsed"]
+    job.resumed = True
+    return job
+
+
+async def run_with_status(job: BulkJob, message: Message):
+    """Run job, showing its progress and summary in message"""
+    # claimed before the first await, so two commands can't both start a job
+    if running_jobs.setdefault(job.chat_id, job) is not job:
+        raise RuntimeError("Another bulk job is running in this chat")
+    try:
+        await message.edit(job.status())
+
+        async def progress(job: BulkJob):
+            await limiter.edit(message, job.status(), wait=False)
+
+        await job.run(progress)
+    finally:
+        if running_jobs.get(job.chat_id) is job:
+            del running_jobs[job.chat_id]
+    await limiter.edit(message, job.summary())
@@ -0,0 +1,259 @@
+#  Moon-Userbot - telegram userbot
+#  Copyright (C) 2020-present Moon Userbot Organization
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import asyncio
+import contextvars
+import logging
+import time
+from typing import Awaitable, Callable, Dict, Tuple
+
+from pyrogram import Client
+from pyrogram.errors import FloodWait, MessageNotModified
+from pyrogram.types import Message
+
+from utils import metrics
+
+__all__ = ["TokenBucket", "Limiter", "limiter", "install"]
+
+# (requests per second, burst) for every kind of outbound request of a chat.
+# User accounts aren't bound by the documented bot limits, about one message
+# per second in a chat is safe anywhere; stricter chats are learned from
+# FloodWait
+CHAT_LIMITS = {
+    "message": (1.0, 3),
+    "delete": (2.0, 5),
+    "admin": (3.0, 10),
+}
+GLOBAL_LIMIT = (30.0, 30)
+
+# send and edit share one bucket, Telegram counts them together
+KINDS = {
+    "send": "message",
+    "edit": "message",
+    "delete": "delete",
+    "admin": "admin",
+}
+
+# longer FloodWaits are raised to the caller instead of waiting them out
+MAX_WAIT = 300
+MAX_BUCKETS = 1024
+
+# set while a call runs through the limiter, see install()
+_limited = contextvars.ContextVar("limited", default=False)
+
+
+class TokenBucket:
+    """
+    Token bucket that learns from FloodWait
+
+    The rate is halved on every FloodWait and slowly grows back to the
+    configured one with every successful request.
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        # waiters get tokens in arrival order
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self) -> float:
+        """Seconds until a token is available"""
+        now = time.monotonic()
+        self._refill(now)
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    async def acquire(self):
+        async with self._lock:
+            while (delay := self.delay()) > 0:
+                await asyncio.sleep(delay)
+            self.tokens -= 1
+
+    def penalize(self, seconds: float):
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+        self.tokens = 0.0
+        self.rate = max(self.rate / 2, self.max_rate / 16)
+
+    def reward(self):
+        if self.rate < self.max_rate:
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+
+    @property
+    def idle(self) -> bool:
+        self._refill(time.monotonic())
+        return (
+            self.tokens >= self.burst
+            and self.blocked_until < self.updated
+            and not self._lock.locked()
+        )
+
+
+class _PendingEdit:
+    __slots__ = ("text", "kwargs", "future")
+
+    def __init__(self, text: str, kwargs: dict, future: asyncio.Future):
+        self.text = text
+        self.kwargs = kwargs
+        self.future = future
+
+
+class Limiter:
+    """Outbound scheduler with per-chat and global token buckets"""
+
+    def __init__(self):
+        self._global = TokenBucket(*GLOBAL_LIMIT)
+        self._buckets: Dict[Tuple[int, str], TokenBucket] = {}
+        self._edits: Dict[Tuple[int, int], _PendingEdit] = {}
+
+    def bucket(self, chat_id, kind: str) -> TokenBucket:
+        key = (chat_id, KINDS[kind])
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            if len(self._buckets) >= MAX_BUCKETS:
+                self._buckets = {
+                    key: bucket
+                    for key, bucket in self._buckets.items()
+                    if not bucket.idle
+                }
+            bucket = self._buckets[key] = TokenBucket(*CHAT_LIMITS[KINDS[kind]])
+        return bucket
+
+    async def call(
+        self,
+        chat_id,
+        kind: str,
+        func: Callable[..., Awaitable],
+        *args,
+        retries: int = 3,
+        **kwargs,
+    ):
+        """
+        Run API call when both chat and global limits allow it
+
+        :param kind: one of "send", "edit", "delete", "admin"
+        :param retries: how many FloodWaits to wait out before giving up
+        """
+        bucket = self.bucket(chat_id, kind)
+        for attempt in range(retries + 1):
+            start = time.monotonic()
+            await bucket.acquire()
+            await self._global.acquire()
+            metrics.observe("ratelimit_wait", time.monotonic() - start)
+            token = _limited.set(True)
+            try:
+                result = await func(*args, **kwargs)
+            except FloodWait as e:
+                metrics.inc("floodwait_seconds", e.value)
+                bucket.penalize(e.value)
+                if attempt == retries or e.value > MAX_WAIT:
+                    raise
+                logging.info(
+                    "FloodWait of %ss in %s for %s, waiting", e.value, chat_id, kind
+                )
+            else:
+                bucket.reward()
+                return result
+            finally:
+                _limited.reset(token)
+
+    async def edit(self, message: Message, text: str, wait: bool = True, **kwargs):
+        """
+        Edit message text, coalescing edits of the same message
+
+        While an edit waits for its turn, newer edits of the same message only
+        replace its text, so only the latest text is actually sent.
+
+        :param wait: if False, return immediately and edit in the background
+        :return: edited message, None if text didn't change or wait is False
+        """
+        key = (message.chat.id, message.id)
+        pending = self._edits.get(key)
+        if pending is not None:
+            pending.text = text
+            pending.kwargs = kwargs
+            return await asyncio.shield(pending.future) if wait else None
+
+        future = asyncio.get_running_loop().create_future()
+        pending = self._edits[key] = _PendingEdit(text, kwargs, future)
+        task = asyncio.ensure_future(self._edit(message, key, pending))
+        if not wait:
+            task.add_done_callback(_log_failure)
+            return None
+        return await task
+
+    async def _edit(
+        self, message: Message, key: Tuple[int, int], pending: _PendingEdit
+    ):
+        async def send():
+            # edits queued from now on wait for the next turn
+            if self._edits.get(key) is pending:
+                del self._edits[key]
+            try:
+                return await message.edit_text(pending.text, **pending.kwargs)
+            except MessageNotModified:
+                return None
+
+        try:
+            result = await self.call(message.chat.id, "edit", send)
+        except asyncio.CancelledError:
+            pending.future.cancel()
+            raise
+        except Exception as e:
+            pending.future.set_exception(e)
+            # waiters see the exception, don't report it as never retrieved
+            pending.future.exception()
+            raise
+        finally:
+            if self._edits.get(key) is pending:
+                del self._edits[key]
+        pending.future.set_result(result)
+        return result
+
+
+def _log_failure(task: asyncio.Task):
+    if not task.cancelled() and task.exception() is not None:
+        logging.warning("Background edit failed", exc_info=task.exception())
+
+
+def install(client: Client):
+    """
+    Make API calls run through the limiter raise every FloodWait
+
+    pyrogram sleeps through FloodWaits up to the client's sleep_threshold
+    itself, the limiter would never see them and never slow down.
+    """
+    invoke = client.invoke
+
+    async def limited_invoke(query, *args, **kwargs):
+        if _limited.get() and kwargs.get("sleep_threshold") is None and not args:
+            kwargs["sleep_threshold"] = 0
+        return await invoke(query, *args, **kwargs)
+
+    client.invoke = limited_invoke
+
+
+limiter = Limiter()
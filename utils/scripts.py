@@ -16,26 +16,30 @@
 
 import asyncio
 import importlib
+import logging
 import math
 import os
 import re
 import shlex
 import subprocess
 import sys
+import threading
 import time
 import traceback
-from PIL import Image
-from io import BytesIO
+from collections import OrderedDict
 from types import ModuleType
 from typing import Dict, Tuple
 
 import psutil
 from pyrogram import Client, errors, filters
-from pyrogram.errors import FloodWait, MessageNotModified, UserNotParticipant
+from pyrogram.errors import UserNotParticipant
 from pyrogram.types import Message
 from pyrogram.enums import ChatMembersFilter
 
-from utils.db import db
+from utils import metrics
+from utils.db import adb, db
+from utils.imaging import resize_image, resize_new_image
+from utils.ratelimit import limiter
 
 from .misc import modules_help, prefix, requirements_list
 
@@ -110,41 +114,121 @@ def get_text(message: Message) -> None | str:
         return None
 
 
-async def progress(current, total, message, start, type_of_ps, file_name=None):
-    """Progress Bar For Showing Progress While Uploading / Downloading File - Normal"""
-    now = time.time()
-    diff = now - start
-    if round(diff % 10.00) == 0 or current == total:
-        percentage = current * 100 / total
-        speed = current / diff
-        elapsed_time = round(diff) * 1000
-        if elapsed_time == 0:
+class ProgressReporter:
+    """
+    Progress bar for uploads and downloads
+
+    Pass ``reporter.update`` as ``progress`` to pyrogram transfer methods or
+    to utils.http.download. The message is edited at most once per
+    ``interval`` seconds, states in between are dropped, and edits are sent
+    in the background, so a slow edit never holds up the transfer. Only the
+    final edit, at 100%, is awaited.
+    Speed is an exponential moving average, ``smoothing`` is the weight of
+    the newest sample.
+    """
+
+    # seconds between speed samples, shorter ones are too noisy
+    SAMPLE_INTERVAL = 1.0
+
+    def __init__(
+        self,
+        message: Message,
+        title: str,
+        file_name: str = None,
+        interval: float = 5.0,
+        smoothing: float = 0.3,
+    ):
+        self.message = message
+        self.title = title
+        self.file_name = file_name
+        self.interval = interval
+        self.smoothing = smoothing
+        self.start = time.monotonic()
+        self.speed = None
+        self._sample_time = self.start
+        self._sample_size = 0
+        self._last_edit = self.start
+
+    def _sample(self, current: int, now: float):
+        elapsed = now - self._sample_time
+        if elapsed < self.SAMPLE_INTERVAL:
             return
-        time_to_completion = round((total - current) / speed) * 1000
-        estimated_total_time = elapsed_time + time_to_completion
-        progress_str = f"{''.join(['▰' for i in range(math.floor(percentage / 10))])}"
-        progress_str += (
-            f"{''.join(['▱' for i in range(10 - math.floor(percentage / 10))])}"
-        )
-        progress_str += f"{round(percentage, 2)}%\n"
-        tmp = f"{progress_str}{humanbytes(current)} of {humanbytes(total)}\n"
-        tmp += f"ETA: {time_formatter(estimated_total_time)}"
-        if file_name:
-            try:
-                await message.edit(
-                    f"{type_of_ps}\n<b>File Name:</b> <code>{file_name}</code>\n{tmp}"
-                )
-            except FloodWait as e:
-                await asyncio.sleep(e.x)
-            except MessageNotModified:
-                pass
+        speed = (current - self._sample_size) / elapsed
+        if self.speed is None:
+            self.speed = speed
         else:
-            try:
-                await message.edit(f"{type_of_ps}\n{tmp}")
-            except FloodWait as e:
-                await asyncio.sleep(e.x)
-            except MessageNotModified:
-                pass
+            self.speed += self.smoothing * (speed - self.speed)
+        self._sample_time = now
+        self._sample_size = current
+
+    def render(self, current: int, total: int = None) -> str:
+        text = self.title + "\n"
+        if self.file_name:
+            text += f"<b>File Name:</b> <code>{self.file_name}</code>\n"
+        if total:
+            percentage = min(current * 100 / total, 100)
+            filled = math.floor(percentage / 10)
+            text += f"{'▰' * filled}{'▱' * (10 - filled)}{round(percentage, 2)}%\n"
+            text += f"{humanbytes(current) or '0 B'} of {humanbytes(total)}\n"
+        else:
+            text += f"{humanbytes(current) or '0 B'}\n"
+        if self.speed:
+            text += f"Speed: {humanbytes(self.speed)}/s\n"
+            if total and current < total:
+                eta = round((total - current) / self.speed) * 1000
+                text += f"ETA: {time_formatter(eta) or '0 second(s)'}"
+        return text.rstrip("\n")
+
+    async def update(self, current: int, total: int = None, *_):
+        now = time.monotonic()
+        self._sample(current, now)
+        done = bool(total) and current >= total
+        if not done and now - self._last_edit < self.interval:
+            return
+        self._last_edit = now
+        text = self.render(current, total)
+        if not done:
+            await limiter.edit(self.message, text, wait=False)
+            return
+        # the final edit is awaited, so it can't land after the caller's own
+        # next edit of the message or after the message is deleted
+        try:
+            await limiter.edit(self.message, text)
+        except errors.RPCError:
+            logging.warning("Final progress edit failed", exc_info=True)
+
+
+# reporters of progress() calls by message, title and start time, with the
+# time of their last update; failed transfers never report completion, so
+# idle reporters expire and the oldest are dropped beyond MAX_REPORTERS
+_reporters: "OrderedDict[tuple, Tuple[float, ProgressReporter]]" = OrderedDict()
+MAX_REPORTERS = 64
+REPORTER_TTL = 600
+
+
+async def progress(current, total, message, start, type_of_ps, file_name=None):
+    """Progress Bar For Showing Progress While Uploading / Downloading File - Normal
+
+    Kept for modules that pass it as pyrogram ``progress``, new code should
+    use ProgressReporter directly.
+    """
+    now = time.monotonic()
+    while _reporters and (
+        len(_reporters) >= MAX_REPORTERS
+        or next(iter(_reporters.values()))[0] < now - REPORTER_TTL
+    ):
+        _reporters.popitem(last=False)
+
+    key = (message.chat.id, message.id, type_of_ps, start)
+    entry = _reporters.pop(key, None)
+    reporter = (
+        entry[1]
+        if entry is not None
+        else ProgressReporter(message, type_of_ps, file_name)
+    )
+    if not total or current < total:
+        _reporters[key] = (now, reporter)
+    await reporter.update(current, total)
 
 
 async def run_cmd(prefix: str) -> Tuple[str, str, int, int]:
@@ -219,6 +303,9 @@ def restart() -> None:
             music_bot_process.terminate()
         except psutil.NoSuchProcess:
             print("Music bot is not running.")
+    # execvp skips atexit handlers, so write pending changes out ourselves
+    adb.close()
+    db.flush()
     os.execvp(sys.executable, [sys.executable, "main.py"])
 
 
@@ -333,6 +420,9 @@ def format_small_module_help(module_name: str, full=True):
     return help_text
 
 
+_install_lock = threading.Lock()
+
+
 def import_library(library_name: str, package_name: str = None):
     """
     Loads a library, or installs it in ImportError case
@@ -347,10 +437,17 @@ def import_library(library_name: str, package_name: str = None):
     try:
         return importlib.import_module(library_name)
     except ImportError as exc:
-        completed = subprocess.run(
-            [sys.executable, "-m", "pip", "install", "--upgrade", package_name],
-            check=True,
-        )
+        # modules are imported from several threads, don't run pip for the same package twice
+        with _install_lock:
+            importlib.invalidate_caches()
+            try:
+                return importlib.import_module(library_name)
+            except ImportError:
+                pass
+            completed = subprocess.run(
+                [sys.executable, "-m", "pip", "install", "--upgrade", package_name],
+                check=True,
+            )
         if completed.returncode != 0:
             raise AssertionError(
                 f"Failed to install library {package_name} (pip exited with code {completed.returncode})"
@@ -372,80 +469,15 @@ def uninstall_library(package_name: str):
         )
 
 
-def resize_image(
-    input_img, output=None, img_type="PNG", size: int = 512, size2: int = None
-):
-    if output is None:
-        output = BytesIO()
-        output.name = f"sticker.{img_type.lower()}"
-
-    with Image.open(input_img) as img:
-        # We used to use thumbnail(size) here, but it returns with a *max* dimension of 512,512
-        # rather than making one side exactly 512, so we have to calculate dimensions manually :(
-        if size2 is not None:
-            size = (size, size2)
-        elif img.width == img.height:
-            size = (size, size)
-        elif img.width < img.height:
-            size = (max(size * img.width // img.height, 1), size)
-        else:
-            size = (size, max(size * img.height // img.width, 1))
-
-        img.resize(size).save(output, img_type)
-
-    return output
-
-
-def resize_new_image(image_path, output_path, desired_width=None, desired_height=None):
-    """
-    Resize an image to the desired dimensions while maintaining the aspect ratio.
-
-    Args:
-        image_path (str): Path to the input image file.
-        output_path (str): Path to save the resized image.
-        desired_width (int, optional): Desired width in pixels. If not provided, the aspect ratio will be maintained.
-        desired_height (int, optional): Desired height in pixels. If not provided, the aspect ratio will be maintained.
-    """
-    image = Image.open(image_path)
-
-    width, height = image.size
-
-    aspect_ratio = width / height
-
-    if desired_width and desired_height:
-        new_width, new_height = desired_width, desired_height
-    elif desired_height:
-        new_width, new_height = int(desired_height * aspect_ratio), desired_height
-    else:
-        new_width, new_height = 150, 150
-
-    resized_image = image.resize((new_width, new_height), Image.Resampling.LANCZOS)
-
-    resized_image.save(output_path)
-    if os.path.exists(image_path):
-        os.remove(image_path)
-
-
-async def load_module(
-    module_name: str,
-    client: Client,
+async def import_module(
+    path: str,
+    packages: list,
     message: Message = None,
     core=False,
 ) -> ModuleType:
-    if module_name in modules_help and not core:
-        await unload_module(module_name, client)
-
-    path = f"modules.{'custom_modules.' if not core else ''}{module_name}"
-
-    with open(f"{path.replace('.', '/')}.py", encoding="utf-8") as f:
-        code = f.read()
-    meta = parse_meta_comments(code)
-
-    packages = meta.get("requires", "").split()
-    requirements_list.extend(packages)
-
+    """Import module in a worker thread, installing its requirements if needed"""
     try:
-        module = importlib.import_module(path)
+        return await asyncio.to_thread(importlib.import_module, path)
     except ImportError as e:
         if core:
             # Core modules shouldn't raise ImportError
@@ -483,15 +515,48 @@ async def load_module(
                 )
             raise RuntimeError("failed to install requirements") from e
 
-        module = importlib.import_module(path)
+        return await asyncio.to_thread(importlib.import_module, path)
+
 
+def module_handlers(module: ModuleType) -> list:
+    """(handler, group) pairs declared with Client.on_* decorators in module"""
+    handlers = []
     for _name, obj in vars(module).items():
         if isinstance(getattr(obj, "handlers", []), list):
-            for handler, group in getattr(obj, "handlers", []):
-                client.add_handler(handler, group)
+            handlers.extend(getattr(obj, "handlers", []))
+    return handlers
+
+
+def register_module(module: ModuleType, client: Client, meta: dict):
+    name = module.__name__.split(".")[-1]
+    for handler, group in module_handlers(module):
+        client.add_handler(metrics.instrument(handler, group, name), group)
 
     module.__meta__ = meta
 
+
+async def load_module(
+    module_name: str,
+    client: Client,
+    message: Message = None,
+    core=False,
+    meta: dict = None,
+) -> ModuleType:
+    if module_name in modules_help and not core:
+        await unload_module(module_name, client)
+
+    path = f"modules.{'custom_modules.' if not core else ''}{module_name}"
+
+    if meta is None:
+        with open(f"{path.replace('.', '/')}.py", encoding="utf-8") as f:
+            meta = parse_meta_comments(f.read())
+
+    packages = meta.get("requires", "").split()
+    requirements_list.extend(packages)
+
+    module = await import_module(path, packages, message, core)
+    register_module(module, client, meta)
+
     return module
 
 
@@ -0,0 +1,72 @@
+#  Moon-Userbot - telegram userbot
+#  Copyright (C) 2020-present Moon Userbot Organization
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# In-memory copies of module settings for code that runs on every update,
+# like filters. A module is read from the database once, later changes made
+# through db or adb are pushed here by a Database observer.
+
+import threading
+from typing import Dict, Optional
+
+from utils.db import REMOVED, db
+
+__all__ = ["ModuleSettings", "settings"]
+
+
+class ModuleSettings:
+    """Values of one database module, read without touching the database"""
+
+    def __init__(self, module: str):
+        self.module = module
+        self._values: Optional[dict] = None
+        # changes may come from the AsyncDatabase thread; the lock only keeps
+        # them from racing the first load, reads are single dict lookups and
+        # don't take it
+        self._lock = threading.Lock()
+        db.subscribe(module, self._changed)
+
+    def _load(self) -> dict:
+        with self._lock:
+            if self._values is None:
+                self._values = db.get_collection(self.module)
+            return self._values
+
+    def _changed(self, variable: str, value):
+        with self._lock:
+            if self._values is None:
+                return
+            if value is REMOVED:
+                self._values.pop(variable, None)
+            else:
+                self._values[variable] = value
+
+    def get(self, variable: str, default=None):
+        values = self._values if self._values is not None else self._load()
+        return values.get(variable, default)
+
+    def __contains__(self, variable: str) -> bool:
+        values = self._values if self._values is not None else self._load()
+        return variable in values
+
+
+_registry: Dict[str, ModuleSettings] = {}
+
+
+def settings(module: str) -> ModuleSettings:
+    """Shared ModuleSettings of module, e.g. settings("core.antipm")"""
+    if module not in _registry:
+        _registry[module] = ModuleSettings(module)
+    return _registry[module]
@@ -0,0 +1,131 @@
+#  Moon-Userbot - telegram userbot
+#  Copyright (C) 2020-present Moon Userbot Organization
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# Process pool for CPU-bound work, like Pillow transforms, and a limit on
+# external tools, like ffmpeg, so heavy jobs don't stall the event loop.
+# Worker processes import the modules of the functions they run, keep those
+# free of pyrogram, config and database imports (see utils.imaging).
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from typing import Callable, Optional
+
+__all__ = ["MAX_WORKERS", "start", "run", "run_process", "shutdown"]
+
+MAX_WORKERS = min(4, os.cpu_count() or 1)
+# jobs submitted at once, further callers wait before submitting
+QUEUE_SIZE = MAX_WORKERS * 2
+
+_pool: Optional[ProcessPoolExecutor] = None
+_jobs: Optional[asyncio.Semaphore] = None
+_processes: Optional[asyncio.Semaphore] = None
+# set when a worker died, the pool isn't forked again from a process that
+# runs threads by now and jobs run in threads instead
+_broken = False
+
+
+def _context():
+    # spawn and forkserver would re-run main.py in every worker
+    if "fork" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("fork")
+    return multiprocessing.get_context("spawn")
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(MAX_WORKERS, mp_context=_context())
+    return _pool
+
+
+def start():
+    """Fork worker processes now, while the process has few threads"""
+    _get_pool().submit(os.getpid).result()
+
+
+def _observe(name: str, started: float):
+    # imported here, worker processes import this module too
+    from utils import metrics
+
+    metrics.observe(name, time.perf_counter() - started)
+
+
+async def run(func: Callable, *args, **kwargs):
+    """Run func in a worker process, func and arguments must be picklable"""
+    global _broken, _jobs
+    if _jobs is None:
+        _jobs = asyncio.Semaphore(QUEUE_SIZE)
+    async with _jobs:
+        started = time.perf_counter()
+        try:
+            if _broken:
+                return await asyncio.to_thread(func, *args, **kwargs)
+            return await asyncio.get_running_loop().run_in_executor(
+                _get_pool(), partial(func, *args, **kwargs)
+            )
+        except BrokenProcessPool:
+            # forking with threads running may deadlock the child
+            logging.warning("Worker process died, running jobs in threads from now")
+            _broken = True
+            shutdown()
+            raise
+        finally:
+            _observe("worker_job", started)
+
+
+async def run_process(*args: str, input: bytes = None) -> bytes:
+    """Run external tool like ffmpeg, feeding input to stdin, return its stdout"""
+    global _processes
+    if _processes is None:
+        _processes = asyncio.Semaphore(MAX_WORKERS)
+    async with _processes:
+        started = time.perf_counter()
+        process = await asyncio.create_subprocess_exec(
+            *args,
+            stdin=(
+                asyncio.subprocess.PIPE
+                if input is not None
+                else asyncio.subprocess.DEVNULL
+            ),
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        try:
+            stdout, stderr = await process.communicate(input)
+        except asyncio.CancelledError:
+            process.kill()
+            raise
+        finally:
+            _observe("worker_process", started)
+    if process.returncode:
+        raise RuntimeError(
+            f"{args[0]} exited with code {process.returncode}: "
+            f"{stderr.decode(errors='replace')[-1000:]}"
+        )
+    return stdout
+
+
+def shutdown():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None